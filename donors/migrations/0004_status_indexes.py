@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donors', '0003_merge_0002_auto_20190407_1414_0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointments',
+            index=models.Index(fields=['hospital', 'appointment_status'], name='appointment_hosp_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donationrequests',
+            index=models.Index(fields=['donation_status'], name='donation_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donationrequests',
+            index=models.Index(condition=models.Q(('donation_status', 'Pending')), fields=['organ_type', 'blood_type'], name='pending_donation_match_idx'),
+        ),
+    ]
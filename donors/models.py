@@ -13,6 +13,12 @@ class DonationRequests(models.Model):
 	class Meta: 
 		verbose_name_plural = "Donation Requests"
 		verbose_name = "Donation Requests"
+		indexes = [
+			models.Index(fields=['donation_status'], name='donation_status_idx'),
+			# Pending donations are the ones matched against requirements by organ and blood type
+			models.Index(fields=['organ_type', 'blood_type'], condition=models.Q(donation_status='Pending'),
+				name='pending_donation_match_idx'),
+		]
 
 	organ_type = models.CharField(max_length=20, blank=False, null=False)
 	blood_type = models.CharField(max_length=10, blank=True, null=True)
@@ -39,7 +45,8 @@ class Appointments(models.Model):
 
     donation_request = models.ForeignKey(DonationRequests, on_delete=models.CASCADE)
     appointment_status = models.CharField(max_length=20, choices=STATUS, blank=False, null=False)
-    hospital = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed by appointment_hosp_status_idx, which leads with hospital
+    hospital = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     date = models.CharField(max_length=100, blank=False, null=False)
     time = models.CharField(max_length=100, blank=False, null=False)
 
@@ -49,3 +56,6 @@ class Appointments(models.Model):
     class Meta: 
         verbose_name_plural = "Appointments"
         verbose_name = "Appointments" 
+        indexes = [
+            models.Index(fields=['hospital', 'appointment_status'], name='appointment_hosp_status_idx'),
+        ]
@@ -4,7 +4,7 @@ from .models import DonationRequests
 from django.contrib.auth import login, logout, authenticate
 from django.views.decorators.csrf import csrf_protect
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 import smtplib
 import getpass
 from email.mime.multipart import MIMEMultipart
@@ -55,7 +55,6 @@ def donor_login(request):
             if user.is_active:
                 if not user.is_staff:
                     login(request, user)
-                    print(request.user, "helo")
                     return redirect(request.POST.get("next", "donor-landing-page"))
         else:
             msg = "Invalid password"
@@ -184,7 +183,9 @@ def new_donation_request(request):
         donated_before = request.POST.get("donated_before", "")
         donation_request.donated_before = donated_before == "True" if donated_before else False
         
-        donation_request.save()
+        # The statistics rollups are updated by signals in the same transaction
+        with transaction.atomic():
+            donation_request.save()
         return redirect("donor-home")
 
     return render(request, "new-donation-request.html")
@@ -193,14 +194,14 @@ def new_donation_request(request):
 def book_appointment(request):
     # If method is post
     if request.POST:
-        print(request.POST.get("hospital-name", ""))
         apmt = Appointments()
         apmt.donation_request = DonationRequests.objects.get(id=int(request.POST.get("dreq", "")))
         apmt.hospital = User.objects.get(hospital_name=request.POST.get("hospital-name", ""))
         apmt.date = request.POST.get("date", "")
         apmt.time = request.POST.get("time", "")
         apmt.appointment_status = "Pending"
-        apmt.save()
+        with transaction.atomic():
+            apmt.save()
         return redirect("donor-home")
 
     donors = DonationRequests.objects.filter(donor=request.user.id)
@@ -0,0 +1,7 @@
+# gunicorn organ_donation.wsgi -c gunicorn.conf.py
+#
+# preload_app imports the Django app in the master, so MlMatchingConfig.ready()
+# loads and warms the matching model once and every forked worker shares it
+# copy-on-write (see ml_matching/warmup.py).
+preload_app = True
+workers = 4
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class HospitalsConfig(AppConfig):
     name = 'hospitals'
+
+    def ready(self):
+        # Drop cached dashboard counters when appointments or donations change
+        from . import dashboard_stats  # noqa: F401
@@ -0,0 +1,123 @@
+"""Dashboard counters for fetch_counts, computed in two queries and cached.
+
+hospital_counters() counts one hospital's appointments in a single
+conditional-aggregation query, and global_counters() reads the platform
+totals from the stats rollups in another. snapshot() reads both from the 'dashboard' cache, so a
+dashboard poll is normally a cache hit. The signal receivers below drop the
+affected entries whenever an appointment or a donation request is saved or
+deleted. That covers approve_appointments, approve_donations,
+book_appointment and new_donation_request, as well as edits in the admin.
+The entries are dropped once the write's transaction commits. Dropping them
+earlier would let a poll that lands before the commit re-cache the old counts.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from donors.models import Appointments, DonationRequests
+from stats import rollup
+
+CACHE_ALIAS = 'dashboard'
+GLOBAL_KEY = 'dashboard:global'
+
+# Safety net for writes that bypass the ORM; invalidation normally comes first
+DEFAULT_TTL = 300
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _ttl():
+    return getattr(settings, 'DASHBOARD_STATS_TTL', DEFAULT_TTL)
+
+
+def _month(now=None):
+    return (now or timezone.now()).strftime('%Y-%m')
+
+
+def _hospital_key(hospital_id, month):
+    # The month is part of the key so the monthly counter rolls over on its own
+    return f'dashboard:hospital:{hospital_id}:{month}'
+
+
+def hospital_counters(hospital_id, month=None):
+    """One hospital's appointment counters, in one query.
+
+    Appointments store the booked date as 'YYYY-MM-DD', so the monthly
+    counter counts approved appointments booked for this month.
+    """
+    month = month or _month()
+    return Appointments.objects.filter(hospital_id=hospital_id).aggregate(
+        appointment_count=Count('id', filter=Q(appointment_status='Pending')),
+        donation_count=Count('id', filter=Q(appointment_status='Approved',
+                                            donation_request__donation_status='Pending')),
+        approved_appointments_month=Count('id', filter=Q(appointment_status='Approved',
+                                                         date__startswith=month)),
+    )
+
+
+def global_counters():
+    """Counters over every donation request, from the daily rollups (one query over days, not rows)"""
+    today = timezone.localdate()
+    totals = rollup.summary(today, today)
+    donations = totals['donations']
+    return {
+        'all_pending_donations': donations.get('Pending', {}).get('open', 0),
+        'lives_saved': donations.get('Approved', {}).get('open', 0),
+        'total_donors': totals['donors']['total'],
+    }
+
+
+def snapshot(hospital_id):
+    """Every fetch_counts counter for a hospital, from the cache when it is fresh"""
+    cache = _cache()
+    month = _month()
+    hospital_key = _hospital_key(hospital_id, month)
+    cached = cache.get_many([hospital_key, GLOBAL_KEY])
+
+    counters = cached.get(hospital_key)
+    if counters is None:
+        counters = hospital_counters(hospital_id, month)
+        cache.set(hospital_key, counters, _ttl())
+    global_part = cached.get(GLOBAL_KEY)
+    if global_part is None:
+        global_part = global_counters()
+        cache.set(GLOBAL_KEY, global_part, _ttl())
+    return {**counters, **global_part}
+
+
+def invalidate(hospital_ids=(), include_global=False):
+    """Drop the cached counters of the given hospitals, and the global ones if asked"""
+    month = _month()
+    keys = [_hospital_key(hospital_id, month) for hospital_id in hospital_ids]
+    if include_global:
+        keys.append(GLOBAL_KEY)
+    if keys:
+        _cache().delete_many(keys)
+
+
+def invalidate_on_commit(hospital_ids=(), include_global=False):
+    """invalidate() once the current transaction commits (immediately outside one)"""
+    hospital_ids = list(hospital_ids)
+    transaction.on_commit(lambda: invalidate(hospital_ids, include_global))
+
+
+@receiver(post_save, sender=Appointments)
+@receiver(post_delete, sender=Appointments)
+def appointment_changed(sender, instance, **kwargs):
+    invalidate_on_commit([instance.hospital_id])
+
+
+@receiver(post_save, sender=DonationRequests)
+@receiver(post_delete, sender=DonationRequests)
+def donation_changed(sender, instance, created=False, **kwargs):
+    # donation_count of every hospital with an appointment for this donation depends on its status
+    hospital_ids = [] if created else set(Appointments.objects.filter(
+        donation_request_id=instance.id
+    ).values_list('hospital_id', flat=True))
+    invalidate_on_commit(hospital_ids, include_global=True)
@@ -1,3 +1,272 @@
-from django.test import TestCase
+import json
+import logging
+import random
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from donors.models import Appointments, DonationRequests
+from ml_matching import match_table
+from ml_matching.matching_algorithm import OrganMatchingML
+from ml_matching.models import HospitalOrganRequirement, MatchCandidate
+from ml_matching.scoring import BLOOD_TYPES
+from organ_donation.instrumentation import event
+from . import dashboard_stats
+from .models import User
+
+
+def create_donation(donor, status='Pending'):
+    return DonationRequests.objects.create(
+        donor=donor, organ_type='Kidney', blood_type='O-', family_relation='Sibling',
+        family_relation_name='Kin', family_contact_number='5550000', donation_status=status,
+        donated_before=False, family_consent=True
+    )
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'dashboard': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dashboard-tests'},
+})
+class DashboardCountsTests(TestCase):
+
+    def setUp(self):
+        self.hospital = User.objects.create(username='general', hospital_name='general', is_staff=True)
+        other = User.objects.create(username='elsewhere', hospital_name='elsewhere', is_staff=True)
+        donor = User.objects.create(username='donor')
+        this_month = timezone.now().strftime('%Y-%m-15')
+        pending = create_donation(donor)
+        self.approved = Appointments.objects.create(
+            donation_request=pending, hospital=self.hospital, appointment_status='Approved', date=this_month, time='10:00'
+        )
+        Appointments.objects.create(
+            donation_request=pending, hospital=self.hospital, appointment_status='Approved', date='2001-01-15', time='10:00'
+        )
+        Appointments.objects.create(
+            donation_request=create_donation(donor, status='Approved'), hospital=other,
+            appointment_status='Pending', date=this_month, time='10:00'
+        )
+        self.client.force_login(self.hospital)
+
+    def fetch_counts(self):
+        return json.loads(self.client.get('/hospitals/fetch-counts/').content)[0]
+
+    def test_counters_are_cached_until_a_write(self):
+        # Session and user lookups, then one aggregate per counter group
+        with self.assertNumQueries(4):
+            counts = self.fetch_counts()
+        self.assertEqual(counts, {
+            'appointment_count': 0, 'donation_count': 2, 'approved_appointments_month': 1,
+            'all_pending_donations': 1, 'lives_saved': 1, 'total_donors': 1,
+        })
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.fetch_counts(), counts)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/hospitals/donations-approval/',
+                             {'ID': self.approved.donation_request_id, 'action': 'Approved'})
+        counts = self.fetch_counts()
+        self.assertEqual((counts['donation_count'], counts['lives_saved']), (0, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/hospitals/appointments-approval/', {'ID': self.approved.id, 'action': 'Pending'})
+        self.assertEqual(self.fetch_counts()['appointment_count'], 1)
+
+    def test_counters_are_dropped_only_after_commit(self):
+        counts = self.fetch_counts()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.approved.appointment_status = 'Pending'
+            self.approved.save()
+            # A poll before the commit still sees the committed counts, and caches nothing new
+            self.assertEqual(self.fetch_counts(), counts)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.fetch_counts()['appointment_count'], 1)
+
+    def test_fetch_appointments_reads_only_its_rows(self):
+        # Session and user lookups, then this hospital's pending appointments
+        with self.assertNumQueries(3):
+            response = self.client.get('/hospitals/fetch-appointments/')
+        self.assertEqual(json.loads(response.content), [])
+
+
+class PendingDonationsTests(TestCase):
+
+    def setUp(self):
+        hospital = User.objects.create(username='general', hospital_name='general', is_staff=True)
+        donors = [User.objects.create(username=f'donor-{i}', first_name=f'Donor {i}') for i in range(4)]
+        self.pending = [create_donation(donor) for donor in donors]
+        create_donation(donors[0], status='Approved')
+        for status in ('Denied', 'Booked'):
+            Appointments.objects.create(donation_request=self.pending[1], hospital=hospital,
+                                        appointment_status=status, date='2024-01-15', time='10:00')
+        self.client.force_login(hospital)
+
+    def fetch(self, **params):
+        response = self.client.get('/hospitals/fetch-all-pending-donations/', params)
+        return response, json.loads(b''.join(response.streaming_content))
+
+    @override_settings(PENDING_DONATIONS_PAGE_SIZE=2)
+    def test_streams_joined_keyset_pages(self):
+        # Session and user lookups, then one joined query per page, whatever the number of donors and appointments
+        with self.assertNumQueries(5):
+            _, donations = self.fetch()
+        self.assertEqual([d['donation_id'] for d in donations], [d.id for d in self.pending])
+        self.assertEqual(donations[0]['first_name'], 'Donor 0')
+        self.assertEqual((donations[0]['has_appointment'], donations[0]['appointment_status']), (False, 'No Appointment'))
+        self.assertEqual((donations[1]['has_appointment'], donations[1]['appointment_status']), (True, 'Booked'))
+
+    def test_slices_resume_after_the_cursor(self):
+        response, donations = self.fetch(limit=3)
+        self.assertEqual([d['donation_id'] for d in donations], [d.id for d in self.pending[:3]])
+        self.assertEqual(response['X-Next-After'], str(self.pending[2].id))
+
+        response, donations = self.fetch(after=response['X-Next-After'], limit=3)
+        self.assertEqual([d['donation_id'] for d in donations], [self.pending[3].id])
+        self.assertNotIn('X-Next-After', response)
+
+        self.assertEqual(self.client.get('/hospitals/fetch-all-pending-donations/', {'limit': 0}).status_code, 400)
+
+
+class InstrumentationTests(SimpleTestCase):
+
+    def test_fields_are_only_built_for_written_events(self):
+        built = []
+        with self.assertLogs('organ_donation.events', level='INFO') as logs:
+            event('debug_only', level=logging.DEBUG, total=lambda: built.append('debug'))
+            event('sampled_out', sample=0.0, total=lambda: built.append('sampled'))
+            event('written', total=lambda: built.append('written') or 3)
+        self.assertEqual(built, ['written'])
+        self.assertEqual([(record.getMessage(), record.fields) for record in logs.records], [('written', {'total': 3})])
+
+
+ORGANS = ['Heart', 'Kidney', 'Liver', 'Lungs', 'Pancreas']
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN the SQL the hot dashboard and matching paths issue over 100k-row tables.
+
+    Each path runs for real under CaptureQueriesContext; every captured
+    SELECT is explained, none may scan a large table in full, and the path's
+    own indexes have to show up in the plans (a tuple accepts any of its
+    names, for plans the planner may build either way).
+    """
+
+    ROWS = 100_000
+    HOSPITALS = 200
+    LARGE_TABLES = [model._meta.db_table for model in
+                    (Appointments, DonationRequests, HospitalOrganRequirement, MatchCandidate)]
+
+    @classmethod
+    def setUpTestData(cls):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            return
+        rng = random.Random(0)
+        hospitals = User.objects.bulk_create(
+            [User(username=f'hospital-{i}', hospital_name=f'hospital-{i}', is_staff=True) for i in range(cls.HOSPITALS)]
+        )
+        donors = User.objects.bulk_create([User(username=f'donor-{i}') for i in range(cls.ROWS // 50)])
+        # Most history is settled; a few percent of rows are still pending or active
+        donations = DonationRequests.objects.bulk_create([
+            DonationRequests(
+                donor=rng.choice(donors), organ_type=rng.choice(ORGANS), blood_type=rng.choice(BLOOD_TYPES),
+                family_relation='Sibling', family_relation_name='Kin', family_contact_number='5550000',
+                donation_status='Pending' if rng.random() < 0.02 else rng.choice(['Approved', 'Denied']),
+                donated_before=False, family_consent=True,
+            ) for _ in range(cls.ROWS)
+        ], batch_size=5000)
+        Appointments.objects.bulk_create([
+            Appointments(
+                donation_request=donation, hospital=rng.choice(hospitals), date='2024-01-15', time='10:00',
+                appointment_status='Pending' if rng.random() < 0.03 else rng.choice(['Approved', 'Denied']),
+            ) for donation in donations
+        ], batch_size=5000)
+        requirements = HospitalOrganRequirement.objects.bulk_create([
+            HospitalOrganRequirement(
+                hospital=rng.choice(hospitals), organ_type=rng.choice(ORGANS), blood_type=rng.choice(BLOOD_TYPES),
+                patient_age=40, patient_weight=70.0, urgency_level='High', is_active=rng.random() < 0.05,
+            ) for _ in range(cls.ROWS // 5)
+        ], batch_size=5000)
+        MatchCandidate.objects.bulk_create([
+            MatchCandidate(
+                donation_request=donation, requirement=requirements[i % len(requirements)],
+                hospital_id=requirements[i % len(requirements)].hospital_id, compatibility_score=rng.randint(55, 100),
+                ml_probability=rng.random(), urgency_rank=3,
+            ) for i, donation in enumerate(donations)
+        ], batch_size=5000)
+        cls.hospital = hospitals[0]
+        cls.requirement = HospitalOrganRequirement.objects.create(
+            hospital=cls.hospital, organ_type='Kidney', blood_type='AB+', patient_age=40, patient_weight=70.0,
+            urgency_level='High',
+        )
+        cls.donation = next(d for d in donations if d.donation_status == 'Pending')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.skipTest(f"no plan check for {connection.vendor}")
+        self.client.force_login(self.hospital)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+    def plans(self, run):
+        """Query plans of the SELECTs run() issues"""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        explain = 'EXPLAIN ' if connection.vendor == 'postgresql' else 'EXPLAIN QUERY PLAN '
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if query['sql'].lstrip().upper().startswith('SELECT'):
+                    cursor.execute(explain + query['sql'])
+                    plans.append((query['sql'], '\n'.join(str(row[-1]) for row in cursor.fetchall())))
+        return plans
+
+    def full_scans(self, plan):
+        lines = plan.splitlines()
+        if connection.vendor == 'postgresql':
+            return [line for line in lines if any(f'Seq Scan on {table} ' in f'{line} ' for table in self.LARGE_TABLES)]
+        return [line for line in lines if any(line.strip() == f'SCAN {table}' for table in self.LARGE_TABLES)]
+
+    def hot_paths(self):
+        hospital = self.hospital
+        return {
+            'fetch_appointments': (lambda: self.get('/hospitals/fetch-appointments/'),
+                                   ['appointment_hosp_status_idx']),
+            'fetch_donations': (lambda: self.get('/hospitals/fetch-donations/'), ['appointment_hosp_status_idx']),
+            'fetch_counts': (lambda: dashboard_stats.hospital_counters(hospital.id),
+                             ['appointment_hosp_status_idx']),
+            # The latest-appointment subqueries go through the donation_request foreign key's index
+            'fetch_all_pending_donations': (lambda: self.get('/hospitals/fetch-all-pending-donations/'),
+                                            ['donation_status_idx', 'donors_appointments_donation_request_id']),
+            'find_ml_matches': (lambda: self.get('/hospitals/find-ml-matches/', requirement_id=self.requirement.id),
+                                ['pending_donation_match_idx']),
+            # The donations of every scoped requirement are one OR of (organ, blood) terms
+            'scoped_requirements': (lambda: OrganMatchingML().load_matching_data(hospital=hospital),
+                                    ['active_requirement_hosp_idx', ('pending_donation_match_idx', 'donation_status_idx')]),
+            'refresh_donation': (lambda: match_table.refresh_donation(self.donation.id),
+                                 ['active_requirement_match_idx']),
+            'refresh_requirement': (lambda: match_table.refresh_requirement(self.requirement.id),
+                                    ['pending_donation_match_idx']),
+            'stored_matches': (lambda: list(match_table.stored_matches(hospital=hospital, k=5)),
+                               ['match_hospital_rank_idx']),
+        }
+
+    def test_hot_paths_use_their_indexes(self):
+        self.assertEqual(DonationRequests.objects.count(), self.ROWS)
+        for name, (run, indexes) in self.hot_paths().items():
+            plans = self.plans(run)
+            text = '\n\n'.join(f'{sql}\n{plan}' for sql, plan in plans)
+            with self.subTest(name, plans=text):
+                self.assertTrue(plans)
+                self.assertEqual([scan for _, plan in plans for scan in self.full_scans(plan)], [])
+                for index in indexes:
+                    names = index if isinstance(index, tuple) else (index,)
+                    self.assertTrue(any(name in text for name in names), f"none of {names} in the plans")
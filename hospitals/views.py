@@ -1,10 +1,11 @@
 from django.shortcuts import render
-import pdfkit
 from django.conf import settings
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
 from donors.models import DonationRequests, Appointments
 import json
-from django.http import JsonResponse, HttpResponse, FileResponse
+import logging
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import get_object_or_404
 from django.template import RequestContext
@@ -30,12 +31,16 @@ from django.core.files.storage import FileSystemStorage
 from django.http import HttpResponse
 from django.template.loader import render_to_string
 from io import StringIO, BytesIO
-from xhtml2pdf import pisa
-from pypdf import PdfWriter, PdfReader
+from organ_donation.instrumentation import annotate, event, exception
+from . import dashboard_stats
 
 
 # Create your views here.
 
+# Pending donations are streamed in keyset pages of this many rows
+PENDING_DONATIONS_PAGE_SIZE = 500
+PENDING_DONATIONS_MAX_LIMIT = 5000
+
 
 @login_required
 def home(request):
@@ -52,7 +57,6 @@ def search_donations(request):
         status = "Approved"
         # Search for donations based on organ type/blood type/donor name
         donations = DonationRequests.objects.filter((Q(organ_type__iexact=search_keyword) | Q(blood_type__startswith=search_keyword) | Q(donor__first_name__iexact=search_keyword) | Q(donor__last_name__iexact=search_keyword)) & Q(donation_status__iexact=status))
-        print(donations)
         # Search for donations based on donation id
         if not donations:
             if search_keyword.isdigit():
@@ -60,7 +64,6 @@ def search_donations(request):
 
         donation_list = []
         for donation in donations:
-            print(donation.donation_status)
             temp_dict = {}
             temp_dict["donor"] = f"{donation.donor.first_name} {donation.donor.last_name}"
             temp_dict["organ"] = donation.organ_type
@@ -68,7 +71,7 @@ def search_donations(request):
             temp_dict["blood_group"] = donation.blood_type
             donation_list.append(temp_dict)
         search_list = json.dumps(donation_list)
-        print("hi", search_list)
+        annotate(results=len(donation_list))
         return HttpResponse(search_list)
 
 
@@ -111,25 +114,12 @@ def fetch_appointments(request):
     if request.POST:
         pass
     else:
-        # Fetching appointment details
-        print(f"fetching appointments from db for hospital ID: {request.user.id}")
-        print(f"Hospital name: {request.user.hospital_name}")
-        
-        # Debug: Check all appointments first
-        all_appointments = Appointments.objects.all()
-        print(f"Total appointments in database: {all_appointments.count()}")
-        for apt in all_appointments:
-            print(f"Appointment ID: {apt.id}, Hospital: {apt.hospital.hospital_name} (ID: {apt.hospital.id}), Status: {apt.appointment_status}")
-        
-        # Get all appointments for this hospital (not just pending)
-        all_hospital_appointments = Appointments.objects.filter(hospital__id=request.user.id)
-        print(f"All appointments for this hospital: {all_hospital_appointments.count()}")
-        
         # Get pending appointments for this hospital
         status = "Pending"
         appointments = Appointments.objects.filter(hospital__id=request.user.id, appointment_status=status)
-        print(f"Pending appointments count: {appointments.count()}")
-        print(f"Query: hospital_id={request.user.id}, status={status}")
+        # Counting every appointment of the hospital is a debugging aid; the count only runs at DEBUG
+        event('appointments_listed', level=logging.DEBUG, hospital_id=request.user.id, status=status,
+              hospital_total=Appointments.objects.filter(hospital__id=request.user.id).count)
         
         appointment_list = []
         for appointment in appointments:
@@ -147,7 +137,7 @@ def fetch_appointments(request):
             temp_dict["appointment_status"] = appointment.appointment_status
             appointment_list.append(temp_dict)
         appointment_details = json.dumps(appointment_list)
-        print(f"Returning appointment data: {appointment_details}")
+        annotate(results=len(appointment_list))
         return HttpResponse(appointment_details)
 
 
@@ -157,11 +147,8 @@ def fetch_all_appointments(request):
     if request.POST:
         pass
     else:
-        print(f"Fetching all appointments for hospital ID: {request.user.id}")
-        
         # Get all appointments for this hospital
         appointments = Appointments.objects.filter(hospital__id=request.user.id)
-        print(f"Found {appointments.count()} appointments for this hospital")
         
         appointment_list = []
         for appointment in appointments:
@@ -184,7 +171,7 @@ def fetch_all_appointments(request):
             appointment_list.append(temp_dict)
         
         appointment_details = json.dumps(appointment_list)
-        print(f"Returning all appointment data: {appointment_details}")
+        annotate(results=len(appointment_list))
         return HttpResponse(appointment_details)
 
 
@@ -216,55 +203,102 @@ def fetch_donations(request):
         return HttpResponse(appointment_details)
 
 
+def _pending_donation_pages(after, limit, page_size):
+    """Pending donations with their donor and latest appointment, read in id-keyset pages.
+
+    Each page is one joined query resuming after the last id seen, so no page
+    costs more than the first however long the queue grows.
+    """
+    latest_appointment = Appointments.objects.filter(donation_request=OuterRef('pk')).order_by('-id')
+    donations = DonationRequests.objects.filter(donation_status="Pending").select_related('donor').annotate(
+        appointment_status=Subquery(latest_appointment.values('appointment_status')[:1]),
+        appointment_date=Subquery(latest_appointment.values('date')[:1]),
+        appointment_time=Subquery(latest_appointment.values('time')[:1]),
+    ).order_by('id')
+    while limit is None or limit > 0:
+        size = page_size if limit is None else min(page_size, limit)
+        page = list(donations.filter(id__gt=after)[:size])
+        yield page
+        if len(page) < size:
+            return
+        after = page[-1].id
+        if limit is not None:
+            limit -= size
+
+
+def _pending_donation_dict(donation):
+    temp_dict = {}
+    temp_dict["first_name"] = donation.donor.first_name
+    temp_dict["last_name"] = donation.donor.last_name
+    temp_dict["email"] = donation.donor.email
+    temp_dict["contact_number"] = donation.donor.contact_number
+    temp_dict["city"] = donation.donor.city
+    temp_dict["province"] = donation.donor.province
+    # Donation details
+    temp_dict["organ"] = donation.organ_type
+    temp_dict["donation_id"] = donation.id
+    temp_dict["blood_group"] = donation.blood_type
+    temp_dict["donation_status"] = donation.donation_status
+    temp_dict["family_member_name"] = donation.family_relation_name
+    temp_dict["family_member_relation"] = donation.family_relation
+    temp_dict["family_member_contact"] = donation.family_contact_number
+    temp_dict["donated_before"] = donation.donated_before
+    temp_dict["family_consent"] = donation.family_consent
+    temp_dict["request_date"] = donation.request_datetime.strftime("%Y-%m-%d %H:%M")
+    # Appointment details, from the donation's latest appointment
+    if donation.appointment_status is not None:
+        temp_dict["has_appointment"] = True
+        temp_dict["appointment_status"] = donation.appointment_status
+        temp_dict["appointment_date"] = donation.appointment_date
+        temp_dict["appointment_time"] = donation.appointment_time
+    else:
+        temp_dict["has_appointment"] = False
+        temp_dict["appointment_status"] = "No Appointment"
+    return temp_dict
+
+
 @login_required
 def fetch_all_pending_donations(request):
-    """Fetch all pending donation requests, regardless of appointment status"""
+    """Fetch all pending donation requests, regardless of appointment status.
+
+    The JSON array is streamed while it is read in keyset pages. `after` (a
+    donation id) and `limit` ask for one slice of the queue; when more rows
+    follow, the X-Next-After header holds the id to resume after.
+    """
     if request.POST:
         pass
     else:
-        # Get all pending donation requests
-        donation_status = "Pending"
-        donations = DonationRequests.objects.filter(donation_status=donation_status)
-        
-        print(f"Found {donations.count()} pending donation requests")
-        
-        donation_list = []
-        for donation in donations:
-            temp_dict = {}
-            temp_dict["first_name"] = donation.donor.first_name
-            temp_dict["last_name"] = donation.donor.last_name
-            temp_dict["email"] = donation.donor.email
-            temp_dict["contact_number"] = donation.donor.contact_number
-            temp_dict["city"] = donation.donor.city
-            temp_dict["province"] = donation.donor.province
-            # Donation details
-            temp_dict["organ"] = donation.organ_type
-            temp_dict["donation_id"] = donation.id
-            temp_dict["blood_group"] = donation.blood_type
-            temp_dict["donation_status"] = donation.donation_status
-            temp_dict["family_member_name"] = donation.family_relation_name
-            temp_dict["family_member_relation"] = donation.family_relation
-            temp_dict["family_member_contact"] = donation.family_contact_number
-            temp_dict["donated_before"] = donation.donated_before
-            temp_dict["family_consent"] = donation.family_consent
-            temp_dict["request_date"] = donation.request_datetime.strftime("%Y-%m-%d %H:%M")
-            
-            # Check if appointment exists
-            try:
-                appointment = Appointments.objects.get(donation_request=donation)
-                temp_dict["has_appointment"] = True
-                temp_dict["appointment_status"] = appointment.appointment_status
-                temp_dict["appointment_date"] = appointment.date
-                temp_dict["appointment_time"] = appointment.time
-            except Appointments.DoesNotExist:
-                temp_dict["has_appointment"] = False
-                temp_dict["appointment_status"] = "No Appointment"
-            
-            donation_list.append(temp_dict)
-        
-        donation_details = json.dumps(donation_list)
-        print(f"Returning donation data: {donation_details}")
-        return HttpResponse(donation_details)
+        try:
+            after = int(request.GET.get('after', 0))
+            limit = int(request.GET['limit']) if request.GET.get('limit') else None
+            if limit is not None and not 1 <= limit <= PENDING_DONATIONS_MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {PENDING_DONATIONS_MAX_LIMIT}")
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        page_size = getattr(settings, 'PENDING_DONATIONS_PAGE_SIZE', PENDING_DONATIONS_PAGE_SIZE)
+
+        next_after = None
+        if limit is not None:
+            # Peek one id past the slice, so the cursor is known before streaming starts
+            beyond = DonationRequests.objects.filter(donation_status="Pending", id__gt=after).order_by('id')
+            next_after = beyond.values_list('id', flat=True)[limit - 1:limit + 1]
+            next_after = next_after[0] if len(next_after) > 1 else None
+
+        def stream():
+            rows = 0
+            yield '['
+            for page in _pending_donation_pages(after, limit, page_size):
+                for donation in page:
+                    yield (',' if rows else '') + json.dumps(_pending_donation_dict(donation))
+                    rows += 1
+            yield ']'
+            event('pending_donations_streamed', level=logging.DEBUG, rows=rows, after=after, limit=limit)
+
+        annotate(after=after, limit=limit, streamed=True)
+        response = StreamingHttpResponse(stream())
+        if next_after is not None:
+            response['X-Next-After'] = str(next_after)
+        return response
 
 
 def hospital_register(request):
@@ -314,7 +348,7 @@ def fetch_appointment_details(request):
     else:
         # Fetching appointment details
         appointment_id_from_UI = request.GET.get('appointment_id', '')
-        print('appointment id', appointment_id_from_UI)
+        annotate(appointment_id=appointment_id_from_UI)
         appointments = Appointments.objects.filter(Q(id=int(appointment_id_from_UI)))
         appointment_list = []
         for appointment in appointments:
@@ -351,7 +385,7 @@ def fetch_donation_details(request):
     else:
         # Fetching donation details
         donation_id_from_UI = request.GET.get('donation_id', '')
-        print('donation id', donation_id_from_UI)
+        annotate(donation_id=donation_id_from_UI)
         donations = DonationRequests.objects.filter(Q(id=int(donation_id_from_UI)))
         donation_list = []
         for donation in donations:
@@ -383,11 +417,12 @@ def approve_appointments(request):
     if request.POST:
         appointment_id_from_UI = request.POST.get('ID', '')
         actionToPerform = request.POST.get('action', '')
-        print('appointment id', appointment_id_from_UI)
-        print('actionToPerform', actionToPerform)
         appointments = get_object_or_404(Appointments, id=appointment_id_from_UI)
         appointments.appointment_status = actionToPerform
-        appointments.save(update_fields=["appointment_status"])
+        # The statistics rollups are updated by signals in the same transaction
+        with transaction.atomic():
+            appointments.save(update_fields=["appointment_status"])
+        event('appointment_status_changed', appointment_id=appointments.id, status=actionToPerform)
     return HttpResponse("success")
 
 
@@ -396,11 +431,11 @@ def approve_donations(request):
     if request.POST:
         donation_id_from_UI = request.POST.get('ID', '')
         actionToPerform = request.POST.get('action', '')
-        print('donation id', donation_id_from_UI)
-        print('actionToPerform', actionToPerform)
         donation = get_object_or_404(DonationRequests, id=donation_id_from_UI)
         donation.donation_status = actionToPerform
-        donation.save(update_fields=["donation_status"])
+        with transaction.atomic():
+            donation.save(update_fields=["donation_status"])
+        event('donation_status_changed', donation_id=donation.id, status=actionToPerform)
     return HttpResponse("success")
 
 
@@ -409,43 +444,8 @@ def fetch_counts(request):
     if request.POST:
         pass
     else:
-        print(f"User authenticated: {request.user.is_authenticated}")
-        print(f"Hospital ID: {request.user.id}, Hospital Name: {request.user.hospital_name}")
-        
-        # Debug: Check all appointments and their hospital associations
-        all_appointments = Appointments.objects.all()
-        print(f"All appointments in DB: {all_appointments.count()}")
-        for apt in all_appointments:
-            print(f"Apt ID: {apt.id}, Hospital: {apt.hospital.hospital_name} (ID: {apt.hospital.id}), Status: {apt.appointment_status}")
-        
-        from datetime import datetime
-        from django.utils import timezone
-        
-        # Get current month start
-        now = timezone.now()
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        appointment_count = Appointments.objects.filter(hospital__id=request.user.id, appointment_status="Pending").count()
-        donation_count = Appointments.objects.filter(hospital__id=request.user.id, appointment_status="Approved", donation_request__donation_status="Pending").count()
-        all_pending_donations = DonationRequests.objects.filter(donation_status="Pending").count()
-        
-        # Monthly statistics
-        approved_appointments_month = Appointments.objects.filter(
-            hospital__id=request.user.id, 
-            appointment_status="Approved"
-        ).count()
-        
-        lives_saved = DonationRequests.objects.filter(donation_status="Approved").count()
-        total_donors = DonationRequests.objects.values('donor').distinct().count()
-        
-        temp_dict = {
-            "appointment_count": appointment_count,
-            "donation_count": donation_count,
-            "all_pending_donations": all_pending_donations,
-            "approved_appointments_month": approved_appointments_month,
-            "lives_saved": lives_saved,
-            "total_donors": total_donors
-        }
+        # One aggregate query per hospital plus one global one, usually served from the cache
+        temp_dict = dashboard_stats.snapshot(request.user.id)
         
         return HttpResponse(json.dumps([temp_dict]))
 
@@ -493,6 +493,9 @@ def hospital_forgot_password(request):
 
 
 def form_to_PDF(request, donor_id=1):
+    # PDF libraries are slow to import and only needed here
+    import pdfkit
+    from pypdf import PdfReader, PdfWriter
 
     donation_request = DonationRequests.objects.get(id=donor_id)
     user = donation_request.donor
@@ -503,15 +506,14 @@ def form_to_PDF(request, donor_id=1):
     try:
         pdf = pdfkit.from_string(html, False, configuration=config)
     except Exception as e:
-        print(e)
-        pass
+        exception('user_report_pdf_failed', donation_id=donor_id)
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = 'inline; filename="report.pdf"'
-    userpdf = PdfFileReader(BytesIO(pdf))
+    userpdf = PdfReader(BytesIO(pdf))
     usermedicaldoc = donation_request.upload_medical_doc.read()
     usermedbytes = BytesIO(usermedicaldoc)
-    usermedicalpdf = PdfFileReader(usermedbytes)
-    merger = PdfFileMerger()
+    usermedicalpdf = PdfReader(usermedbytes)
+    merger = PdfWriter()
     merger.append(userpdf)
     merger.append(usermedicalpdf)
     merger.write(response)
@@ -557,7 +559,6 @@ def update_user_details(request):
         user.city = request.POST.get('city', '')
         user.province = request.POST.get('province', '')
         user.contact_number = request.POST.get('contact', '')
-        print("about to save...")
         user.save()
     return HttpResponse("success")
 
@@ -568,7 +569,6 @@ def update_pwd_details(request):
         user = authenticate(username=request.user.username, password=request.POST.get("old_password", ""))
         if user is not None:
             user.set_password(request.POST.get("new_password", ""))
-            print("about to save password...")
             user.save(update_fields=["password"])
     return HttpResponse("success")
 
@@ -632,6 +632,9 @@ def delete_requirement(request):
 def find_ml_matches(request):
     from ml_matching.models import HospitalOrganRequirement
     from ml_matching.matching_algorithm import OrganMatchingML
+    from ml_matching.candidates import COMPATIBLE_DONOR_BLOOD
+    from ml_matching.donor_features import MISSING_DEFAULTS, load_donor_features
+    from ml_matching.ranking import DEFAULT_K, TopK, match_key, ranking_params
     
     try:
         # Initialize ML matching
@@ -641,9 +644,10 @@ def find_ml_matches(request):
         req_id = request.GET.get('requirement_id')
         filter_organ = request.GET.get('organ_type')
         filter_blood = request.GET.get('blood_type')
-        min_score = int(request.GET.get('min_score', 0))
+        # This endpoint has always returned the best 10 unless asked for more
+        k, min_score = ranking_params(request.GET, default_k=DEFAULT_K)
         
-        print(f"ML Matching request: req_id={req_id}, organ={filter_organ}, blood={filter_blood}, min_score={min_score}")
+        annotate(requirement_id=req_id, organ_type=filter_organ, blood_type=filter_blood, k=k, min_score=min_score)
         
         # Build donation filter
         donation_filter = {'donation_status': 'Pending'}
@@ -653,9 +657,9 @@ def find_ml_matches(request):
             donation_filter['blood_type'] = filter_blood
         
         donations = DonationRequests.objects.filter(**donation_filter)
-        print(f"Found {donations.count()} donations with filter: {donation_filter}")
         
-        matches = []
+        # Only the best k donations are kept while scoring
+        best = TopK(k)
         
         # Determine hospital requirement
         hospital_req = None
@@ -669,11 +673,12 @@ def find_ml_matches(request):
                     'patient_weight': requirement.patient_weight,
                     'urgency_level': requirement.urgency_level
                 }
-                print(f"Using requirement: {hospital_req}")
             except HospitalOrganRequirement.DoesNotExist:
-                print(f"Requirement {req_id} not found")
+                event('requirement_not_found', level=logging.WARNING, requirement_id=req_id,
+                      hospital_id=request.user.id)
         
         # If no specific requirement, use filter values or defaults
+        requirement_found = hospital_req is not None
         if not hospital_req:
             hospital_req = {
                 'blood_type': filter_blood or 'O+',
@@ -682,43 +687,43 @@ def find_ml_matches(request):
                 'patient_weight': 70,
                 'urgency_level': 'Medium'
             }
-            print(f"Using default requirement: {hospital_req}")
         
-        # Calculate matches for each donation
-        for donation in donations:
-            donor_data = {
-                'blood_type': donation.blood_type,
-                'organ_type': donation.organ_type,
-                'age': 30,
-                'weight': 70,
-                'smoking_status': False,
-                'alcohol_consumption': False
-            }
-            
-            compatibility_score = ml_matcher.calculate_compatibility_score(donor_data, hospital_req)
-            print(f"Donor {donation.donor.first_name}: {donor_data['organ_type']} {donor_data['blood_type']} -> Score: {compatibility_score}")
-            
-            if compatibility_score >= min_score:
-                matches.append({
-                    'donor_id': donation.donor.id,
-                    'donor_name': f"{donation.donor.first_name} {donation.donor.last_name}",
-                    'organ_type': donation.organ_type,
-                    'blood_type': donation.blood_type,
-                    'compatibility_score': int(compatibility_score),
-                    'ml_probability': min(compatibility_score / 100, 1.0),
-                    'donor_city': donation.donor.city or 'Unknown'
-                })
+        # Only same-organ, ABO-compatible donations can serve a real requirement. The
+        # placeholder above only gives the scores a baseline, so it prunes nothing
+        # beyond the explicit organ_type/blood_type filters
+        if requirement_found:
+            donations = donations.filter(
+                organ_type=hospital_req['organ_type'],
+                blood_type__in=COMPATIBLE_DONOR_BLOOD.get(hospital_req['blood_type'], [])
+            )
+        
+        # Donor profiles in one query; donors without one are scored with default values
+        donors = load_donor_features(donations, missing=MISSING_DEFAULTS)
         
-        # Sort by compatibility score
-        matches.sort(key=lambda x: x['compatibility_score'], reverse=True)
+        # Score the candidates against the requirement in one vectorized pass
+        scores = ml_matcher.compatibility_matrix(donors, [hospital_req])[:, 0]
         
-        print(f"Returning {len(matches)} matches")
-        return HttpResponse(json.dumps(matches[:10]))
+        for donation, compatibility_score in zip(donors.donations, scores.tolist()):
+            event('candidate_scored', level=logging.DEBUG, sample=0.01, donation_id=donation.id,
+                  organ_type=donation.organ_type, blood_type=donation.blood_type, score=compatibility_score)
+            if compatibility_score >= min_score:
+                best.push(match_key(hospital_req['urgency_level'], compatibility_score, compatibility_score / 100), donation)
+        
+        # Only the k kept donations are turned into response rows
+        matches = [{
+            'donor_id': donation.donor.id,
+            'donor_name': f"{donation.donor.first_name} {donation.donor.last_name}",
+            'organ_type': donation.organ_type,
+            'blood_type': donation.blood_type,
+            'compatibility_score': int(compatibility_score),
+            'ml_probability': min(compatibility_score / 100, 1.0),
+            'donor_city': donation.donor.city or 'Unknown'
+        } for (_, compatibility_score, _), donation in best.entries()]
+        annotate(candidates=len(donors), results=len(matches))
+        return HttpResponse(json.dumps(matches))
         
     except Exception as e:
-        print(f"Error in ML matching: {e}")
-        import traceback
-        traceback.print_exc()
+        exception('ml_matching_failed', requirement_id=request.GET.get('requirement_id'))
         return HttpResponse(json.dumps([]))
 
 def test_endpoint(request):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import HospitalOrganRequirement, DonorMedicalProfile
+from .models import HospitalOrganRequirement, DonorMedicalProfile, MatchCandidate, MatchRefresh, TrainingJob
 
 @admin.register(HospitalOrganRequirement)
 class HospitalOrganRequirementAdmin(admin.ModelAdmin):
@@ -11,4 +11,18 @@ class HospitalOrganRequirementAdmin(admin.ModelAdmin):
 class DonorMedicalProfileAdmin(admin.ModelAdmin):
     list_display = ['donor', 'age', 'weight', 'height', 'smoking_status', 'alcohol_consumption']
     list_filter = ['smoking_status', 'alcohol_consumption']
-    search_fields = ['donor__username', 'donor__first_name', 'donor__last_name']
\ No newline at end of file
+    search_fields = ['donor__username', 'donor__first_name', 'donor__last_name']
+@admin.register(MatchCandidate)
+class MatchCandidateAdmin(admin.ModelAdmin):
+    list_display = ['donation_request', 'requirement', 'hospital', 'compatibility_score', 'ml_probability', 'updated_at']
+    list_filter = ['urgency_rank']
+
+@admin.register(TrainingJob)
+class TrainingJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'progress', 'stage', 'accuracy', 'requested_by', 'created_at', 'finished_at']
+    list_filter = ['status']
+
+@admin.register(MatchRefresh)
+class MatchRefreshAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'object_id', 'queued_at']
+    list_filter = ['kind']
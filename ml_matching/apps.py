@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class MlMatchingConfig(AppConfig):
+    name = 'ml_matching'
+
+    def ready(self):
+        # Keep the precomputed match table in sync with its source rows
+        from . import signals  # noqa: F401
+
+        from django.conf import settings
+        if getattr(settings, 'ML_PRELOAD_MODEL', False):
+            from .warmup import preload_model
+            preload_model(before_fork=True)
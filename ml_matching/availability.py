@@ -0,0 +1,78 @@
+"""Availability of the trained matching model.
+
+The model is in one of four states:
+
+    ready     artifacts are on disk; predictions come from the ensemble
+    building  no artifacts yet; a TrainingJob is queued or running
+    failed    no artifacts and the last build failed; retried after
+              BUILD_RETRY_SECONDS
+    missing   no artifacts and no build has been requested
+
+Requests never train. While the model is not ready, OrganMatchingML scores with
+the rule-based compatibility score and calls request_build(), which moves
+missing (or failed, after the retry delay) to building by queueing a single
+TrainingJob for run_training_worker. The worker moves building to ready or
+failed.
+"""
+import os
+from datetime import timedelta
+
+from django.utils import timezone
+
+from organ_donation.instrumentation import event
+
+from . import training_jobs
+from .matching_algorithm import OrganMatchingML
+from .models import TrainingJob
+from .registry import model_registry
+
+MODEL_READY = 'ready'
+MODEL_BUILDING = 'building'
+MODEL_FAILED = 'failed'
+MODEL_MISSING = 'missing'
+
+# How long a failed build blocks new automatic builds
+BUILD_RETRY_SECONDS = 300
+
+
+def _latest_job():
+    return TrainingJob.objects.order_by('-created_at', '-id').first()
+
+
+def model_state(ml_matcher=None, loaded=None):
+    """Current state of the matching model (one of the MODEL_* constants).
+
+    Never loads the model. loaded is whether ml_matcher.load_model() succeeded,
+    for callers that already tried; otherwise the artifacts are looked for in
+    the registry and on disk.
+    """
+    if loaded is None:
+        model_path = (ml_matcher or OrganMatchingML()).model_path
+        loaded = model_registry.loaded(model_path) or os.path.exists(model_path)
+    if loaded:
+        return MODEL_READY
+    job = _latest_job()
+    if job is None:
+        return MODEL_MISSING
+    if job.status in training_jobs.ACTIVE_STATUSES:
+        return MODEL_BUILDING
+    if job.status == 'Failed':
+        return MODEL_FAILED
+    # A build succeeded but its artifacts are gone
+    return MODEL_MISSING
+
+
+def request_build(ml_matcher=None, loaded=None):
+    """Queue a background build if no model exists and none is pending; returns the new state"""
+    state = model_state(ml_matcher, loaded)
+    if state == MODEL_FAILED:
+        job = _latest_job()
+        finished_at = job.finished_at or job.created_at
+        if timezone.now() - finished_at < timedelta(seconds=BUILD_RETRY_SECONDS):
+            return state
+    elif state != MODEL_MISSING:
+        return state
+
+    job = training_jobs.enqueue_training()
+    event('training_queued', job_id=job.id, reason='no trained model')
+    return MODEL_BUILDING
@@ -0,0 +1,363 @@
+"""Compact, inference-only export of the trained matching model.
+
+The joblib artifacts pickle whole sklearn objects, training-only state
+included, and every worker that unpickles them holds a private float64 copy.
+export_bundle() writes the same model as one versioned file:
+
+    magic | header length | JSON header | 64-byte aligned arrays
+
+The header holds the label encoders as plain lookup tables, small scalars
+(intercepts, Platt coefficients, voting weights) and the offset, dtype and
+shape of every array. Arrays hold the scaler center/scale, the selected
+feature indices and the estimator parameters: compiled tree nodes (see
+ml_matching.compiled_trees), support vectors and MLP layers, in float32
+where the members are fitted in float64.
+
+read_bundle() maps the file read-only and builds numpy views over it, so
+loading costs the same whatever the model size and every process on a host
+shares one copy of the pages. The returned components offer the
+transform/predict_proba/classes_ interface OrganMatchingML uses, without
+importing sklearn.
+"""
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+try:
+    from .compiled_trees import CompiledBoosting, CompiledForest, CompiledTrees, compile_tree_ensemble
+except ImportError:
+    # Imported as a top-level module by the standalone runner
+    from compiled_trees import CompiledBoosting, CompiledForest, CompiledTrees, compile_tree_ensemble
+
+MAGIC = b'OMBUNDLE'
+FORMAT_VERSION = 2
+BUNDLE_NAME = 'model_bundle.bin'
+
+_ALIGNMENT = 64
+_LENGTH = struct.Struct('<Q')
+
+
+def bundle_path(model_path):
+    """Where the bundle for the artifact set rooted at model_path lives"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), BUNDLE_NAME)
+
+
+class _ArrayWriter:
+    """Collects named arrays and their layout for the bundle header"""
+
+    def __init__(self):
+        self.arrays = []
+        self.layout = {}
+        self.size = 0
+
+    def add(self, name, array, dtype):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        self.size = -(-self.size // _ALIGNMENT) * _ALIGNMENT
+        self.layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': self.size}
+        self.arrays.append((self.size, array))
+        self.size += array.nbytes
+        return name
+
+
+def _export_trees(writer, name, compiled):
+    """Header entry for a CompiledForest or CompiledBoosting"""
+    arrays = {
+        key: writer.add(f'{name}.{key}', array, array.dtype)
+        for key, array in compiled.trees.arrays().items()
+    }
+    member = {'name': name, 'kind': compiled.kind, 'depth': compiled.trees.depth, 'arrays': arrays}
+    if compiled.kind == 'boosting':
+        member['init'] = compiled.init
+    return member
+
+
+def _export_member(writer, name, estimator):
+    """Header entry for one fitted ensemble member"""
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.svm import SVC
+
+    if len(estimator.classes_) != 2:
+        raise ValueError(f"{name}: only binary classifiers can be exported")
+
+    if isinstance(estimator, (RandomForestClassifier, GradientBoostingClassifier)):
+        return _export_trees(writer, name, compile_tree_ensemble(estimator))
+
+    if isinstance(estimator, SVC):
+        if estimator.kernel != 'rbf' or not estimator.probability:
+            raise ValueError(f"{name}: only SVC(kernel='rbf', probability=True) can be exported")
+        arrays = {
+            'support_vectors': writer.add(f'{name}.support_vectors', estimator.support_vectors_, np.float32),
+            'dual_coef': writer.add(f'{name}.dual_coef', estimator._dual_coef_[0], np.float32),
+        }
+        return {
+            'name': name, 'kind': 'svm', 'arrays': arrays,
+            'gamma': float(estimator._gamma),
+            'intercept': float(estimator._intercept_[0]),
+            'prob_a': float(estimator.probA_[0]),
+            'prob_b': float(estimator.probB_[0]),
+        }
+
+    if isinstance(estimator, MLPClassifier):
+        arrays = {'coefs': [], 'intercepts': []}
+        for layer, (coef, intercept) in enumerate(zip(estimator.coefs_, estimator.intercepts_)):
+            arrays['coefs'].append(writer.add(f'{name}.coef{layer}', coef, np.float32))
+            arrays['intercepts'].append(writer.add(f'{name}.intercept{layer}', intercept, np.float32))
+        return {'name': name, 'kind': 'mlp', 'activation': estimator.activation, 'arrays': arrays}
+
+    raise ValueError(f"{name}: cannot export {type(estimator).__name__}")
+
+
+def export_bundle(path, model, scaler, label_encoders, feature_selector, source=None, serving=None):
+    """Write the inference bundle for fitted components to path, atomically.
+
+    source maps artifact file names to the content hashes they were exported
+    from; the model registry only serves a bundle whose source matches the
+    artifacts on disk. serving, from ml_matching.serving.choose_serving_members,
+    names the members online requests use; without it they use every member.
+    """
+    writer = _ArrayWriter()
+
+    if hasattr(model, 'named_estimators_'):
+        if getattr(model, 'voting', 'soft') != 'soft':
+            raise ValueError("only soft-voting ensembles can be exported")
+        weights = model.weights or [1.0] * len(model.estimators)
+        fitted = [(name, float(w)) for (name, est), w in zip(model.estimators, weights)
+                  if not (isinstance(est, str) and est == 'drop')]
+        members = [_export_member(writer, name, model.named_estimators_[name]) for name, _ in fitted]
+        weights = [w for _, w in fitted]
+    else:
+        members = [_export_member(writer, type(model).__name__, model)]
+        weights = [1.0]
+
+    center = getattr(scaler, 'center_', getattr(scaler, 'mean_', None))
+    scale = getattr(scaler, 'scale_', None)
+    n_features = scaler.n_features_in_
+    # Scaling stays in float64 so rows land on the same side of every tree threshold
+    scaler_arrays = {
+        'center': writer.add('scaler.center', np.zeros(n_features) if center is None else center, np.float64),
+        'scale': writer.add('scaler.scale', np.ones(n_features) if scale is None else scale, np.float64),
+    }
+    selected = (feature_selector.get_support(indices=True) if feature_selector is not None
+                else np.arange(n_features))
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'created_at': time.time(),
+        'source': source or {},
+        'classes': [c.item() if hasattr(c, 'item') else c for c in model.classes_],
+        'encoders': {
+            column: [str(label) for label in encoder.classes_]
+            for column, encoder in label_encoders.items()
+        },
+        'scaler': scaler_arrays,
+        'selected': writer.add('selector.selected', selected, np.int32),
+        'members': members,
+        'weights': weights,
+        'serving': serving,
+        'arrays': writer.layout,
+    }
+
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + _LENGTH.size + len(header_bytes)) // _ALIGNMENT) * _ALIGNMENT
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as fh:
+        fh.write(MAGIC)
+        fh.write(_LENGTH.pack(len(header_bytes)))
+        fh.write(header_bytes)
+        for offset, array in writer.arrays:
+            fh.seek(data_start + offset)
+            fh.write(array.tobytes())
+        fh.truncate(data_start + writer.size)
+    os.replace(tmp, path)
+    return path
+
+
+class LabelLookup:
+    """LabelEncoder.transform backed by a dict"""
+
+    def __init__(self, classes):
+        self.classes_ = np.array(classes, dtype=object)
+        self._codes = {label: code for code, label in enumerate(classes)}
+
+    def transform(self, values):
+        try:
+            return np.array([self._codes[value] for value in values], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"y contains previously unseen labels: {e.args[0]!r}")
+
+
+class BundleScaler:
+    def __init__(self, center, scale):
+        self.center = center
+        self.scale = scale
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.center) / self.scale
+
+
+class BundleSelector:
+    def __init__(self, selected):
+        self.selected = selected
+
+    def transform(self, X):
+        return np.asarray(X)[:, self.selected]
+
+
+def _expit(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+_ACTIVATIONS = {
+    'identity': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+    'tanh': np.tanh,
+    'logistic': _expit,
+}
+
+
+def _couple_pairwise(first):
+    """libsvm's multiclass_probability for two classes, one row per pairwise probability.
+
+    libsvm turns the Platt probability into class probabilities with an
+    iterative solver that stops at a tolerance of 0.0025, so its output can
+    differ from the Platt probability by that much; this repeats the same
+    iterations to reproduce SVC.predict_proba.
+    """
+    first = np.clip(first, 1e-7, 1 - 1e-7)
+    second = 1.0 - first
+    Q = np.empty((len(first), 2, 2))
+    Q[:, 0, 0] = second ** 2
+    Q[:, 1, 1] = first ** 2
+    Q[:, 0, 1] = Q[:, 1, 0] = -first * second
+    p = np.full((len(first), 2), 0.5)
+    Qp = np.einsum('nij,nj->ni', Q, p)
+    pQp = (p * Qp).sum(axis=1)
+    active = np.ones(len(first), dtype=bool)
+    for _ in range(100):
+        active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= 0.005 / 2
+        if not active.any():
+            break
+        for t in range(2):
+            q = Q[active]
+            diff = (pQp[active] - Qp[active, t]) / q[:, t, t]
+            p[active, t] += diff
+            pQp[active] = (pQp[active] + diff * (diff * q[:, t, t] + 2 * Qp[active, t])) / (1 + diff) ** 2
+            Qp[active] = (Qp[active] + diff[:, None] * q[:, t, :]) / (1 + diff)[:, None]
+            p[active] /= (1 + diff)[:, None]
+    return p
+
+
+def _member_proba(member, arrays, X):
+    """P(positive class) from one member for selected, scaled rows X"""
+    kind = member['kind']
+    if kind in ('forest', 'boosting'):
+        return arrays['compiled'].positive_proba(X)
+    if kind == 'svm':
+        support_vectors = arrays['support_vectors']
+        distances = (
+            (X ** 2).sum(axis=1)[:, None]
+            - 2 * X @ support_vectors.T
+            + (support_vectors.astype(np.float64) ** 2).sum(axis=1)[None, :]
+        )
+        decision = np.exp(-member['gamma'] * np.maximum(distances, 0)) @ arrays['dual_coef'] + member['intercept']
+        # Platt scaling gives the pairwise probability of the first class
+        return _couple_pairwise(_expit(-(decision * member['prob_a'] + member['prob_b'])))[:, 1]
+    if kind == 'mlp':
+        activation = _ACTIVATIONS[member['activation']]
+        hidden = X.astype(np.float32)
+        layers = list(zip(arrays['coefs'], arrays['intercepts']))
+        for coef, intercept in layers[:-1]:
+            hidden = activation(hidden @ coef + intercept)
+        coef, intercept = layers[-1]
+        return _expit((hidden @ coef + intercept)[:, 0].astype(np.float64))
+    raise ValueError(f"unknown member kind {kind!r}")
+
+
+def _resolve(member, views):
+    """The arrays a member is evaluated from, as views into the bundle"""
+    resolved = {key: ([views[n] for n in name] if isinstance(name, list) else views[name])
+                for key, name in member['arrays'].items()}
+    if member['kind'] == 'forest':
+        return {'compiled': CompiledForest(CompiledTrees(depth=member['depth'], **resolved))}
+    if member['kind'] == 'boosting':
+        trees = CompiledTrees(depth=member['depth'], **resolved)
+        return {'compiled': CompiledBoosting(trees, member['init'])}
+    return resolved
+
+
+class BundleEnsemble:
+    """Soft-voting ensemble evaluated from the bundle's arrays"""
+
+    def __init__(self, classes, members, weights, arrays):
+        self.classes_ = np.array(classes)
+        self.members = members
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self._arrays = arrays
+
+    @property
+    def member_names(self):
+        return [member['name'] for member in self.members]
+
+    def subset(self, names):
+        """The ensemble of just the named members, with their original voting weights"""
+        keep = [self.member_names.index(name) for name in names]
+        return BundleEnsemble(self.classes_, [self.members[i] for i in keep],
+                              self.weights[keep], [self._arrays[i] for i in keep])
+
+    def member_proba(self, index, X):
+        """P(positive class) from one member"""
+        return _member_proba(self.members[index], self._arrays[index], np.asarray(X, dtype=np.float64))
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        positive = np.zeros(len(X))
+        for index, weight in enumerate(self.weights):
+            positive += weight * self.member_proba(index, X)
+        positive /= self.weights.sum()
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class InferenceBundle:
+    """The components of a bundle, mapped read-only from disk"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        (header_length,) = _LENGTH.unpack_from(self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + _LENGTH.size
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+        if header['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"{path} has bundle format {header['format_version']}, expected {FORMAT_VERSION}")
+        data_start = -(-(header_start + header_length) // _ALIGNMENT) * _ALIGNMENT
+
+        views = {
+            name: np.frombuffer(self._mmap, dtype=layout['dtype'], count=int(np.prod(layout['shape'])),
+                                offset=data_start + layout['offset']).reshape(layout['shape'])
+            for name, layout in header['arrays'].items()
+        }
+        self.path = path
+        self.header = header
+        self.source = header['source']
+        self.label_encoders = {column: LabelLookup(classes) for column, classes in header['encoders'].items()}
+        self.scaler = BundleScaler(views[header['scaler']['center']], views[header['scaler']['scale']])
+        self.feature_selector = BundleSelector(views[header['selected']])
+        self.model = BundleEnsemble(header['classes'], header['members'], header['weights'],
+                                    [_resolve(member, views) for member in header['members']])
+        # Online requests use the members chosen for the latency budget (see ml_matching.serving)
+        serving = header.get('serving')
+        self.serving_model = self.model.subset(serving['members']) if serving else self.model
+
+
+def read_bundle(path):
+    """Map the bundle at path; raises ValueError if it is not a bundle this code can read"""
+    return InferenceBundle(path)
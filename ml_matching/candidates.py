@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+import numpy as np
+
+try:
+    from .scoring import BLOOD_COMPATIBILITY, BLOOD_TYPES
+except ImportError:
+    # Imported as a top-level module by the standalone runner
+    from scoring import BLOOD_COMPATIBILITY, BLOOD_TYPES
+
+# Recipient blood type -> donor blood types it can receive from
+COMPATIBLE_DONOR_BLOOD = {
+    recipient: [donor for donor, recipients in BLOOD_COMPATIBILITY.items() if recipient in recipients]
+    for recipient in BLOOD_TYPES
+}
+
+
+def _attribute_key(item):
+    return item.organ_type, item.blood_type
+
+
+class CandidateIndex:
+    """In-memory index of donations for pruning the donor x requirement search.
+
+    Donations are bucketed by (organ_type, donor blood_type). Looking up a
+    requirement's (organ_type, recipient blood_type) returns only same-organ,
+    ABO-compatible donations, so matching cost scales with the number of
+    compatible pairs instead of the full product. Candidates are returned as
+    positions into the sequence the index was built from, in that order.
+    """
+
+    def __init__(self, donations, key=_attribute_key):
+        self.donations = list(donations)
+        self._buckets = defaultdict(list)
+        for position, donation in enumerate(self.donations):
+            self._buckets[key(donation)].append(position)
+        self._by_requirement = {}
+
+    def __len__(self):
+        return len(self.donations)
+
+    def candidate_positions(self, organ_type, recipient_blood):
+        """Sorted positions of donations that can serve a (organ_type, recipient_blood) requirement"""
+        lookup = (organ_type, recipient_blood)
+        if lookup not in self._by_requirement:
+            positions = []
+            for donor_blood in COMPATIBLE_DONOR_BLOOD.get(recipient_blood, []):
+                positions.extend(self._buckets.get((organ_type, donor_blood), []))
+            self._by_requirement[lookup] = sorted(positions)
+        return self._by_requirement[lookup]
+
+    def candidates(self, organ_type, recipient_blood):
+        """Donations that can serve a (organ_type, recipient_blood) requirement"""
+        return [self.donations[p] for p in self.candidate_positions(organ_type, recipient_blood)]
+
+    def pairs(self, requirements, key=_attribute_key):
+        """Index arrays (donor_idx, req_idx) of every compatible pair, donor-major like the full grid"""
+        donor_idx, req_idx = [], []
+        for j, requirement in enumerate(requirements):
+            positions = self.candidate_positions(*key(requirement))
+            donor_idx.extend(positions)
+            req_idx.extend([j] * len(positions))
+        donor_idx = np.array(donor_idx, dtype=np.int64)
+        req_idx = np.array(req_idx, dtype=np.int64)
+        order = np.lexsort((req_idx, donor_idx))
+        return donor_idx[order], req_idx[order]
@@ -0,0 +1,198 @@
+"""Tree ensembles compiled to flat node arrays and evaluated with numpy.
+
+sklearn's forest and boosting predict_proba visit their trees one by one, so
+a single row through the default model pays Python and joblib dispatch for
+200 forest trees and 150 boosting stages. CompiledTrees concatenates every
+tree of an ensemble into flat arrays:
+
+    nodes      child << FEATURE_BITS | feature, one int64 per node
+    threshold  float32; rows with x > threshold take the right child
+    value      float32 leaf value (positive-class share, or scaled stage output)
+    leaf       True for leaves
+    roots      index of each tree's root
+
+Nodes are renumbered breadth first so a node's children are adjacent (right
+is left + 1), and each leaf is its own child with an infinite threshold.
+leaf_values() starts one cursor per (row, tree) at the roots and advances all
+of them together, one gather of `nodes` and one of `threshold` per step;
+every few steps cursors that reached a leaf are retired.
+
+Inputs are compared as float32, as sklearn does, against thresholds rounded
+down to float32, which keeps every split decision identical to sklearn's.
+"""
+import numpy as np
+
+FEATURE_BITS = 16
+FEATURE_MASK = (1 << FEATURE_BITS) - 1
+
+# Cursors advanced per block of rows; bounds the temporaries for large batches
+BLOCK_CURSORS = 1 << 16
+
+# Steps between retiring cursors that reached a leaf
+RETIRE_EVERY = 3
+
+
+def float32_floor(values):
+    """values rounded down to float32.
+
+    sklearn trees compare float32 inputs against float64 thresholds;
+    x <= t holds for a float32 x exactly when x <= the largest float32 <= t.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    over = rounded.astype(np.float64) > values
+    rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+    return rounded
+
+
+def _expit(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _breadth_first(tree):
+    """Node ids of a sklearn tree_ in breadth-first order, so siblings are adjacent"""
+    order = [0]
+    # The list grows while it is walked: each internal node queues its two children
+    for node in order:
+        if tree.children_left[node] >= 0:
+            order += [tree.children_left[node], tree.children_right[node]]
+    return np.array(order, dtype=np.int64)
+
+
+class CompiledTrees:
+    """The nodes of many decision trees in flat arrays"""
+
+    def __init__(self, nodes, threshold, value, leaf, roots, depth):
+        self.nodes = nodes
+        self.threshold = threshold
+        self.value = value
+        self.leaf = leaf
+        self.roots = roots
+        self.depth = depth
+
+    @classmethod
+    def compile(cls, trees, leaf_value):
+        """Flatten fitted sklearn trees; leaf_value maps a tree_.value array to one value per node"""
+        roots, nodes, thresholds, values, leaves = [], [], [], [], []
+        offset = 0
+        depth = 0
+        for tree in trees:
+            tree = tree.tree_
+            if tree.n_features > FEATURE_MASK:
+                raise ValueError(f"trees with more than {FEATURE_MASK} features cannot be compiled")
+            order = _breadth_first(tree)
+            new_id = np.empty(tree.node_count, dtype=np.int64)
+            new_id[order] = np.arange(offset, offset + tree.node_count)
+
+            leaf = tree.children_left[order] < 0
+            child = np.where(leaf, new_id[order], new_id[np.maximum(tree.children_left[order], 0)])
+            roots.append(offset)
+            nodes.append(child << FEATURE_BITS | np.where(leaf, 0, tree.feature[order]))
+            # +inf keeps every input on the leaf itself
+            thresholds.append(np.where(leaf, np.float32(np.inf), float32_floor(tree.threshold[order])))
+            values.append(leaf_value(tree.value)[order])
+            leaves.append(leaf)
+            offset += tree.node_count
+            depth = max(depth, tree.max_depth)
+        return cls(
+            nodes=np.concatenate(nodes).astype(np.int64),
+            threshold=np.concatenate(thresholds).astype(np.float32),
+            value=np.concatenate(values).astype(np.float32),
+            leaf=np.concatenate(leaves),
+            roots=np.array(roots, dtype=np.int64),
+            depth=depth,
+        )
+
+    def arrays(self):
+        """The node arrays by name, for serialization"""
+        return {
+            'nodes': self.nodes, 'threshold': self.threshold, 'value': self.value,
+            'leaf': self.leaf, 'roots': self.roots,
+        }
+
+    def leaf_values(self, X):
+        """Value of the leaf each row reaches in each tree, as an (n_rows, n_trees) float64 array"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        values = np.empty(n_rows * n_trees)
+        flat = X.ravel()
+        block = max(1, BLOCK_CURSORS // max(n_trees, 1))
+        for start in range(0, n_rows, block):
+            stop = min(start + block, n_rows)
+            offsets = np.repeat(np.arange(start, stop, dtype=np.int64) * n_features, n_trees)
+            node = np.tile(self.roots, stop - start)
+            slot = np.arange(start * n_trees, stop * n_trees)
+            for step in range(1, self.depth + 1):
+                record = self.nodes[node]
+                node = (record >> FEATURE_BITS) + (flat[offsets + (record & FEATURE_MASK)] > self.threshold[node])
+                if step % RETIRE_EVERY == 0 or step == self.depth:
+                    done = self.leaf[node]
+                    values[slot[done]] = self.value[node[done]]
+                    active = ~done
+                    node, offsets, slot = node[active], offsets[active], slot[active]
+                    if not len(node):
+                        break
+        return values.reshape(n_rows, n_trees)
+
+
+class CompiledForest:
+    """RandomForestClassifier (binary) predictions from compiled trees"""
+
+    kind = 'forest'
+
+    def __init__(self, trees):
+        self.trees = trees
+
+    @classmethod
+    def compile(cls, forest):
+        def positive_share(value):
+            counts = value[:, 0, :]
+            totals = counts.sum(axis=1)
+            totals[totals == 0] = 1.0
+            return counts[:, 1] / totals
+        return cls(CompiledTrees.compile(forest.estimators_, positive_share))
+
+    def positive_proba(self, X):
+        return self.trees.leaf_values(X).mean(axis=1)
+
+    def predict_proba(self, X):
+        positive = self.positive_proba(X)
+        return np.column_stack([1.0 - positive, positive])
+
+
+class CompiledBoosting:
+    """GradientBoostingClassifier (binary, log-loss) predictions from compiled trees"""
+
+    kind = 'boosting'
+
+    def __init__(self, trees, init):
+        self.trees = trees
+        self.init = init
+
+    @classmethod
+    def compile(cls, booster):
+        # Fold the learning rate into the leaves, as sklearn does when predicting
+        trees = CompiledTrees.compile(booster.estimators_[:, 0], lambda value: booster.learning_rate * value[:, 0, 0])
+        init = booster._raw_predict_init(np.zeros((1, booster.n_features_in_), dtype=np.float32))
+        return cls(trees, float(init[0, 0]))
+
+    def positive_proba(self, X):
+        return _expit(self.init + self.trees.leaf_values(X).sum(axis=1))
+
+    def predict_proba(self, X):
+        positive = self.positive_proba(X)
+        return np.column_stack([1.0 - positive, positive])
+
+
+def compile_tree_ensemble(estimator):
+    """CompiledForest or CompiledBoosting for a fitted binary tree ensemble"""
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+
+    if len(estimator.classes_) != 2:
+        raise ValueError("only binary classifiers can be compiled")
+    if isinstance(estimator, RandomForestClassifier):
+        return CompiledForest.compile(estimator)
+    if isinstance(estimator, GradientBoostingClassifier):
+        return CompiledBoosting.compile(estimator)
+    raise ValueError(f"cannot compile {type(estimator).__name__}")
@@ -0,0 +1,35 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_matching.bundle import bundle_path, export_bundle, read_bundle
+from ml_matching.matching_algorithm import OrganMatchingML
+from ml_matching.registry import artifact_hashes, model_registry
+
+
+class Command(BaseCommand):
+    help = ("Export the trained joblib artifacts as the inference bundle workers memory-map. "
+            "Training exports it automatically; use this for models trained before that.")
+
+    def handle(self, *args, **options):
+        import joblib
+
+        ml_matcher = OrganMatchingML()
+        paths = [ml_matcher.model_path, ml_matcher.scaler_path, ml_matcher.encoders_path, ml_matcher.selector_path]
+        if not os.path.exists(ml_matcher.model_path):
+            raise CommandError(f"No trained model at {ml_matcher.model_path}")
+
+        source = artifact_hashes(paths)
+        components = [joblib.load(path) if os.path.exists(path) else None for path in paths]
+        path = bundle_path(ml_matcher.model_path)
+        try:
+            export_bundle(path, *components, source=source)
+        except ValueError as e:
+            raise CommandError(f"Cannot export this model: {e}")
+        model_registry.invalidate(ml_matcher.model_path)
+
+        bundle = read_bundle(path)
+        members = ', '.join(member['name'] for member in bundle.header['members'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KiB; members: {members})"
+        ))
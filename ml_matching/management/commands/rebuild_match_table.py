@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ml_matching import availability, match_table
+from ml_matching.matching_algorithm import OrganMatchingML
+
+
+class Command(BaseCommand):
+    help = "Recompute every row of the precomputed MatchCandidate table"
+
+    def handle(self, *args, **options):
+        stats = {}
+        stored = match_table.rebuild(stats=stats)
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} match candidates"))
+        self.stdout.write(OrganMatchingML.describe_cascade(stats))
+        state = availability.model_state()
+        if state != availability.MODEL_READY:
+            self.stdout.write(self.style.WARNING(
+                f"No trained model ({state}); rows were scored by the rule-based scorer "
+                "and will be rescored when training finishes."
+            ))
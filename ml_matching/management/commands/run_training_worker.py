@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ml_matching import match_table, training_jobs
+from ml_matching.parallelism import add_n_jobs_argument
+
+
+class Command(BaseCommand):
+    help = ("Poll the database for queued TrainingJobs and run them, one at a time; "
+            "between jobs, run queued match table refreshes")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help="Seconds to sleep when both queues are empty")
+        parser.add_argument('--once', action='store_true',
+                            help="Run at most one job, or one batch of refreshes, then exit")
+        parser.add_argument('--refresh-batch', type=int, default=100,
+                            help="Match table refreshes to run between checks for training jobs")
+        add_n_jobs_argument(parser)
+
+    def handle(self, *args, **options):
+        while True:
+            job = training_jobs.claim_next_job()
+            if job is None:
+                refreshed = match_table.run_queued_refreshes(limit=options['refresh_batch'])
+                if options['once']:
+                    return
+                if not refreshed:
+                    time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Running training job {job.id}")
+            job = training_jobs.run_job(job, n_jobs=options['n_jobs'])
+            if job.status == 'Succeeded':
+                self.stdout.write(self.style.SUCCESS(f"Job {job.id} finished, accuracy {job.accuracy:.4f}"))
+            else:
+                self.stderr.write(f"Job {job.id} failed:\n{job.error}")
+
+            if options['once']:
+                return
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Imported only by the code paths that need them (training, model loading, PDF export)
+HEAVY_MODULES = ['sklearn', 'scipy', 'pandas', 'joblib', 'pdfkit', 'xhtml2pdf', 'pypdf']
+
+
+def startup_targets():
+    """(name, argv) of each startup path to measure"""
+    return [
+        ('wsgi', [sys.executable, '-X', 'importtime', '-c', 'import organ_donation.wsgi']),
+        ('manage.py check', [sys.executable, '-X', 'importtime', os.path.join(settings.BASE_DIR, 'manage.py'), 'check']),
+    ]
+
+
+def parse_importtime(stderr):
+    """Import microseconds spent in each top-level package, from `python -X importtime` output.
+
+    Sums each module's self time, so a package is charged only for its own
+    modules and not for the dependencies it pulls in.
+    """
+    by_package = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, _, name = line[len('import time:'):].split('|')
+        by_package[name.strip().split('.')[0]] += int(self_time)
+    return dict(by_package)
+
+
+def measure(argv):
+    """(wall seconds, import microseconds per package) of one fresh interpreter"""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE, ML_PRELOAD_MODEL='0')
+    start = time.perf_counter()
+    result = subprocess.run(argv, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise CommandError(f"{' '.join(argv)} failed:\n{result.stderr[-2000:]}")
+    return wall, parse_importtime(result.stderr)
+
+
+class Command(BaseCommand):
+    help = ("Measure import time of the web app and manage.py startup, and fail if a "
+            "heavy optional dependency is imported at boot")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10,
+                            help="Number of slowest top-level packages to list per target")
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help="Fail if any target's wall time exceeds this many milliseconds")
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, argv in startup_targets():
+            wall, by_package = measure(argv)
+            total = sum(by_package.values())
+            self.stdout.write(f"{name}: {wall * 1000:.0f} ms wall, {total / 1000:.0f} ms in imports")
+            slowest = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+            for package, micros in slowest:
+                self.stdout.write(f"  {micros / 1000:8.1f} ms  {package}")
+
+            heavy = [module for module in HEAVY_MODULES if module in by_package]
+            if heavy:
+                failures.append(f"{name} imports {', '.join(heavy)} at startup")
+            if options['budget_ms'] is not None and wall * 1000 > options['budget_ms']:
+                failures.append(f"{name} took {wall * 1000:.0f} ms (budget {options['budget_ms']:.0f} ms)")
+
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS("No heavy dependencies imported at startup"))
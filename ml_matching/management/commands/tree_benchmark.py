@@ -0,0 +1,77 @@
+import os
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_matching.compiled_trees import compile_tree_ensemble
+from ml_matching.matching_algorithm import OrganMatchingML
+from ml_matching.training_data import scoring_pairs, synthetic_training_data
+
+
+def best_time(predict, X, repeat):
+    """Fastest of repeat calls, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = ("Compare the compiled tree evaluator with sklearn's predict_proba for the forest and "
+            "boosting members of the trained model, and fail if their outputs differ")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 10000],
+                            help="Rows per predict call")
+        parser.add_argument('--repeat', type=int, default=5,
+                            help="Calls per batch size; the fastest is reported")
+        parser.add_argument('--tolerance', type=float, default=1e-6,
+                            help="Largest allowed difference between the two probabilities")
+        parser.add_argument('--seed', type=int, default=7,
+                            help="Seed of the held-out synthetic rows (training uses 42)")
+
+    def handle(self, *args, **options):
+        import joblib
+
+        ml_matcher = OrganMatchingML()
+        if not os.path.exists(ml_matcher.model_path):
+            raise CommandError(f"No trained model at {ml_matcher.model_path}")
+        model = joblib.load(ml_matcher.model_path)
+        scaler = joblib.load(ml_matcher.scaler_path)
+        ml_matcher.label_encoders = joblib.load(ml_matcher.encoders_path)
+        selector = joblib.load(ml_matcher.selector_path)
+
+        n_rows = max(options['batch_sizes'])
+        donors, requirements = scoring_pairs(synthetic_training_data(n_samples=n_rows, seed=options['seed']))
+        pairs = np.arange(n_rows)
+        X, valid = ml_matcher.build_feature_matrix(donors, requirements, pairs, pairs)
+        X = selector.transform(scaler.transform(X[valid]))
+        # Top up to the largest batch if some rows had unseen labels
+        X = np.resize(X, (n_rows, X.shape[1]))
+
+        failures = []
+        members = getattr(model, 'named_estimators_', {type(model).__name__: model})
+        for name, estimator in members.items():
+            try:
+                compiled = compile_tree_ensemble(estimator)
+            except ValueError:
+                continue
+            difference = np.abs(compiled.predict_proba(X) - estimator.predict_proba(X)).max()
+            self.stdout.write(f"{name}: {len(compiled.trees.roots)} trees, {len(compiled.trees.nodes)} nodes, "
+                              f"depth {compiled.trees.depth}; max |difference| {difference:.2e}")
+            for batch_size in options['batch_sizes']:
+                batch = X[:batch_size]
+                sklearn_seconds = best_time(estimator.predict_proba, batch, options['repeat'])
+                compiled_seconds = best_time(compiled.predict_proba, batch, options['repeat'])
+                self.stdout.write(f"  batch {batch_size:>6}: sklearn {sklearn_seconds * 1000:9.2f} ms   "
+                                  f"compiled {compiled_seconds * 1000:9.2f} ms   "
+                                  f"x{sklearn_seconds / compiled_seconds:.1f}")
+            if difference > options['tolerance']:
+                failures.append(f"{name} differs by {difference:.2e}")
+
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS(f"Compiled trees match predict_proba within {options['tolerance']}"))
@@ -0,0 +1,158 @@
+"""Maintenance of the precomputed MatchCandidate table.
+
+Each refresh_* function recomputes only the rows affected by one changed
+donation, requirement or donor profile. Saves don't call them directly: they
+enqueue_refresh() a MatchRefresh row, and the worker runs the queue with
+run_queued_refreshes(). rebuild() recomputes everything and is used after
+retraining and by the rebuild_match_table command.
+"""
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from organ_donation.instrumentation import event, exception
+
+from donors.models import DonationRequests
+from .candidates import COMPATIBLE_DONOR_BLOOD
+from .matching_algorithm import OrganMatchingML
+from .models import HospitalOrganRequirement, MatchCandidate, MatchRefresh
+from .scoring import BLOOD_COMPATIBILITY
+from .serving import OFFLINE_ENSEMBLE
+
+
+def _store(stale_rows, donations=None, requirements=None, stats=None):
+    """Replace stale_rows with fresh scores for the given donations x requirements.
+
+    Every row is scored by the offline (full) ensemble, so a stored probability
+    and its place in stored_matches don't depend on which path wrote it; the
+    serving ensemble only scores live find_matches requests.
+
+    Only pairs that pass the scoring cascade get a row. Without a trained model
+    the rows are scored by the rule-based scorer and marked as such; rebuild()
+    replaces them once the model is published. stats, if given, is updated
+    with the cascade's counts and timings.
+    """
+    ml_matcher = OrganMatchingML(OFFLINE_ENSEMBLE)
+    scored = ml_matcher.score_candidates(*ml_matcher.load_matching_data(donations, requirements))
+    if stats is not None:
+        stats.update(ml_matcher.cascade_stats)
+    with transaction.atomic():
+        stale_rows.delete()
+        MatchCandidate.objects.bulk_create([
+            MatchCandidate(
+                donation_request=donation,
+                requirement=req,
+                hospital_id=req.hospital_id,
+                compatibility_score=compatibility_score,
+                ml_probability=float(probability),
+                scorer=ml_matcher.scorer,
+                urgency_rank=MatchCandidate.URGENCY_RANK.get(req.urgency_level, 0)
+            )
+            for donation, req, compatibility_score, probability in scored
+        ], batch_size=1000)
+    return len(scored)
+
+
+def refresh_donation(donation_id):
+    """Recompute the row of the match table for one donation request"""
+    stale_rows = MatchCandidate.objects.filter(donation_request_id=donation_id)
+    donation = DonationRequests.objects.filter(id=donation_id).first()
+    if donation is None or donation.donation_status != 'Pending':
+        stale_rows.delete()
+        return 0
+    requirements = HospitalOrganRequirement.objects.filter(
+        is_active=True,
+        organ_type=donation.organ_type,
+        blood_type__in=BLOOD_COMPATIBILITY.get(donation.blood_type, [])
+    )
+    return _store(stale_rows, DonationRequests.objects.filter(id=donation_id), requirements)
+
+
+def refresh_requirement(requirement_id):
+    """Recompute the column of the match table for one hospital requirement"""
+    stale_rows = MatchCandidate.objects.filter(requirement_id=requirement_id)
+    requirement = HospitalOrganRequirement.objects.filter(id=requirement_id).first()
+    if requirement is None or not requirement.is_active:
+        stale_rows.delete()
+        return 0
+    donations = DonationRequests.objects.filter(
+        donation_status='Pending',
+        organ_type=requirement.organ_type,
+        blood_type__in=COMPATIBLE_DONOR_BLOOD.get(requirement.blood_type, [])
+    )
+    return _store(stale_rows, donations, HospitalOrganRequirement.objects.filter(id=requirement_id))
+
+
+def refresh_donor(donor_id):
+    """Recompute the rows for every pending donation of one donor (after a profile change)"""
+    stale_rows = MatchCandidate.objects.filter(donation_request__donor_id=donor_id)
+    donations = DonationRequests.objects.filter(donation_status='Pending', donor_id=donor_id)
+    return _store(stale_rows, donations)
+
+
+REFRESHERS = {
+    MatchRefresh.KIND_DONATION: refresh_donation,
+    MatchRefresh.KIND_REQUIREMENT: refresh_requirement,
+    MatchRefresh.KIND_DONOR: refresh_donor,
+}
+
+
+def enqueue_refresh(kind, object_id):
+    """Queue a refresh of one donation, requirement or donor; a no-op if one is already queued"""
+    MatchRefresh.objects.bulk_create([MatchRefresh(kind=kind, object_id=object_id)], ignore_conflicts=True)
+
+
+def run_queued_refreshes(limit=100):
+    """Run up to limit queued refreshes, oldest first; returns how many ran.
+
+    Each refresh is claimed by deleting its queue row, so concurrent workers
+    never run the same one. A change saved while it runs queues a new row and
+    is picked up by a later call. A refresh that fails is queued again.
+    """
+    ran = 0
+    for refresh in MatchRefresh.objects.order_by('queued_at', 'id')[:limit]:
+        if not MatchRefresh.objects.filter(id=refresh.id).delete()[0]:
+            continue
+        try:
+            REFRESHERS[refresh.kind](refresh.object_id)
+        except Exception:
+            exception('match_refresh_failed', kind=refresh.kind, object_id=refresh.object_id)
+            enqueue_refresh(refresh.kind, refresh.object_id)
+        else:
+            ran += 1
+    if ran:
+        event('match_refreshes_run', refreshes=ran)
+    return ran
+
+
+def rebuild(stats=None):
+    """Recompute the whole match table"""
+    return _store(MatchCandidate.objects.all(), stats=stats)
+
+
+def stored_matches(hospital=None, k=None, min_score=0, requirement_ids=None, organ_types=None):
+    """Matches above the model threshold, best first, read straight from the table.
+
+    hospital, requirement_ids and organ_types narrow the rows read, the same
+    scopes OrganMatchingML.find_matches takes. With k, only the best k
+    matches of each requirement are returned; the cut is a window function
+    in the query, so it never reads the rest of the rows.
+    """
+    matches = MatchCandidate.objects.filter(ml_probability__gt=OrganMatchingML.match_threshold)
+    if hospital is not None:
+        matches = matches.filter(hospital=hospital)
+    if requirement_ids is not None:
+        matches = matches.filter(requirement_id__in=requirement_ids)
+    if organ_types is not None:
+        matches = matches.filter(requirement__organ_type__in=organ_types)
+    if min_score:
+        matches = matches.filter(compatibility_score__gte=min_score)
+    if k is not None:
+        # A requirement's matches share its urgency, so they rank by score, then probability
+        matches = matches.annotate(requirement_rank=Window(
+            RowNumber(), partition_by=[F('requirement_id')],
+            order_by=[F('compatibility_score').desc(), F('ml_probability').desc(), F('donation_request_id').asc()],
+        )).filter(requirement_rank__lte=k)
+    return matches.select_related('donation_request__donor', 'requirement', 'hospital').order_by(
+        '-urgency_rank', '-compatibility_score', '-ml_probability', 'donation_request_id', 'requirement_id'
+    )
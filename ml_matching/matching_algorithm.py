@@ -1,63 +1,66 @@
-import pandas as pd
 import numpy as np
-from sklearn.preprocessing import LabelEncoder, StandardScaler, RobustScaler
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
-from sklearn.svm import SVC
-from sklearn.neural_network import MLPClassifier
-from sklearn.model_selection import train_test_split, GridSearchCV, cross_val_score
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-from sklearn.feature_selection import SelectKBest, f_classif
-import joblib
 import os
-from datetime import datetime, timedelta
+import time
 try:
+    from .candidates import COMPATIBLE_DONOR_BLOOD, CandidateIndex
+    from .donor_features import MISSING_SKIP, DonorFeatures, load_donor_features
+    from .ranking import MatchRanker
+    from .registry import model_registry, save_artifacts
+    from .scoring import BLOOD_COMPATIBILITY, blood_codes, category_codes, compatibility_scores
+    from .serving import OFFLINE_ENSEMBLE, SERVING_ENSEMBLE
+except ImportError:
+    # Imported as a top-level module by the standalone runner
+    from candidates import COMPATIBLE_DONOR_BLOOD, CandidateIndex
+    from donor_features import MISSING_SKIP, DonorFeatures, load_donor_features
+    from ranking import MatchRanker
+    from registry import model_registry, save_artifacts
+    from scoring import BLOOD_COMPATIBILITY, blood_codes, category_codes, compatibility_scores
+    from serving import OFFLINE_ENSEMBLE, SERVING_ENSEMBLE
+try:
+    from django.conf import settings
     from django.db.models import Q
     from donors.models import DonationRequests
-    from .models import HospitalOrganRequirement, DonorMedicalProfile
+    from .models import HospitalOrganRequirement
 except ImportError:
     # Mock imports for standalone testing
+    class settings:
+        pass
     class Q:
         pass
     class DonationRequests:
         objects = None
     class HospitalOrganRequirement:
         objects = None
-    class DonorMedicalProfile:
-        objects = None
+
+# Which scorer produced a prediction: the trained ensemble, or the rule-based
+# compatibility score used while no trained model is available
+SCORER_MODEL = 'model'
+SCORER_RULES = 'rules'
 
 class OrganMatchingML:
-    def __init__(self):
-        # Ensemble of high-performance models
-        rf = RandomForestClassifier(n_estimators=200, max_depth=15, min_samples_split=5, random_state=42)
-        gb = GradientBoostingClassifier(n_estimators=150, learning_rate=0.1, max_depth=8, random_state=42)
-        svm = SVC(kernel='rbf', C=10, gamma='scale', probability=True, random_state=42)
-        mlp = MLPClassifier(hidden_layer_sizes=(100, 50), max_iter=500, random_state=42)
-        
-        self.model = VotingClassifier(
-            estimators=[('rf', rf), ('gb', gb), ('svm', svm), ('mlp', mlp)],
-            voting='soft'
-        )
-        self.scaler = RobustScaler()
-        self.feature_selector = SelectKBest(f_classif, k=10)
+    # Minimum ensemble probability for a pair to be reported as a match
+    match_threshold = 0.7
+    
+    def __init__(self, ensemble=SERVING_ENSEMBLE):
+        # SERVING_ENSEMBLE for online requests, OFFLINE_ENSEMBLE (every member) for batch scoring
+        self.ensemble = ensemble
+        # Fitted components, attached from the model registry by load_model()
+        self.model = None
+        self.scaler = None
+        self.feature_selector = None
         self.label_encoders = {}
+        self.scorer = None
+        # Pairs whose rule-based score is below this never reach the model; see score_candidates
+        self.min_compatibility_score = getattr(settings, 'ML_CASCADE_MIN_SCORE', 0)
+        self.cascade_stats = None
         self.model_path = 'ml_matching/trained_model.joblib'
         self.scaler_path = 'ml_matching/scaler.joblib'
         self.encoders_path = 'ml_matching/encoders.joblib'
         self.selector_path = 'ml_matching/feature_selector.joblib'
-        
+    
     def blood_compatibility(self, donor_blood, recipient_blood):
         """Check blood type compatibility"""
-        compatibility_matrix = {
-            'O-': ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+'],
-            'O+': ['O+', 'A+', 'B+', 'AB+'],
-            'A-': ['A-', 'A+', 'AB-', 'AB+'],
-            'A+': ['A+', 'AB+'],
-            'B-': ['B-', 'B+', 'AB-', 'AB+'],
-            'B+': ['B+', 'AB+'],
-            'AB-': ['AB-', 'AB+'],
-            'AB+': ['AB+']
-        }
-        return recipient_blood in compatibility_matrix.get(donor_blood, [])
+        return recipient_blood in BLOOD_COMPATIBILITY.get(donor_blood, [])
     
     def calculate_compatibility_score(self, donor_data, hospital_req):
         """Enhanced compatibility score with medical precision"""
@@ -111,244 +114,134 @@ class OrganMatchingML:
         
         return min(score, 100)  # Cap at 100%
     
+    def _score_columns(self, donors, requirements):
+        """Donor and requirement column arrays in the form compatibility_scores expects"""
+        donors = DonorFeatures.coerce(donors)
+        donor_organ, recipient_organ = category_codes(
+            donors.organ_type, [r['organ_type'] for r in requirements]
+        )
+        donor_cols = {
+            'blood': blood_codes(donors.blood_type),
+            'organ': donor_organ,
+            'age': donors.age,
+            'weight': donors.weight,
+            'smoking': donors.smoking_status,
+            'alcohol': donors.alcohol_consumption,
+        }
+        req_cols = {
+            'blood': blood_codes([r['blood_type'] for r in requirements]),
+            'organ': recipient_organ,
+            'age': np.array([r['patient_age'] for r in requirements], dtype=np.float64),
+            'weight': np.array([r['patient_weight'] for r in requirements], dtype=np.float64),
+        }
+        return donor_cols, req_cols
+    
+    def compatibility_pairs(self, donors, requirements, donor_idx, req_idx):
+        """calculate_compatibility_score for the pairs (donors[donor_idx[k]], requirements[req_idx[k]])"""
+        d, r = self._score_columns(donors, requirements)
+        return compatibility_scores(
+            d['blood'][donor_idx], r['blood'][req_idx],
+            d['organ'][donor_idx], r['organ'][req_idx],
+            d['age'][donor_idx], r['age'][req_idx],
+            d['weight'][donor_idx], r['weight'][req_idx],
+            d['smoking'][donor_idx], d['alcohol'][donor_idx]
+        )
+    
+    def compatibility_matrix(self, donors, requirements):
+        """calculate_compatibility_score for every donor x requirement pair as an N x M int array"""
+        d, r = self._score_columns(donors, requirements)
+        
+        def column(values):
+            return values.reshape(-1, 1)
+        
+        return compatibility_scores(
+            column(d['blood']), r['blood'],
+            column(d['organ']), r['organ'],
+            column(d['age']), r['age'],
+            column(d['weight']), r['weight'],
+            column(d['smoking']), column(d['alcohol'])
+        ).reshape(len(donors), len(requirements))
+    
+    # Training modules pull in pandas and sklearn; import them only when training
+    
     def prepare_training_data(self):
         """Load and prepare training data from CSV file"""
-        try:
-            # Load the CSV data
-            csv_path = os.path.join(os.path.dirname(__file__), 'Organ Donation.csv')
-            df = pd.read_csv(csv_path)
-            
-            # Extract relevant features for organ donation matching
-            data = []
-            
-            for _, row in df.iterrows():
-                # Extract age from age range
-                age_str = str(row.get('Age', '18-25 years'))
-                if '18-25' in age_str:
-                    age = 22
-                elif '26-40' in age_str:
-                    age = 33
-                elif '41-55' in age_str:
-                    age = 48
-                else:  # Above 55
-                    age = 60
-                
-                # Determine willingness to donate (target variable)
-                willing_to_donate = 1 if str(row.get('Are you willing to donate organs?', 'No')).lower() == 'yes' else 0
-                
-                # Generate synthetic organ and blood type data based on demographics
-                np.random.seed(hash(str(row.get('Name', 'Unknown'))) % 2**32)
-                organ_types = ['Heart', 'Liver', 'Kidney', 'Lung', 'Pancreas']
-                blood_types = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
-                urgency_levels = ['Critical', 'Urgent', 'High', 'Medium', 'Low']
-                
-                donor_blood = np.random.choice(blood_types)
-                recipient_blood = np.random.choice(blood_types)
-                organ_type = np.random.choice(organ_types)
-                urgency = np.random.choice(urgency_levels)
-                
-                # Estimate weight based on age and gender
-                gender = str(row.get('Gender', 'Male'))
-                if gender.lower() == 'male':
-                    weight = np.random.normal(75, 12)
-                else:
-                    weight = np.random.normal(65, 10)
-                
-                recipient_age = age + np.random.randint(-10, 10)
-                recipient_weight = weight + np.random.normal(0, 8)
-                
-                # Extract lifestyle factors
-                smoking = 0  # Assume non-smoker for health-conscious donors
-                alcohol = 0  # Assume non-drinker for health-conscious donors
-                
-                # Calculate compatibility score
-                temp_donor = {
-                    'blood_type': donor_blood,
-                    'organ_type': organ_type,
-                    'age': age,
-                    'weight': weight,
-                    'smoking_status': smoking,
-                    'alcohol_consumption': alcohol
-                }
-                temp_req = {
-                    'blood_type': recipient_blood,
-                    'organ_type': organ_type,
-                    'patient_age': recipient_age,
-                    'patient_weight': recipient_weight
-                }
-                
-                compatibility_score = self.calculate_compatibility_score(temp_donor, temp_req)
-                
-                # Use actual willingness to donate as target
-                match = willing_to_donate
-                
-                data.append([
-                    donor_blood, recipient_blood, organ_type, urgency,
-                    age, recipient_age, weight, recipient_weight,
-                    smoking, alcohol, compatibility_score, match
-                ])
-            
-            columns = [
-                'donor_blood', 'recipient_blood', 'organ_type', 'urgency',
-                'donor_age', 'recipient_age', 'donor_weight', 'recipient_weight',
-                'smoking', 'alcohol', 'compatibility_score', 'match'
-            ]
-            
-            return pd.DataFrame(data, columns=columns)
-            
-        except Exception as e:
-            print(f"Error loading CSV data: {e}")
-            # Fallback to synthetic data if CSV loading fails
-            return self._generate_synthetic_data()
+        from ml_matching.training_data import load_training_data
+        return load_training_data(source='survey')
     
     def _generate_synthetic_data(self):
         """Generate synthetic training data as fallback"""
-        np.random.seed(42)
-        n_samples = 1000
-        
-        organ_types = ['Heart', 'Liver', 'Kidney', 'Lung', 'Pancreas']
-        blood_types = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
-        urgency_levels = ['Critical', 'Urgent', 'High', 'Medium', 'Low']
-        
-        data = []
-        for _ in range(n_samples):
-            donor_blood = np.random.choice(blood_types)
-            recipient_blood = np.random.choice(blood_types)
-            organ_type = np.random.choice(organ_types)
-            urgency = np.random.choice(urgency_levels)
-            
-            donor_age = np.random.randint(18, 65)
-            recipient_age = np.random.randint(18, 75)
-            donor_weight = np.random.normal(70, 15)
-            recipient_weight = np.random.normal(70, 15)
-            
-            smoking = np.random.choice([0, 1], p=[0.7, 0.3])
-            alcohol = np.random.choice([0, 1], p=[0.6, 0.4])
-            
-            temp_donor = {
-                'blood_type': donor_blood,
-                'organ_type': organ_type,
-                'age': donor_age,
-                'weight': donor_weight,
-                'smoking_status': smoking,
-                'alcohol_consumption': alcohol
-            }
-            temp_req = {
-                'blood_type': recipient_blood,
-                'organ_type': organ_type,
-                'patient_age': recipient_age,
-                'patient_weight': recipient_weight
-            }
-            
-            compatibility_score = self.calculate_compatibility_score(temp_donor, temp_req)
-            
-            # Higher compatibility scores more likely to match
-            match_probability = compatibility_score / 100.0
-            match = np.random.choice([0, 1], p=[1-match_probability, match_probability])
-            
-            data.append([
-                donor_blood, recipient_blood, organ_type, urgency,
-                donor_age, recipient_age, donor_weight, recipient_weight,
-                smoking, alcohol, compatibility_score, match
-            ])
-        
-        columns = [
-            'donor_blood', 'recipient_blood', 'organ_type', 'urgency',
-            'donor_age', 'recipient_age', 'donor_weight', 'recipient_weight',
-            'smoking', 'alcohol', 'compatibility_score', 'match'
-        ]
-        
-        return pd.DataFrame(data, columns=columns)
+        from ml_matching.training_data import load_training_data
+        return load_training_data(source='synthetic', n_samples=1000)
     
-    def train_model(self):
-        """Train advanced ensemble model for 90%+ accuracy"""
-        df = self.prepare_training_data()
-        
-        # Enhanced feature engineering
-        categorical_cols = ['donor_blood', 'recipient_blood', 'organ_type', 'urgency']
-        for col in categorical_cols:
-            le = LabelEncoder()
-            df[col + '_encoded'] = le.fit_transform(df[col])
-            self.label_encoders[col] = le
-        
-        # Create additional engineered features
-        df['age_diff'] = abs(df['donor_age'] - df['recipient_age'])
-        df['weight_ratio'] = df['donor_weight'] / df['recipient_weight']
-        df['blood_exact_match'] = (df['donor_blood'] == df['recipient_blood']).astype(int)
-        df['health_score'] = (2 - df['smoking'] - df['alcohol'])
-        df['urgency_weight'] = df['urgency_encoded'] * 0.2
-        
-        # Prepare enhanced features
-        feature_cols = [
-            'donor_blood_encoded', 'recipient_blood_encoded', 'organ_type_encoded',
-            'urgency_encoded', 'donor_age', 'recipient_age', 'donor_weight',
-            'recipient_weight', 'smoking', 'alcohol', 'compatibility_score',
-            'age_diff', 'weight_ratio', 'blood_exact_match', 'health_score', 'urgency_weight'
-        ]
-        
-        X = df[feature_cols]
-        y = df['match']
-        
-        # Handle class imbalance with stratified split
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
-        )
-        
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
-        
-        # Feature selection
-        X_train_selected = self.feature_selector.fit_transform(X_train_scaled, y_train)
-        X_test_selected = self.feature_selector.transform(X_test_scaled)
-        
-        # Cross-validation for model validation
-        cv_scores = cross_val_score(self.model, X_train_selected, y_train, cv=5, scoring='accuracy')
-        print(f"Cross-validation scores: {cv_scores}")
-        print(f"Mean CV accuracy: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
-        
-        # Train ensemble model
-        self.model.fit(X_train_selected, y_train)
-        
-        # Evaluate on test set
-        y_pred = self.model.predict(X_test_selected)
-        y_pred_proba = self.model.predict_proba(X_test_selected)[:, 1]
-        
-        accuracy = accuracy_score(y_test, y_pred)
-        print(f"Test Accuracy: {accuracy:.4f}")
-        print(f"Classification Report:")
-        print(classification_report(y_test, y_pred))
-        
-        # Confusion matrix
-        cm = confusion_matrix(y_test, y_pred)
-        print(f"Confusion Matrix:")
-        print(cm)
-        
-        # Save all components
-        os.makedirs('ml_matching', exist_ok=True)
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, self.scaler_path)
-        joblib.dump(self.label_encoders, self.encoders_path)
-        joblib.dump(self.feature_selector, self.selector_path)
-        
-        return accuracy
+    def train_model(self, progress=None, n_jobs=None, config=None):
+        """Train advanced ensemble model for 90%+ accuracy
+        
+        Runs the cached TrainingPipeline (see ml_matching.pipeline) with config,
+        default DEFAULT_CONFIG. progress, if given, is called as progress(percent, stage)
+        as training advances. n_jobs caps the cores used for CV folds, ensemble members
+        and forest trees (default: the ML_TRAINING_N_JOBS setting, see
+        ml_matching.parallelism). The new artifacts are published atomically once
+        everything has been fitted.
+        """
+        from ml_matching.pipeline import TrainingPipeline
+        result = TrainingPipeline(config, n_jobs=n_jobs, progress=progress).run()
+        self.model = result.model
+        self.scaler = result.scaler
+        self.label_encoders = result.label_encoders
+        self.feature_selector = result.feature_selector
+        
+        if progress is not None:
+            progress(95, 'Publishing model')
+        save_artifacts([
+            (self.model, self.model_path),
+            (self.scaler, self.scaler_path),
+            (self.label_encoders, self.encoders_path),
+            (self.feature_selector, self.selector_path),
+        ], serving=result.serving)
+        if progress is not None:
+            progress(100, 'Done')
+        
+        return result.accuracy
     
     def load_model(self):
-        """Load trained model and components"""
-        if os.path.exists(self.model_path):
-            self.model = joblib.load(self.model_path)
-            self.scaler = joblib.load(self.scaler_path)
-            self.label_encoders = joblib.load(self.encoders_path)
-            if os.path.exists(self.selector_path):
-                self.feature_selector = joblib.load(self.selector_path)
-            return True
-        return False
+        """Attach the trained components from the process-wide model registry"""
+        artifacts = model_registry.get(self.model_path, self.scaler_path, self.encoders_path, self.selector_path)
+        if artifacts is None:
+            return False
+        self.model = artifacts.model if self.ensemble == OFFLINE_ENSEMBLE else artifacts.serving_model
+        self.scaler = artifacts.scaler
+        self.label_encoders = artifacts.label_encoders
+        if artifacts.feature_selector is not None:
+            self.feature_selector = artifacts.feature_selector
+        return True
+    
+    def ensure_scorer(self):
+        """Attach the trained model, or fall back to the rule-based scorer.
+        
+        Never trains inline: without artifacts, a single background build is
+        requested (see ml_matching.availability) and predictions use the
+        compatibility score until the model is published. Sets and returns
+        self.scorer.
+        """
+        if self.load_model():
+            self.scorer = SCORER_MODEL
+            return self.scorer
+        
+        self.scorer = SCORER_RULES
+        try:
+            from .availability import request_build
+        except ImportError:
+            # Standalone runner: no training worker to hand the build to
+            return self.scorer
+        request_build(self, loaded=False)
+        return self.scorer
     
     def predict_match(self, donor_data, hospital_req):
         """Enhanced prediction with engineered features"""
-        if not self.load_model():
-            print("Model not found. Training new model...")
-            self.train_model()
+        if self.ensure_scorer() == SCORER_RULES:
+            probability = self.calculate_compatibility_score(donor_data, hospital_req) / 100.0
+            return int(probability > 0.5), probability
         
         # Calculate enhanced features
         compatibility_score = self.calculate_compatibility_score(donor_data, hospital_req)
@@ -389,57 +282,243 @@ class OrganMatchingML:
         
         return prediction, probability
     
-    def find_matches(self):
-        """Find all potential matches between donors and hospital requirements"""
-        matches = []
-        
-        # Get active donation requests
-        donations = DonationRequests.objects.filter(donation_status='Pending')
-        
-        # Get active hospital requirements
-        requirements = HospitalOrganRequirement.objects.filter(is_active=True)
-        
-        for donation in donations:
-            try:
-                donor_profile = DonorMedicalProfile.objects.get(donor=donation.donor)
-                
-                donor_data = {
-                    'blood_type': donation.blood_type,
-                    'organ_type': donation.organ_type,
-                    'age': donor_profile.age,
-                    'weight': donor_profile.weight,
-                    'smoking_status': donor_profile.smoking_status,
-                    'alcohol_consumption': donor_profile.alcohol_consumption
-                }
-                
-                for req in requirements:
-                    hospital_req = {
-                        'blood_type': req.blood_type,
-                        'organ_type': req.organ_type,
-                        'urgency_level': req.urgency_level,
-                        'patient_age': req.patient_age,
-                        'patient_weight': req.patient_weight
-                    }
-                    
-                    prediction, probability = self.predict_match(donor_data, hospital_req)
-                    compatibility_score = self.calculate_compatibility_score(donor_data, hospital_req)
-                    
-                    if prediction == 1 and probability > 0.7:
-                        matches.append({
-                            'donor': donation.donor,
-                            'donation_request': donation,
-                            'hospital': req.hospital,
-                            'requirement': req,
-                            'compatibility_score': compatibility_score,
-                            'ml_probability': probability,
-                            'urgency': req.urgency_level
-                        })
-            
-            except DonorMedicalProfile.DoesNotExist:
-                continue
-        
-        # Sort by urgency and compatibility score
-        urgency_order = {'Critical': 5, 'Urgent': 4, 'High': 3, 'Medium': 2, 'Low': 1}
-        matches.sort(key=lambda x: (urgency_order[x['urgency']], x['compatibility_score']), reverse=True)
-        
-        return matches
\ No newline at end of file
+    def _encode_labels(self, column, values):
+        """Vectorized LabelEncoder.transform; labels unseen during training map to -1"""
+        lookup = {label: code for code, label in enumerate(self.label_encoders[column].classes_)}
+        return np.array([lookup.get(value, -1) for value in values], dtype=np.int64)
+    
+    @staticmethod
+    def _all_pairs(n, m):
+        """Index arrays covering the full donor x requirement grid, donor-major"""
+        return np.repeat(np.arange(n), m), np.tile(np.arange(m), n)
+    
+    def build_feature_matrix(self, donors, requirements, donor_idx=None, req_idx=None, compatibility=None):
+        """Feature rows for the pairs (donors[donor_idx[k]], requirements[req_idx[k]]).
+        
+        donors is a DonorFeatures or a list of donor_data dicts. Without index
+        arrays every pair is included, donor-major (row i*M + j).
+        compatibility, if given, holds the pairs' compatibility scores already computed.
+        Returns (X, valid) where valid flags pairs whose categorical values were all
+        seen during training.
+        """
+        donors = DonorFeatures.coerce(donors)
+        if donor_idx is None:
+            donor_idx, req_idx = self._all_pairs(len(donors), len(requirements))
+        
+        donor_blood = self._encode_labels('donor_blood', donors.blood_type)
+        organ = self._encode_labels('organ_type', donors.organ_type)
+        donor_age = donors.age
+        donor_weight = donors.weight
+        smoking = donors.smoking_status.astype(np.float64)
+        alcohol = donors.alcohol_consumption.astype(np.float64)
+        donor_blood_names = donors.blood_type
+        
+        recipient_blood = self._encode_labels('recipient_blood', [r['blood_type'] for r in requirements])
+        urgency = self._encode_labels('urgency', [r['urgency_level'] for r in requirements])
+        patient_age = np.array([r['patient_age'] for r in requirements], dtype=np.float64)
+        patient_weight = np.array([r['patient_weight'] for r in requirements], dtype=np.float64)
+        recipient_blood_names = np.array([r['blood_type'] for r in requirements], dtype=object)
+        
+        if compatibility is None:
+            compatibility = self.compatibility_pairs(donors, requirements, donor_idx, req_idx)
+        compatibility = np.asarray(compatibility, dtype=np.float64)
+        
+        d_age, r_age = donor_age[donor_idx], patient_age[req_idx]
+        d_weight, r_weight = donor_weight[donor_idx], patient_weight[req_idx]
+        d_smoking, d_alcohol = smoking[donor_idx], alcohol[donor_idx]
+        d_blood, r_blood = donor_blood[donor_idx], recipient_blood[req_idx]
+        r_urgency = urgency[req_idx]
+        d_organ = organ[donor_idx]
+        blood_exact_match = (donor_blood_names[donor_idx] == recipient_blood_names[req_idx]).astype(np.float64)
+        
+        X = np.column_stack([
+            d_blood,
+            r_blood,
+            d_organ,
+            r_urgency,
+            d_age,
+            r_age,
+            d_weight,
+            r_weight,
+            d_smoking,
+            d_alcohol,
+            compatibility,
+            np.abs(d_age - r_age),
+            d_weight / r_weight,
+            blood_exact_match,
+            2 - d_smoking - d_alcohol,
+            r_urgency * 0.2,
+        ]).astype(np.float64)
+        valid = (d_blood >= 0) & (r_blood >= 0) & (d_organ >= 0) & (r_urgency >= 0)
+        return X, valid
+    
+    def predict_pairs(self, donors, requirements, donor_idx, req_idx, compatibility=None):
+        """Match probability for each pair (donors[donor_idx[k]], requirements[req_idx[k]]).
+        
+        Builds one feature matrix and runs scaler -> selector -> ensemble once for all
+        pairs. Pairs with labels the model was not trained on score 0. Without a
+        trained model the probability is the compatibility score / 100; self.scorer
+        records which one was used. compatibility, if given, holds the pairs'
+        compatibility scores already computed.
+        """
+        donor_idx = np.asarray(donor_idx, dtype=np.int64)
+        req_idx = np.asarray(req_idx, dtype=np.int64)
+        if self.ensure_scorer() == SCORER_RULES:
+            if compatibility is None:
+                compatibility = self.compatibility_pairs(donors, requirements, donor_idx, req_idx)
+            return np.asarray(compatibility) / 100.0
+        if len(donor_idx) == 0:
+            return np.zeros(0)
+        
+        X, valid = self.build_feature_matrix(donors, requirements, donor_idx, req_idx, compatibility)
+        probabilities = np.zeros(len(donor_idx))
+        if valid.any():
+            X_selected = self.feature_selector.transform(self.scaler.transform(X[valid]))
+            positive = list(self.model.classes_).index(1)
+            probabilities[valid] = self.model.predict_proba(X_selected)[:, positive]
+        return probabilities
+    
+    def predict_matches_batch(self, donors, requirements):
+        """Match probabilities for every donor x requirement pair as an N x M array.
+        
+        Takes the same donor/requirement dicts as predict_match; see predict_pairs.
+        """
+        n, m = len(donors), len(requirements)
+        donor_idx, req_idx = self._all_pairs(n, m)
+        return self.predict_pairs(donors, requirements, donor_idx, req_idx).reshape(n, m)
+    
+    def load_matching_data(self, donations=None, requirements=None, hospital=None, requirement_ids=None,
+                           organ_types=None):
+        """Load everything find_matches needs in a fixed number of queries.
+        
+        donations and requirements default to all pending donations and all active
+        requirements; pass narrower querysets to match a subset. hospital,
+        requirement_ids and organ_types narrow the requirements further, and then
+        only the donations that could serve one of them are loaded, so the cost
+        depends on the scope rather than on every hospital's requirements.
+        Returns (donors, requirements): donors is a DonorFeatures of the donations
+        that have a medical profile; requirements are the HospitalOrganRequirement
+        rows with their hospital joined in.
+        """
+        scoped = hospital is not None or requirement_ids is not None or organ_types is not None
+        if requirements is None:
+            requirements = HospitalOrganRequirement.objects.filter(is_active=True)
+        if hospital is not None:
+            requirements = requirements.filter(hospital=hospital)
+        if requirement_ids is not None:
+            requirements = requirements.filter(id__in=requirement_ids)
+        if organ_types is not None:
+            requirements = requirements.filter(organ_type__in=organ_types)
+        
+        # Hospital requirements with their hospitals
+        requirements = list(requirements.select_related('hospital'))
+        
+        if donations is None:
+            donations = DonationRequests.objects.filter(donation_status='Pending')
+        if scoped:
+            if not requirements:
+                return DonorFeatures.from_dicts([]), []
+            # Same organ and an ABO-compatible blood type for at least one scoped requirement
+            servable = Q()
+            for organ_type, blood_type in {(req.organ_type, req.blood_type) for req in requirements}:
+                servable |= Q(organ_type=organ_type, blood_type__in=COMPATIBLE_DONOR_BLOOD.get(blood_type, []))
+            donations = donations.filter(servable)
+        
+        # Donations with their donors and profile columns, in two queries
+        return load_donor_features(donations, missing=MISSING_SKIP), requirements
+    
+    @staticmethod
+    def requirement_data(req):
+        """hospital_req dict for a HospitalOrganRequirement row"""
+        return {
+            'blood_type': req.blood_type,
+            'organ_type': req.organ_type,
+            'urgency_level': req.urgency_level,
+            'patient_age': req.patient_age,
+            'patient_weight': req.patient_weight
+        }
+    
+    def score_candidates(self, donors, requirements):
+        """Score the pairs from load_matching_data that can match, as a two-stage cascade.
+        
+        Stage 1 is rule-based: it keeps same-organ, ABO-compatible pairs and computes
+        their compatibility scores in one vectorized call, dropping pairs that score
+        below self.min_compatibility_score (the ML_CASCADE_MIN_SCORE setting; 0 keeps
+        every compatible pair). Stage 2 runs the model on the survivors only.
+        Per-stage pair counts and timings are left in self.cascade_stats.
+        
+        Returns a list of (donation, requirement, compatibility_score, ml_probability)
+        tuples for the survivors, donor-major.
+        """
+        hospital_reqs = [self.requirement_data(req) for req in requirements]
+        
+        # Stage 1: hard constraints, then the rule-based score
+        start = time.perf_counter()
+        index = CandidateIndex(donors.keys(), key=lambda key: key)
+        donor_idx, req_idx = index.pairs(hospital_reqs, key=lambda r: (r['organ_type'], r['blood_type']))
+        compatible = len(donor_idx)
+        constraints_done = time.perf_counter()
+        compatibility = self.compatibility_pairs(donors, hospital_reqs, donor_idx, req_idx)
+        promising = compatibility >= self.min_compatibility_score
+        donor_idx, req_idx, compatibility = donor_idx[promising], req_idx[promising], compatibility[promising]
+        rules_done = time.perf_counter()
+        
+        # Stage 2: all surviving pairs in one model call
+        probabilities = self.predict_pairs(donors, hospital_reqs, donor_idx, req_idx, compatibility)
+        model_done = time.perf_counter()
+        
+        self.cascade_stats = {
+            'pairs': len(donors) * len(hospital_reqs),
+            'compatible': compatible,
+            'survivors': len(donor_idx),
+            'matches': int((probabilities > self.match_threshold).sum()),
+            'min_compatibility_score': self.min_compatibility_score,
+            'scorer': self.scorer,
+            'constraints_ms': (constraints_done - start) * 1000,
+            'rules_ms': (rules_done - constraints_done) * 1000,
+            'model_ms': (model_done - rules_done) * 1000,
+        }
+        
+        return [
+            (donors.donations[i], requirements[j], int(score), probability)
+            for i, j, score, probability in zip(donor_idx, req_idx, compatibility, probabilities)
+        ]
+    
+    @staticmethod
+    def describe_cascade(stats):
+        """One line summarizing cascade_stats, for logs and management commands"""
+        return (
+            f"Cascade: {stats['pairs']} pairs -> {stats['compatible']} same-organ, ABO-compatible "
+            f"({stats['constraints_ms']:.1f} ms) -> {stats['survivors']} with rule score >= "
+            f"{stats['min_compatibility_score']} ({stats['rules_ms']:.1f} ms) -> {stats['matches']} "
+            f"matches from the {stats['scorer']} scorer ({stats['model_ms']:.1f} ms)"
+        )
+    
+    def find_matches(self, k=None, min_score=0, hospital=None, requirement_ids=None, organ_types=None):
+        """Find potential matches between donors and hospital requirements, most urgent and compatible first.
+
+        With k, only the best k matches of each requirement are kept; matches
+        with a compatibility score below min_score are dropped. hospital,
+        requirement_ids and organ_types limit matching to those requirements;
+        see load_matching_data.
+        """
+        ranker = MatchRanker(k, min_score)
+        donors, requirements = self.load_matching_data(
+            hospital=hospital, requirement_ids=requirement_ids, organ_types=organ_types
+        )
+        
+        # Soft voting predicts a match whenever p > 0.5, so p > threshold implies prediction == 1
+        for donation, req, compatibility_score, probability in self.score_candidates(donors, requirements):
+            if probability > self.match_threshold:
+                ranker.add({
+                    'donor': donation.donor,
+                    'donation_request': donation,
+                    'hospital': req.hospital,
+                    'requirement': req,
+                    'compatibility_score': compatibility_score,
+                    'ml_probability': probability,
+                    'urgency': req.urgency_level,
+                    'scorer': self.scorer
+                }, req.id, req.hospital_id, req.urgency_level, compatibility_score, probability)
+        
+        return ranker.ranked()
\ No newline at end of file
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donors', '0003_merge_0002_auto_20190407_1414_0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ml_matching', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchCandidate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('compatibility_score', models.IntegerField()),
+                ('ml_probability', models.FloatField()),
+                ('urgency_rank', models.IntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('donation_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='donors.donationrequests')),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('requirement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ml_matching.hospitalorganrequirement')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hospital', '-urgency_rank', '-compatibility_score'], name='match_hospital_rank_idx'), models.Index(fields=['-urgency_rank', '-compatibility_score'], name='match_rank_idx')],
+                'unique_together': {('donation_request', 'requirement')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_matching', '0003_trainingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchcandidate',
+            name='scorer',
+            field=models.CharField(default='model', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='trainingjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'Queued')), fields=('status',), name='single_queued_training_job'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_matching', '0004_cold_start_scorer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hospitalorganrequirement',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['hospital'], name='active_requirement_hosp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hospitalorganrequirement',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['organ_type', 'blood_type'], name='active_requirement_match_idx'),
+        ),
+    ]
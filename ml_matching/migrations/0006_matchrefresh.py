@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_matching', '0005_active_requirement_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchRefresh',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('donation', 'Donation'), ('requirement', 'Requirement'), ('donor', 'Donor')], max_length=12)),
+                ('object_id', models.IntegerField()),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['queued_at'], name='match_refresh_queue_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='matchrefresh',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='single_queued_match_refresh'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ml_matching', '0006_matchrefresh'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='matchcandidate',
+            name='hospital',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from hospitals.models import User
+from .ranking import URGENCY_RANK
 
 class HospitalOrganRequirement(models.Model):
     ORGAN_CHOICES = [
@@ -36,6 +37,14 @@ class HospitalOrganRequirement(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Matching only ever reads active requirements: by hospital, or by organ and blood type
+            models.Index(fields=['hospital'], condition=models.Q(is_active=True), name='active_requirement_hosp_idx'),
+            models.Index(fields=['organ_type', 'blood_type'], condition=models.Q(is_active=True),
+                         name='active_requirement_match_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.hospital.hospital_name} - {self.organ_type} ({self.urgency_level})"
 
@@ -50,4 +59,117 @@ class DonorMedicalProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.donor.first_name} - Medical Profile"
\ No newline at end of file
+        return f"{self.donor.first_name} - Medical Profile"
+
+class MatchCandidate(models.Model):
+    """Precomputed score for one compatible (donation, requirement) pair.
+
+    Kept up to date incrementally by the worker, which runs the MatchRefresh
+    rows ml_matching.signals queues, so match pages can read matches with a
+    single indexed query instead of re-running the model.
+    """
+    URGENCY_RANK = URGENCY_RANK
+
+    donation_request = models.ForeignKey('donors.DonationRequests', on_delete=models.CASCADE)
+    requirement = models.ForeignKey(HospitalOrganRequirement, on_delete=models.CASCADE)
+    # Indexed by match_hospital_rank_idx, which leads with hospital
+    hospital = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    compatibility_score = models.IntegerField()
+    ml_probability = models.FloatField()
+    # 'model' for the trained ensemble, 'rules' for the cold-start compatibility scorer
+    scorer = models.CharField(max_length=10, default='model')
+    urgency_rank = models.IntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('donation_request', 'requirement')]
+        indexes = [
+            models.Index(fields=['hospital', '-urgency_rank', '-compatibility_score'], name='match_hospital_rank_idx'),
+            models.Index(fields=['-urgency_rank', '-compatibility_score'], name='match_rank_idx'),
+        ]
+
+    @property
+    def donor(self):
+        return self.donation_request.donor
+
+    @property
+    def urgency(self):
+        return self.requirement.urgency_level
+
+    def __str__(self):
+        return f"{self.donation_request} -> {self.requirement} ({self.ml_probability:.2f})"
+
+
+class MatchRefresh(models.Model):
+    """A donation, requirement or donor whose MatchCandidate rows need recomputing.
+
+    Saves only queue one of these (see ml_matching.signals); the
+    run_training_worker command drains the queue, so writes never pay for
+    model inference.
+    """
+    KIND_DONATION = 'donation'
+    KIND_REQUIREMENT = 'requirement'
+    KIND_DONOR = 'donor'
+    KIND_CHOICES = [
+        (KIND_DONATION, 'Donation'),
+        (KIND_REQUIREMENT, 'Requirement'),
+        (KIND_DONOR, 'Donor'),
+    ]
+
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['queued_at'], name='match_refresh_queue_idx')]
+        constraints = [
+            # Repeated saves of one row before the worker gets to it coalesce into one refresh
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='single_queued_match_refresh'),
+        ]
+
+    def __str__(self):
+        return f"Refresh {self.kind} {self.object_id}"
+
+
+class TrainingJob(models.Model):
+    """A request to retrain the matching model, run by the run_training_worker command"""
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Succeeded', 'Succeeded'),
+        ('Failed', 'Failed'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    progress = models.IntegerField(default=0)
+    stage = models.CharField(max_length=100, blank=True)
+    accuracy = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'], name='training_job_queue_idx')]
+        constraints = [
+            # At most one queued job, so concurrent requests can't queue duplicate builds
+            models.UniqueConstraint(fields=['status'], condition=models.Q(status='Queued'),
+                                    name='single_queued_training_job'),
+        ]
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'stage': self.stage,
+            'accuracy': self.accuracy,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __str__(self):
+        return f"Training job {self.id} ({self.status})"
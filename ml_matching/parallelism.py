@@ -0,0 +1,95 @@
+"""Core budget for model training.
+
+The training scripts and OrganMatchingML.train_model parallelize three levels:
+cross-validation folds, VotingClassifier members and RandomForest trees.
+TrainingParallelism splits one core budget across them so the total number of
+busy workers never exceeds the machine's cores.
+
+The budget comes from the --n-jobs flag, else the ML_TRAINING_N_JOBS setting,
+else all cores. It follows the sklearn n_jobs convention: -1 means all cores and
+-2 means all but one.
+"""
+import argparse
+import os
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def configured_n_jobs():
+    """ML_TRAINING_N_JOBS from Django settings, or -1 outside a configured project"""
+    try:
+        from django.conf import settings
+        return getattr(settings, 'ML_TRAINING_N_JOBS', -1)
+    except Exception:
+        return -1
+
+
+def resolve_n_jobs(n_jobs=None):
+    """Turn an n_jobs value into a concrete core count in [1, available cores]"""
+    if n_jobs is None:
+        n_jobs = configured_n_jobs()
+    cores = available_cores()
+    if n_jobs is None or n_jobs == 0:
+        n_jobs = 1
+    elif n_jobs < 0:
+        n_jobs = cores + 1 + n_jobs
+    return max(1, min(int(n_jobs), cores))
+
+
+def _split(budget, members):
+    """(voting n_jobs, forest n_jobs) for fitting one ensemble on `budget` cores.
+
+    The forest shares the budget with the other members running alongside it.
+    """
+    voting = min(members, budget)
+    forest = max(1, budget - (voting - 1))
+    return voting, forest
+
+
+class TrainingParallelism:
+    def __init__(self, n_jobs=None, cv_folds=5, members=4):
+        self.total = resolve_n_jobs(n_jobs)
+        # Cross-validation: folds run side by side, each fitting a full ensemble
+        self.cv = min(cv_folds, self.total)
+        self.cv_voting, self.cv_forest = _split(max(1, self.total // self.cv), members)
+        # Final fit: the whole budget goes to one ensemble
+        self.fit_voting, self.fit_forest = _split(self.total, members)
+
+    def configure(self, ensemble, for_cv):
+        """Set n_jobs on a VotingClassifier and its RandomForest members"""
+        voting, forest = (self.cv_voting, self.cv_forest) if for_cv else (self.fit_voting, self.fit_forest)
+        ensemble.set_params(n_jobs=voting)
+        for name, estimator in ensemble.estimators:
+            if 'n_jobs' in estimator.get_params():
+                ensemble.set_params(**{f'{name}__n_jobs': forest})
+        return ensemble
+
+    @staticmethod
+    def serial(ensemble):
+        """Reset n_jobs on a fitted ensemble so inference never spawns workers per request"""
+        ensemble.n_jobs = None
+        for estimator in [est for _, est in ensemble.estimators] + list(getattr(ensemble, 'estimators_', [])):
+            if hasattr(estimator, 'n_jobs'):
+                estimator.n_jobs = None
+        return ensemble
+
+    def __repr__(self):
+        return (f"TrainingParallelism(total={self.total}, cv={self.cv}, "
+                f"cv_voting={self.cv_voting}, cv_forest={self.cv_forest}, "
+                f"fit_voting={self.fit_voting}, fit_forest={self.fit_forest})")
+
+
+def add_n_jobs_argument(parser):
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help="Cores to use for training (-1 = all; default: ML_TRAINING_N_JOBS setting)")
+    return parser
+
+
+def parse_n_jobs(description=None):
+    """--n-jobs for the standalone training scripts"""
+    return add_n_jobs_argument(argparse.ArgumentParser(description=description)).parse_args().n_jobs
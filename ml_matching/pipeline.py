@@ -0,0 +1,355 @@
+"""Staged, cached training pipeline for the matching model.
+
+Training runs as six stages: load data -> build features -> encode/scale ->
+select -> fit -> evaluate. Each stage's output is stored under the cache
+directory, keyed by a hash of the stage's own parameters and the key of the
+stage before it. Changing only the model hyperparameters therefore reuses the
+cached data and preprocessing and refits just the ensemble; changing the data
+source or the survey CSV invalidates everything downstream of it.
+
+The fit stage holds a validation slice of the training split out of fitting.
+The serving ensemble is chosen on that slice, so the test split only ever
+measures the published model.
+
+OrganMatchingML.train_model and the train_*.py scripts all train through
+TrainingPipeline, passing overrides of DEFAULT_CONFIG where they differ.
+"""
+import copy
+import hashlib
+import json
+import os
+import tempfile
+
+import joblib
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier, VotingClassifier
+from sklearn.feature_selection import SelectKBest, f_classif
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.model_selection import cross_val_score, train_test_split
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import LabelEncoder, RobustScaler
+from sklearn.svm import SVC
+
+from organ_donation.instrumentation import exception
+
+try:
+    from .bundle import BUNDLE_NAME, export_bundle, read_bundle
+    from .parallelism import TrainingParallelism
+    from .registry import _file_hash, save_artifacts
+    from .serving import choose_serving_members, describe
+    from .training_data import SURVEY_CSV, TRAINING_SEED, load_training_data
+except ImportError:
+    # Imported as a top-level module by the standalone runner
+    from bundle import BUNDLE_NAME, export_bundle, read_bundle
+    from parallelism import TrainingParallelism
+    from registry import _file_hash, save_artifacts
+    from serving import choose_serving_members, describe
+    from training_data import SURVEY_CSV, TRAINING_SEED, load_training_data
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pipeline_cache')
+
+DEFAULT_CONFIG = {
+    'data': {'source': 'survey', 'n_samples': 1000, 'seed': TRAINING_SEED},
+    'split': {'test_size': 0.2, 'random_state': 42},
+    # Share of the training split held out of fitting to choose the serving ensemble
+    'validation': {'test_size': 0.1, 'random_state': 42},
+    'select': {'k': 10},
+    'model': {
+        'rf': {'n_estimators': 200, 'max_depth': 15, 'min_samples_split': 5, 'random_state': 42},
+        'gb': {'n_estimators': 150, 'learning_rate': 0.1, 'max_depth': 8, 'random_state': 42},
+        'svm': {'kernel': 'rbf', 'C': 10, 'gamma': 'scale', 'probability': True, 'random_state': 42},
+        'mlp': {'hidden_layer_sizes': (100, 50), 'max_iter': 500, 'random_state': 42},
+    },
+    'cv_folds': 5,
+    # p99_budget_ms None: the ML_SERVING_P99_MS setting (see ml_matching.serving)
+    'serving': {'p99_budget_ms': None, 'profile_rows': 200},
+}
+
+# Ensemble members in the order they are combined by the VotingClassifier
+MODEL_MEMBERS = {
+    'rf': RandomForestClassifier,
+    'gb': GradientBoostingClassifier,
+    'svm': SVC,
+    'mlp': MLPClassifier,
+}
+
+CATEGORICAL_COLUMNS = ['donor_blood', 'recipient_blood', 'organ_type', 'urgency']
+
+# Column order of the feature matrix, shared with OrganMatchingML.build_feature_matrix
+FEATURE_COLUMNS = [
+    'donor_blood_encoded', 'recipient_blood_encoded', 'organ_type_encoded',
+    'urgency_encoded', 'donor_age', 'recipient_age', 'donor_weight',
+    'recipient_weight', 'smoking', 'alcohol', 'compatibility_score',
+    'age_diff', 'weight_ratio', 'blood_exact_match', 'health_score', 'urgency_weight'
+]
+
+# Bump a stage's version when its code changes so stale cache entries are ignored
+STAGE_VERSIONS = {'data': 1, 'features': 1, 'encode': 1, 'select': 1, 'fit': 2, 'evaluate': 1}
+
+
+def training_config(**overrides):
+    """DEFAULT_CONFIG with the given sections replaced.
+
+    Dict sections are merged key by key, except 'model', which replaces the
+    member list outright so an override can train a smaller ensemble.
+    """
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    for section, value in overrides.items():
+        if isinstance(value, dict) and section != 'model':
+            config[section].update(value)
+        else:
+            config[section] = copy.deepcopy(value)
+    return config
+
+
+def build_ensemble(model_params):
+    """Unfitted soft-voting ensemble of the members named in model_params"""
+    return VotingClassifier(
+        estimators=[
+            (name, member(**model_params[name]))
+            for name, member in MODEL_MEMBERS.items() if name in model_params
+        ],
+        voting='soft'
+    )
+
+
+class StageCache:
+    """Stage outputs pickled under one directory, one file per (stage, key)"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, enabled=True):
+        self.directory = directory
+        self.enabled = enabled
+
+    @staticmethod
+    def key(stage, params, upstream=None):
+        payload = json.dumps(
+            {'stage': stage, 'version': STAGE_VERSIONS[stage], 'params': params, 'upstream': upstream},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, stage, key):
+        return os.path.join(self.directory, f"{stage}-{key[:24]}.joblib")
+
+    def load(self, stage, key):
+        if not self.enabled:
+            return None
+        try:
+            return joblib.load(self._path(stage, key))
+        except Exception:
+            # Missing or unreadable entries are recomputed
+            return None
+
+    def save(self, stage, key, value):
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(stage, key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(value, tmp)
+        os.replace(tmp, path)
+
+
+def load_data(params):
+    return load_training_data(**params)
+
+
+def build_features(df):
+    """Engineered columns that don't depend on fitted encoders"""
+    df = df.copy()
+    df['age_diff'] = (df['donor_age'] - df['recipient_age']).abs()
+    df['weight_ratio'] = df['donor_weight'] / df['recipient_weight']
+    df['blood_exact_match'] = (df['donor_blood'] == df['recipient_blood']).astype(int)
+    df['health_score'] = 2 - df['smoking'] - df['alcohol']
+    return df
+
+
+def encode_and_scale(df, split_params):
+    """Fit label encoders, split train/test and fit the scaler on the training part"""
+    df = df.copy()
+    label_encoders = {}
+    for col in CATEGORICAL_COLUMNS:
+        le = LabelEncoder()
+        df[col + '_encoded'] = le.fit_transform(df[col])
+        label_encoders[col] = le
+    df['urgency_weight'] = df['urgency_encoded'] * 0.2
+
+    # Handle class imbalance with stratified split
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[FEATURE_COLUMNS], df['match'], stratify=df['match'], **split_params
+    )
+    scaler = RobustScaler()
+    return {
+        'label_encoders': label_encoders,
+        'scaler': scaler,
+        'X_train': scaler.fit_transform(X_train),
+        'X_test': scaler.transform(X_test),
+        'y_train': y_train.to_numpy(),
+        'y_test': y_test.to_numpy(),
+    }
+
+
+def select_features(encoded, params):
+    selector = SelectKBest(f_classif, **params)
+    return {
+        'feature_selector': selector,
+        'X_train': selector.fit_transform(encoded['X_train'], encoded['y_train']),
+        'X_test': selector.transform(encoded['X_test']),
+    }
+
+
+def fit_model(selected, y_train, model_params, cv_folds, parallelism, validation_params):
+    """Hold out a validation slice, then cross-validate and fit the ensemble on the rest of the training split"""
+    X_fit, X_validation, y_fit, y_validation = train_test_split(
+        selected['X_train'], y_train, stratify=y_train, **validation_params
+    )
+    model = build_ensemble(model_params)
+    cv_scores = cross_val_score(
+        parallelism.configure(model, for_cv=True), X_fit, y_fit,
+        cv=cv_folds, scoring='accuracy', n_jobs=parallelism.cv
+    )
+    parallelism.configure(model, for_cv=False).fit(X_fit, y_fit)
+    return {'model': TrainingParallelism.serial(model), 'cv_scores': cv_scores,
+            'X_validation': X_validation, 'y_validation': y_validation}
+
+
+def evaluate(model, X_test, y_test):
+    y_pred = model.predict(X_test)
+    return {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'report': classification_report(y_test, y_pred),
+        'confusion_matrix': confusion_matrix(y_test, y_pred),
+    }
+
+
+def choose_serving(model, scaler, label_encoders, feature_selector, X_validation, y_validation, params):
+    """Serving-ensemble entry for the fitted components, or None if they can't be exported.
+
+    Profiles the members as workers run them, from an exported bundle. Not
+    cached: the timings belong to the machine and moment of training.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, BUNDLE_NAME)
+        try:
+            export_bundle(path, model, scaler, label_encoders, feature_selector)
+        except ValueError:
+            exception('serving_profile_failed')
+            return None
+        bundle = read_bundle(path)
+    return choose_serving_members(bundle.model, X_validation, y_validation, **params)
+
+
+class TrainingResult:
+    """Fitted components and evaluation of one pipeline run"""
+
+    def __init__(self, model, scaler, label_encoders, feature_selector, cv_scores, evaluation, cached_stages,
+                 serving=None):
+        self.model = model
+        self.scaler = scaler
+        self.label_encoders = label_encoders
+        self.feature_selector = feature_selector
+        self.cv_scores = cv_scores
+        self.accuracy = evaluation['accuracy']
+        self.report = evaluation['report']
+        self.confusion_matrix = evaluation['confusion_matrix']
+        self.cached_stages = cached_stages
+        # Members that serve online requests; see ml_matching.serving
+        self.serving = serving
+
+    def save(self, model_dir='ml_matching'):
+        """Publish the components under model_dir with the file names OrganMatchingML loads"""
+        save_artifacts([
+            (self.model, os.path.join(model_dir, 'trained_model.joblib')),
+            (self.scaler, os.path.join(model_dir, 'scaler.joblib')),
+            (self.label_encoders, os.path.join(model_dir, 'encoders.joblib')),
+            (self.feature_selector, os.path.join(model_dir, 'feature_selector.joblib')),
+        ], serving=self.serving)
+
+
+class TrainingPipeline:
+    """Runs the training stages, reusing cached outputs whose inputs haven't changed"""
+
+    def __init__(self, config=None, n_jobs=None, progress=None, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+        self.config = config or training_config()
+        self.n_jobs = n_jobs
+        self.progress = progress
+        self.cache = StageCache(cache_dir, enabled=use_cache)
+        self.cached_stages = []
+
+    def _report(self, percent, stage):
+        if self.progress is not None:
+            self.progress(percent, stage)
+
+    def _stage(self, stage, params, upstream, compute):
+        """Cached output and key of one stage"""
+        key = StageCache.key(stage, params, upstream)
+        value = self.cache.load(stage, key)
+        if value is None:
+            value = compute()
+            self.cache.save(stage, key, value)
+        else:
+            self.cached_stages.append(stage)
+        return key, value
+
+    def run(self):
+        config = self.config
+        self.cached_stages = []
+
+        self._report(0, 'Preparing training data')
+        data_params = dict(config['data'])
+        source_hash = _file_hash(SURVEY_CSV) if data_params.get('source') == 'survey' else None
+        data_key, df = self._stage('data', {'data': data_params, 'csv': source_hash}, None,
+                                   lambda: load_data(data_params))
+
+        self._report(5, 'Building features')
+        features_key, df = self._stage('features', {}, data_key, lambda: build_features(df))
+
+        self._report(10, 'Encoding and scaling features')
+        encode_key, encoded = self._stage('encode', config['split'], features_key,
+                                          lambda: encode_and_scale(df, config['split']))
+
+        self._report(15, 'Selecting features')
+        select_key, selected = self._stage('select', config['select'], encode_key,
+                                           lambda: select_features(encoded, config['select']))
+
+        # Cores don't change the fitted model, so n_jobs is not part of the key
+        parallelism = TrainingParallelism(self.n_jobs, cv_folds=config['cv_folds'], members=len(config['model']))
+        print(f"Training with {parallelism}")
+        self._report(20, 'Fitting ensemble')
+        fit_key, fitted = self._stage(
+            'fit', {'model': config['model'], 'cv_folds': config['cv_folds'], 'validation': config['validation']},
+            select_key,
+            lambda: fit_model(selected, encoded['y_train'], config['model'], config['cv_folds'], parallelism,
+                              config['validation'])
+        )
+        cv_scores = fitted['cv_scores']
+        print(f"Cross-validation scores: {cv_scores}")
+        print(f"Mean CV accuracy: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
+
+        self._report(90, 'Evaluating')
+        _, evaluation = self._stage('evaluate', {}, fit_key,
+                                    lambda: evaluate(fitted['model'], selected['X_test'], encoded['y_test']))
+        print(f"Test Accuracy: {evaluation['accuracy']:.4f}")
+        print(f"Classification Report:")
+        print(evaluation['report'])
+        print(f"Confusion Matrix:")
+        print(evaluation['confusion_matrix'])
+        if self.cached_stages:
+            print(f"Reused cached stages: {', '.join(self.cached_stages)}")
+
+        self._report(92, 'Profiling serving ensemble')
+        serving = choose_serving(fitted['model'], encoded['scaler'], encoded['label_encoders'],
+                                 selected['feature_selector'], fitted['X_validation'], fitted['y_validation'],
+                                 config['serving'])
+        if serving is not None:
+            print(describe(serving))
+
+        return TrainingResult(
+            model=fitted['model'],
+            scaler=encoded['scaler'],
+            label_encoders=encoded['label_encoders'],
+            feature_selector=selected['feature_selector'],
+            cv_scores=cv_scores,
+            evaluation=evaluation,
+            cached_stages=list(self.cached_stages),
+            serving=serving,
+        )
@@ -0,0 +1,96 @@
+"""Streaming top-k ranking of matches.
+
+Matches are ranked by (urgency rank, compatibility score, ml probability),
+highest first. Instead of collecting every scored pair and sorting the whole
+list, MatchRanker pushes each match into a bounded heap for its requirement
+and one for its hospital, so memory is O(k) per group and ranking N matches
+costs O(N log k). Ties keep the order the matches were pushed in.
+"""
+import heapq
+from collections import defaultdict
+from itertools import count
+
+URGENCY_RANK = {'Critical': 5, 'Urgent': 4, 'High': 3, 'Medium': 2, 'Low': 1}
+
+DEFAULT_K = 10
+# Upper bound for the k query parameter
+MAX_K = 500
+
+
+def match_key(urgency_level, compatibility_score, probability):
+    return URGENCY_RANK.get(urgency_level, 0), compatibility_score, float(probability)
+
+
+def ranking_params(query, default_k=None):
+    """(k, min_score) from a request's query parameters; raises ValueError on bad values.
+
+    k is default_k when the query has none; None means every match is listed.
+    """
+    k = int(query['k']) if query.get('k') else default_k
+    min_score = int(query.get('min_score') or 0)
+    if k is not None and not 1 <= k <= MAX_K:
+        raise ValueError(f"k must be between 1 and {MAX_K}")
+    return k, min_score
+
+
+class TopK:
+    """The k items with the largest keys pushed so far; k=None keeps every item"""
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        # Min-heap of (key, -arrival, item): the root is the first to be evicted
+        self._heap = []
+        self._arrival = count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, key, item):
+        """Offer item; returns False if it ranks below everything kept"""
+        entry = (key, -next(self._arrival), item)
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] <= self._heap[0][:2]:
+            return False
+        heapq.heapreplace(self._heap, entry)
+        return True
+
+    def entries(self):
+        """(key, item) pairs, best first"""
+        return [(key, item) for key, _, item in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+    def items(self):
+        return [item for _, item in self.entries()]
+
+
+class MatchRanker:
+    """Top-k matches per requirement and per hospital, fed one match at a time"""
+
+    def __init__(self, k=DEFAULT_K, min_score=0):
+        self.k = k
+        self.min_score = min_score
+        self._by_requirement = defaultdict(lambda: TopK(k))
+        self._by_hospital = defaultdict(lambda: TopK(k))
+
+    def add(self, match, requirement_id, hospital_id, urgency_level, compatibility_score, probability):
+        """Offer one match; matches scoring below min_score are dropped"""
+        if compatibility_score < self.min_score:
+            return
+        key = match_key(urgency_level, compatibility_score, probability)
+        self._by_requirement[requirement_id].push(key, match)
+        self._by_hospital[hospital_id].push(key, match)
+
+    def for_requirement(self, requirement_id):
+        return self._by_requirement[requirement_id].items() if requirement_id in self._by_requirement else []
+
+    def for_hospital(self, hospital_id):
+        return self._by_hospital[hospital_id].items() if hospital_id in self._by_hospital else []
+
+    def ranked(self):
+        """Every requirement's top k in one list, best first"""
+        merged = heapq.merge(
+            *(heap.entries() for heap in self._by_requirement.values()),
+            key=lambda entry: entry[0], reverse=True
+        )
+        return [match for _, match in merged]
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    from .bundle import BUNDLE_NAME, bundle_path, export_bundle, read_bundle
+except ImportError:
+    # Imported as a top-level module by the standalone runner
+    from bundle import BUNDLE_NAME, bundle_path, export_bundle, read_bundle
+
+from organ_donation.instrumentation import event, exception
+
+# Written last when a trained artifact set is published; lists each file's hash
+MANIFEST_NAME = 'model_manifest.json'
+
+
+def _file_hash(path):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path(model_path):
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), MANIFEST_NAME)
+
+
+def artifact_hashes(paths):
+    """File name -> content hash of each artifact that exists; the source recorded in a bundle"""
+    hashes = {os.path.basename(path): _file_hash(path) for path in paths}
+    return {name: digest for name, digest in hashes.items() if digest is not None}
+
+
+def publish_artifacts(staged):
+    """Move a freshly trained artifact set into place as one unit.
+
+    staged is a list of (staged_path, final_path) pairs; staged files must live on
+    the same filesystem as their final paths. Each file is swapped in with
+    os.replace, then the manifest is atomically replaced. Readers going through
+    ModelRegistry only accept a set whose hashes match the manifest, so they never
+    mix old and new components.
+    """
+    hashes = {os.path.basename(final): _file_hash(src) for src, final in staged}
+    for src, final in staged:
+        os.replace(src, final)
+
+    target = manifest_path(staged[0][1])
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as fh:
+        json.dump({'published_at': time.time(), 'files': hashes}, fh)
+    os.replace(tmp, target)
+    model_registry.invalidate(staged[0][1])
+
+
+def save_artifacts(components, with_bundle=True, serving=None):
+    """Dump (component, final_path) pairs to a staging directory, then publish them together.
+
+    components are the model, scaler, label encoders and feature selector, in
+    that order. With with_bundle, the inference bundle exported from them (see
+    ml_matching.bundle) is published in the same set, recording the serving
+    ensemble if one was chosen.
+    """
+    import joblib
+    model_dir = os.path.dirname(components[0][1]) or '.'
+    os.makedirs(model_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=model_dir)
+    try:
+        staged = []
+        for component, path in components:
+            staged_path = os.path.join(staging_dir, os.path.basename(path))
+            joblib.dump(component, staged_path)
+            staged.append((staged_path, path))
+        if with_bundle:
+            staged_bundle = os.path.join(staging_dir, BUNDLE_NAME)
+            try:
+                export_bundle(staged_bundle, *(component for component, _ in components),
+                              source=artifact_hashes([staged_path for staged_path, _ in staged]),
+                              serving=serving)
+            except ValueError:
+                # Workers keep loading the joblib files; a stale bundle no longer matches them
+                exception('inference_bundle_not_exported', model_dir=model_dir)
+            else:
+                staged.append((staged_bundle, bundle_path(components[0][1])))
+        publish_artifacts(staged)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+class ModelArtifacts:
+    """A loaded set of matching model components, shared read-only by all callers.
+
+    source is 'bundle' when the components are mapped from the inference bundle
+    and 'joblib' when they were unpickled. serving_model is the latency-budgeted
+    ensemble for online requests; joblib sets serve the full model.
+    """
+
+    def __init__(self, model, scaler, label_encoders, feature_selector, load_time, source='joblib',
+                 serving_model=None):
+        self.model = model
+        self.serving_model = model if serving_model is None else serving_model
+        self.scaler = scaler
+        self.label_encoders = label_encoders
+        self.feature_selector = feature_selector
+        self.load_time = load_time
+        self.source = source
+
+
+class ModelRegistry:
+    """Process-wide cache of trained model artifacts.
+
+    Each artifact set (model, scaler, encoders, selector paths) is loaded once per
+    process. A cached set is reused until one of its files changes on disk: a cheap
+    mtime/size check runs on every lookup, and the files are only re-read when their
+    content hash differs from the one that was loaded.
+
+    When the directory holds an inference bundle exported from exactly these
+    files, the set is mapped from the bundle instead of unpickled.
+    """
+
+    # How long to wait for an in-progress publish before loading whatever is on disk
+    publish_wait_seconds = 2.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = {
+            'loads': 0,
+            'hits': 0,
+            'misses': 0,
+            'last_load_seconds': 0.0,
+            'total_load_seconds': 0.0,
+        }
+
+    @staticmethod
+    def _file_state(paths):
+        state = []
+        for path in paths + (manifest_path(paths[0]), bundle_path(paths[0])):
+            try:
+                st = os.stat(path)
+            except OSError:
+                state.append((path, None, None))
+            else:
+                state.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(state)
+
+    @staticmethod
+    def _consistent(paths, hashes):
+        """True unless a manifest exists and the files on disk don't match it"""
+        try:
+            with open(manifest_path(paths[0])) as fh:
+                expected = json.load(fh)['files']
+        except (OSError, ValueError, KeyError):
+            return True
+        return all(
+            expected.get(os.path.basename(path), digest) == digest
+            for path, digest in zip(paths, hashes)
+        )
+
+    def get(self, model_path, scaler_path, encoders_path, selector_path):
+        """Return the cached ModelArtifacts for these paths, or None if no model is trained"""
+        paths = tuple(os.path.abspath(p) for p in (model_path, scaler_path, encoders_path, selector_path))
+        if not os.path.exists(paths[0]):
+            return None
+
+        with self._lock:
+            state = self._file_state(paths)
+            entry = self._entries.get(paths)
+            if entry is not None and entry['state'] == state:
+                self._stats['hits'] += 1
+                return entry['artifacts']
+
+            hashes = [_file_hash(path) for path in paths]
+            deadline = time.monotonic() + self.publish_wait_seconds
+            while not self._consistent(paths, hashes):
+                if entry is not None:
+                    # A publish is in progress; keep serving the previous set
+                    self._stats['hits'] += 1
+                    return entry['artifacts']
+                if time.monotonic() > deadline:
+                    break
+                time.sleep(0.05)
+                state = self._file_state(paths)
+                hashes = [_file_hash(path) for path in paths]
+
+            bundle_hash = _file_hash(bundle_path(paths[0]))
+            content_hash = hashlib.sha256(''.join(h or '-' for h in hashes + [bundle_hash]).encode()).hexdigest()
+            if entry is not None and entry['hash'] == content_hash:
+                # Files were touched or rewritten with identical content
+                entry['state'] = state
+                self._stats['hits'] += 1
+                return entry['artifacts']
+
+            self._stats['misses'] += 1
+            artifacts = self._load(paths)
+            self._entries[paths] = {'state': state, 'hash': content_hash, 'artifacts': artifacts}
+            return artifacts
+
+    @staticmethod
+    def _read_bundle(paths):
+        """The bundle exported from the files at paths, or None"""
+        path = bundle_path(paths[0])
+        if not os.path.exists(path):
+            return None
+        try:
+            bundle = read_bundle(path)
+        except (OSError, ValueError):
+            exception('inference_bundle_ignored', path=path)
+            return None
+        if bundle.source != artifact_hashes(paths):
+            event('inference_bundle_ignored', level=logging.WARNING, path=path,
+                  reason='exported from other artifacts')
+            return None
+        return bundle
+
+    def _load(self, paths):
+        model_path, scaler_path, encoders_path, selector_path = paths
+        start = time.perf_counter()
+        bundle = self._read_bundle(paths)
+        serving_model = None
+        if bundle is not None:
+            model, scaler, serving_model = bundle.model, bundle.scaler, bundle.serving_model
+            label_encoders, feature_selector = bundle.label_encoders, bundle.feature_selector
+            source = 'bundle'
+        else:
+            # Unpickling pulls in sklearn; keep it off the import path of the web app
+            import joblib
+            model = joblib.load(model_path)
+            scaler = joblib.load(scaler_path)
+            label_encoders = joblib.load(encoders_path)
+            feature_selector = joblib.load(selector_path) if os.path.exists(selector_path) else None
+            source = 'joblib'
+        load_time = time.perf_counter() - start
+
+        self._stats['loads'] += 1
+        self._stats['last_load_seconds'] = load_time
+        self._stats['total_load_seconds'] += load_time
+        event('model_loaded', source=source, model_dir=os.path.dirname(model_path), load_seconds=round(load_time, 3))
+        return ModelArtifacts(model, scaler, label_encoders, feature_selector, load_time, source, serving_model)
+
+    def loaded(self, model_path):
+        """Whether a set rooted at model_path is already cached in this process; never loads"""
+        model_path = os.path.abspath(model_path)
+        with self._lock:
+            return any(key[0] == model_path for key in self._entries)
+
+    def invalidate(self, model_path=None):
+        """Drop cached artifacts (all of them, or the set rooted at model_path)"""
+        with self._lock:
+            if model_path is None:
+                self._entries.clear()
+                return
+            model_path = os.path.abspath(model_path)
+            for key in [k for k in self._entries if k[0] == model_path]:
+                del self._entries[key]
+
+    def stats(self):
+        """Load count, cache hits/misses and load timings for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_sets'] = len(self._entries)
+        return stats
+
+
+# Shared by every OrganMatchingML instance in this process
+model_registry = ModelRegistry()
@@ -0,0 +1,81 @@
+import numpy as np
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+# Donor blood type -> recipient blood types it can give to
+BLOOD_COMPATIBILITY = {
+    'O-': ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+'],
+    'O+': ['O+', 'A+', 'B+', 'AB+'],
+    'A-': ['A-', 'A+', 'AB-', 'AB+'],
+    'A+': ['A+', 'AB+'],
+    'B-': ['B-', 'B+', 'AB-', 'AB+'],
+    'B+': ['B+', 'AB+'],
+    'AB-': ['AB-', 'AB+'],
+    'AB+': ['AB+']
+}
+
+
+def _blood_points_table():
+    """8x8 blood component of the score: [donor code, recipient code] -> 35 / 30 / 0"""
+    table = np.zeros((len(BLOOD_TYPES), len(BLOOD_TYPES)), dtype=np.int64)
+    for d, donor in enumerate(BLOOD_TYPES):
+        for r, recipient in enumerate(BLOOD_TYPES):
+            if recipient in BLOOD_COMPATIBILITY[donor]:
+                table[d, r] = 35 if donor == recipient else 30
+    return table
+
+
+BLOOD_POINTS = _blood_points_table()
+
+# Same bands as OrganMatchingML.calculate_compatibility_score
+AGE_DIFF_BINS = np.array([5, 10, 15, 20, 30])
+AGE_POINTS = np.array([20, 16, 12, 8, 4, 0])
+WEIGHT_RATIO_BANDS = [(0.9, 10), (0.8, 8), (0.7, 5), (0.6, 2)]
+
+
+def blood_codes(values):
+    """Index into BLOOD_TYPES for each value; unknown or missing blood types are -1"""
+    lookup = {blood: code for code, blood in enumerate(BLOOD_TYPES)}
+    return np.array([lookup.get(value, -1) for value in values], dtype=np.int64)
+
+
+def category_codes(*columns):
+    """Encode several string columns against one shared vocabulary so codes compare equal"""
+    sizes = [len(column) for column in columns]
+    joined = np.concatenate([np.asarray(column, dtype=object).astype(str) for column in columns])
+    _, codes = np.unique(joined, return_inverse=True)
+    return np.split(codes.astype(np.int64), np.cumsum(sizes)[:-1])
+
+
+def compatibility_scores(donor_blood, recipient_blood, donor_organ, recipient_organ,
+                         donor_age, recipient_age, donor_weight, recipient_weight,
+                         smoking, alcohol):
+    """Vectorized calculate_compatibility_score over aligned per-pair column arrays.
+
+    Blood arguments are codes from blood_codes(); organ arguments are codes from a
+    shared vocabulary (see category_codes). Inputs broadcast against each other, so
+    donor columns shaped (N, 1) and recipient columns shaped (M,) yield an N x M
+    score matrix. Returns integer scores identical to the scalar function.
+    """
+    donor_blood = np.asarray(donor_blood)
+    recipient_blood = np.asarray(recipient_blood)
+    known_blood = (donor_blood >= 0) & (recipient_blood >= 0)
+    score = np.where(known_blood, BLOOD_POINTS[np.clip(donor_blood, 0, None), np.clip(recipient_blood, 0, None)], 0)
+
+    score = score + np.where(np.asarray(donor_organ) == np.asarray(recipient_organ), 25, 0)
+
+    age_diff = np.abs(np.asarray(donor_age, dtype=np.float64) - np.asarray(recipient_age, dtype=np.float64))
+    score = score + AGE_POINTS[np.digitize(age_diff, AGE_DIFF_BINS, right=True)]
+
+    donor_weight = np.asarray(donor_weight, dtype=np.float64)
+    recipient_weight = np.asarray(recipient_weight, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight_ratio = np.minimum(donor_weight, recipient_weight) / np.maximum(donor_weight, recipient_weight)
+    score = score + np.select(
+        [weight_ratio >= threshold for threshold, _ in WEIGHT_RATIO_BANDS],
+        [points for _, points in WEIGHT_RATIO_BANDS],
+        default=0
+    )
+
+    score = score + np.where(np.asarray(smoking).astype(bool), 0, 5) + np.where(np.asarray(alcohol).astype(bool), 0, 5)
+    return np.minimum(score, 100).astype(np.int64)
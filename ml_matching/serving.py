@@ -0,0 +1,132 @@
+"""Latency-budgeted choice of the ensemble members that score online requests.
+
+Every trained model is published with two ensembles over the same fitted
+members:
+
+    offline  all members; used for every match table write (refreshes and
+             rebuild()), which run in the worker
+    serving  the members that fit the single-row p99 latency budget; used by
+             everything that scores inside a request
+
+After training, choose_serving_members() times each member of the exported
+bundle on single validation rows and scores it on the whole validation split.
+A set of members' latency on a row is the sum of theirs. While the ensemble's
+p99 exceeds the budget, the member that costs the least validation accuracy
+per millisecond saved is dropped; an ensemble that already fits is served
+whole. Because soft voting just averages member probabilities, the serving
+ensemble needs no refitting.
+
+The budget is the pipeline's serving.p99_budget_ms, else the
+ML_SERVING_P99_MS setting.
+"""
+import logging
+import time
+
+import numpy as np
+
+from organ_donation.instrumentation import event
+
+SERVING_ENSEMBLE = 'serving'
+OFFLINE_ENSEMBLE = 'offline'
+
+DEFAULT_P99_BUDGET_MS = 5.0
+
+
+def configured_budget_ms():
+    """ML_SERVING_P99_MS from Django settings, or DEFAULT_P99_BUDGET_MS outside a configured project"""
+    try:
+        from django.conf import settings
+        return getattr(settings, 'ML_SERVING_P99_MS', DEFAULT_P99_BUDGET_MS)
+    except Exception:
+        return DEFAULT_P99_BUDGET_MS
+
+
+def _row_latencies(ensemble, X):
+    """Seconds each member takes on each row alone, as an (n_members, n_rows) array"""
+    timings = np.empty((len(ensemble.members), len(X)))
+    for index in range(len(ensemble.members)):
+        # First call pays one-off setup; keep it out of the timings
+        ensemble.member_proba(index, X[:1])
+        for row in range(len(X)):
+            start = time.perf_counter()
+            ensemble.member_proba(index, X[row:row + 1])
+            timings[index, row] = time.perf_counter() - start
+    return timings
+
+
+def _accuracy(probabilities, weights, members, classes, y):
+    positive = weights[members] @ probabilities[members] / weights[members].sum()
+    return float(np.mean(classes[(positive > 0.5).astype(int)] == y))
+
+
+def choose_serving_members(ensemble, X_validation, y_validation, p99_budget_ms=None, profile_rows=200):
+    """Profile ensemble's members and pick the serving subset.
+
+    ensemble is a BundleEnsemble; X_validation is scaled and selected.
+    Returns the dict stored as the bundle's 'serving' entry: the chosen
+    members with their p99 and accuracy, the budget, and per-member
+    p99_ms, accuracy and marginal_accuracy (the full ensemble's accuracy
+    minus its accuracy without that member).
+    """
+    budget_ms = configured_budget_ms() if p99_budget_ms is None else p99_budget_ms
+    X_validation = np.asarray(X_validation, dtype=np.float64)
+    y_validation = np.asarray(y_validation)
+    names = ensemble.member_names
+    everyone = list(range(len(names)))
+
+    latencies_ms = _row_latencies(ensemble, X_validation[:profile_rows]) * 1000
+    probabilities = np.array([ensemble.member_proba(index, X_validation) for index in everyone])
+
+    def accuracy(members):
+        return _accuracy(probabilities, ensemble.weights, list(members), ensemble.classes_, y_validation)
+
+    def p99(members):
+        return float(np.percentile(latencies_ms[list(members)].sum(axis=0), 99))
+
+    full_accuracy = accuracy(everyone)
+
+    def marginal_accuracy(index):
+        others = [i for i in everyone if i != index]
+        return full_accuracy - accuracy(others) if others else full_accuracy
+
+    profile = {
+        name: {'p99_ms': p99([index]), 'accuracy': accuracy([index]), 'marginal_accuracy': marginal_accuracy(index)}
+        for index, name in enumerate(names)
+    }
+
+    chosen = everyone
+    while p99(chosen) > budget_ms and len(chosen) > 1:
+        def cost(index):
+            # Accuracy lost per millisecond saved by dropping this member
+            rest = [i for i in chosen if i != index]
+            return (accuracy(chosen) - accuracy(rest)) / max(p99(chosen) - p99(rest), 1e-9)
+        dropped = min(chosen, key=cost)
+        chosen = [i for i in chosen if i != dropped]
+    if p99(chosen) > budget_ms:
+        chosen = [min(everyone, key=lambda index: p99([index]))]
+        event('serving_budget_exceeded', level=logging.WARNING, budget_ms=budget_ms, member=names[chosen[0]])
+
+    return {
+        'members': [names[index] for index in chosen],
+        'p99_ms': p99(chosen),
+        'accuracy': accuracy(chosen),
+        'offline_p99_ms': p99(everyone),
+        'offline_accuracy': full_accuracy,
+        'budget_ms': budget_ms,
+        'profile': profile,
+    }
+
+
+def describe(serving):
+    """One line per member plus the chosen subset, for training logs"""
+    lines = ["Member profile on the validation split:"] + [
+        f"  {name}: p99 {stats['p99_ms']:.2f} ms, accuracy {stats['accuracy']:.4f}, "
+        f"marginal {stats['marginal_accuracy']:+.4f}"
+        for name, stats in serving['profile'].items()
+    ]
+    lines.append(
+        f"Serving ensemble {'+'.join(serving['members'])}: p99 {serving['p99_ms']:.2f} ms "
+        f"(budget {serving['budget_ms']} ms), accuracy {serving['accuracy']:.4f}; "
+        f"offline ensemble: p99 {serving['offline_p99_ms']:.2f} ms, accuracy {serving['offline_accuracy']:.4f}"
+    )
+    return '\n'.join(lines)
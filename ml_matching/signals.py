@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from donors.models import DonationRequests
+from . import match_table
+from .models import HospitalOrganRequirement, DonorMedicalProfile, MatchRefresh
+
+
+# Saves only queue a refresh, in the same transaction as the change, so the
+# request never scores candidates and the worker only sees committed rows.
+# Deleted donations/requirements are removed from the table by the
+# foreign-key cascade.
+
+@receiver(post_save, sender=DonationRequests)
+def donation_saved(sender, instance, **kwargs):
+    match_table.enqueue_refresh(MatchRefresh.KIND_DONATION, instance.id)
+
+
+@receiver(post_save, sender=HospitalOrganRequirement)
+def requirement_saved(sender, instance, **kwargs):
+    match_table.enqueue_refresh(MatchRefresh.KIND_REQUIREMENT, instance.id)
+
+
+@receiver(post_save, sender=DonorMedicalProfile)
+@receiver(post_delete, sender=DonorMedicalProfile)
+def profile_changed(sender, instance, **kwargs):
+    match_table.enqueue_refresh(MatchRefresh.KIND_DONOR, instance.donor_id)
@@ -0,0 +1,685 @@
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from donors.models import DonationRequests
+from hospitals.models import User
+from . import availability, match_table, serving, training_jobs, warmup
+from .matching_algorithm import SCORER_MODEL, SCORER_RULES, OrganMatchingML
+from .models import HospitalOrganRequirement, DonorMedicalProfile, MatchCandidate, MatchRefresh, TrainingJob
+from .compiled_trees import compile_tree_ensemble
+from .donor_features import DEFAULT_PROFILE, MISSING_DEFAULTS, load_donor_features
+from .ranking import MatchRanker, TopK, match_key, ranking_params
+from .pipeline import TrainingPipeline, choose_serving, training_config
+from .registry import model_registry, save_artifacts
+from .training_data import (
+    TRAINING_COLUMNS, load_training_data, scoring_pairs, survey_training_data, synthetic_training_data
+)
+
+
+def create_hospital(name):
+    return User.objects.create(username=name, hospital_name=name, is_staff=True)
+
+
+def create_requirement(hospital, organ_type='Kidney', blood_type='AB+', urgency_level='High'):
+    return HospitalOrganRequirement.objects.create(
+        hospital=hospital, organ_type=organ_type, blood_type=blood_type,
+        patient_age=40, patient_weight=70.0, urgency_level=urgency_level
+    )
+
+
+def create_donation(username, organ_type='Kidney', blood_type='O-', with_profile=True, status='Pending'):
+    donor = User.objects.create(username=username, first_name=username, last_name='Donor')
+    if with_profile:
+        DonorMedicalProfile.objects.create(donor=donor, age=38, weight=72.0, height=175.0)
+    return DonationRequests.objects.create(
+        donor=donor, organ_type=organ_type, blood_type=blood_type, family_relation='Sibling',
+        family_relation_name='Kin', family_contact_number='5550000', donation_status=status,
+        donated_before=False, family_consent=True
+    )
+
+
+def always_match(self, donors, requirements, donor_idx, req_idx, compatibility=None):
+    self.scorer = SCORER_MODEL
+    return np.ones(len(donor_idx))
+
+
+@contextmanager
+def refreshes_run():
+    """Run the match table refreshes queued by the block, as the worker would"""
+    yield
+    match_table.run_queued_refreshes()
+
+
+class FindMatchesQueryCountTests(TestCase):
+
+    def seed(self, donations, requirements):
+        hospital = create_hospital(f'hospital-{User.objects.count()}')
+        for i in range(requirements):
+            create_requirement(hospital)
+        for i in range(donations):
+            create_donation(f'donor-{User.objects.count()}', with_profile=i % 4 != 0)
+
+    def run_find_matches(self):
+        with mock.patch.object(OrganMatchingML, 'predict_pairs', always_match):
+            matches = OrganMatchingML().find_matches()
+        # Touch the related objects the views read from each match
+        for match in matches:
+            match['donor'].first_name
+            match['hospital'].hospital_name
+        return matches
+
+    def test_query_count_is_independent_of_row_count(self):
+        self.seed(donations=3, requirements=2)
+        with self.assertNumQueries(3):
+            small = self.run_find_matches()
+
+        self.seed(donations=30, requirements=10)
+        with self.assertNumQueries(3):
+            large = self.run_find_matches()
+
+        self.assertGreater(len(large), len(small))
+
+    def test_donations_without_profile_are_skipped(self):
+        hospital = create_hospital('general')
+        create_requirement(hospital)
+        with_profile = create_donation('with-profile')
+        create_donation('without-profile', with_profile=False)
+
+        matches = self.run_find_matches()
+
+        self.assertEqual([m['donation_request'] for m in matches], [with_profile])
+
+
+class DonorFeaturesTests(TestCase):
+
+    def test_columns_load_in_two_queries(self):
+        profiled = create_donation('profiled')
+        DonorMedicalProfile.objects.filter(donor=profiled.donor).update(age=61, smoking_status=True)
+        bare = create_donation('bare', with_profile=False)
+
+        with self.assertNumQueries(2):
+            donors = load_donor_features(DonationRequests.objects.all())
+        self.assertEqual(donors.donations, [profiled])
+        self.assertEqual(donors.age.tolist(), [61.0])
+        self.assertEqual(donors.smoking_status.tolist(), [True])
+
+        donors = load_donor_features(DonationRequests.objects.all(), missing=MISSING_DEFAULTS)
+        row = donors.row(bare.id)
+        self.assertEqual(donors.age[row], DEFAULT_PROFILE['age'])
+        self.assertEqual(donors.has_profile.tolist(), [True, False])
+
+    def test_find_ml_matches_scores_real_profiles(self):
+        hospital = create_hospital('general')
+        requirement = create_requirement(hospital)
+        close = create_donation('close')
+        far = create_donation('far')
+        DonorMedicalProfile.objects.filter(donor=far.donor).update(age=80, weight=30.0)
+
+        self.client.force_login(hospital)
+        response = self.client.get('/hospitals/find-ml-matches/', {'requirement_id': requirement.id})
+
+        ml_matcher = OrganMatchingML()
+        hospital_req = ml_matcher.requirement_data(requirement)
+        donors = load_donor_features(DonationRequests.objects.order_by('id'))
+        expected = [
+            (donation.donor.id, ml_matcher.calculate_compatibility_score(donors.donor_data(row), hospital_req))
+            for row, donation in enumerate(donors.donations)
+        ]
+        matches = json.loads(response.content)
+        self.assertEqual([(m['donor_id'], m['compatibility_score']) for m in matches], expected)
+        self.assertEqual(matches[0]['donor_id'], close.donor.id)
+
+    def test_find_ml_matches_without_requirement_lists_every_blood_type(self):
+        hospital = create_hospital('general')
+        donations = [create_donation(f'donor-{blood}', blood_type=blood) for blood in ('O-', 'A+', 'AB+')]
+        create_donation('liver', organ_type='Liver')
+
+        self.client.force_login(hospital)
+        matches = json.loads(self.client.get('/hospitals/find-ml-matches/', {'organ_type': 'Kidney'}).content)
+        self.assertEqual(sorted(m['donor_id'] for m in matches), sorted(d.donor.id for d in donations))
+
+    def test_find_ml_matches_returns_ten_without_k(self):
+        hospital = create_hospital('general')
+        requirement = create_requirement(hospital)
+        for i in range(12):
+            create_donation(f'donor-{i}')
+
+        self.client.force_login(hospital)
+        url = '/hospitals/find-ml-matches/'
+        matches = json.loads(self.client.get(url, {'requirement_id': requirement.id}).content)
+        self.assertEqual(len(matches), 10)
+        matches = json.loads(self.client.get(url, {'requirement_id': requirement.id, 'k': 12}).content)
+        self.assertEqual(len(matches), 12)
+
+
+class ScopedMatchingTests(TestCase):
+
+    def setUp(self):
+        self.general = create_hospital('general')
+        self.kidney = create_requirement(self.general)
+        self.elsewhere = create_hospital('elsewhere')
+        self.liver = create_requirement(self.elsewhere, organ_type='Liver')
+        self.kidney_donation = create_donation('kidney')
+        create_donation('liver', organ_type='Liver')
+
+    def find_matches(self, **scope):
+        with mock.patch.object(OrganMatchingML, 'predict_pairs', always_match):
+            ml_matcher = OrganMatchingML()
+            matches = ml_matcher.find_matches(**scope)
+        return ml_matcher, matches
+
+    def test_hospital_scope_loads_only_servable_donations(self):
+        with self.assertNumQueries(3):
+            ml_matcher, matches = self.find_matches(hospital=self.general)
+
+        self.assertEqual([(m['donation_request'], m['requirement']) for m in matches],
+                         [(self.kidney_donation, self.kidney)])
+        self.assertEqual(ml_matcher.cascade_stats['pairs'], 1)
+
+    def test_requirement_and_organ_scopes(self):
+        _, matches = self.find_matches(requirement_ids=[self.liver.id])
+        self.assertEqual([m['requirement'] for m in matches], [self.liver])
+
+        _, matches = self.find_matches(organ_types=['Kidney', 'Heart'])
+        self.assertEqual([m['requirement'] for m in matches], [self.kidney])
+
+        with self.assertNumQueries(1):
+            _, matches = self.find_matches(hospital=self.general, organ_types=['Heart'])
+        self.assertEqual(matches, [])
+
+
+class CascadeTests(TestCase):
+
+    def test_low_rule_scores_never_reach_the_model(self):
+        create_requirement(create_hospital('general'))
+        close = create_donation('close')
+        far = create_donation('far')
+        DonorMedicalProfile.objects.filter(donor=far.donor).update(age=80, weight=30.0)
+        create_donation('other-organ', organ_type='Liver')
+
+        scored = []
+
+        def record(self, donors, requirements, donor_idx, req_idx, compatibility=None):
+            scored.append(len(donor_idx))
+            return always_match(self, donors, requirements, donor_idx, req_idx, compatibility)
+
+        ml_matcher = OrganMatchingML()
+        ml_matcher.min_compatibility_score = 80
+        with mock.patch.object(OrganMatchingML, 'predict_pairs', record):
+            matches = ml_matcher.find_matches()
+
+        self.assertEqual([m['donation_request'] for m in matches], [close])
+        self.assertEqual(scored, [1])
+        stats = ml_matcher.cascade_stats
+        self.assertEqual((stats['pairs'], stats['compatible'], stats['survivors'], stats['matches']), (3, 2, 1, 1))
+
+
+class MatchTableTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(OrganMatchingML, 'predict_pairs', always_match)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(OrganMatchingML, 'load_model', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.hospital = create_hospital('general')
+
+    def test_signals_keep_table_in_sync(self):
+        with refreshes_run():
+            requirement = create_requirement(self.hospital)
+            donation = create_donation('compatible')
+            create_donation('other-organ', organ_type='Liver')
+
+        self.assertEqual(
+            list(MatchCandidate.objects.values_list('donation_request', 'requirement')),
+            [(donation.id, requirement.id)]
+        )
+
+        with refreshes_run():
+            donation.donation_status = 'Approved'
+            donation.save(update_fields=['donation_status'])
+        self.assertFalse(MatchCandidate.objects.exists())
+
+        with refreshes_run():
+            donation.donation_status = 'Pending'
+            donation.save(update_fields=['donation_status'])
+            requirement.is_active = False
+            requirement.save()
+        self.assertFalse(MatchCandidate.objects.exists())
+
+    def test_saves_queue_refreshes_without_scoring(self):
+        with mock.patch.object(OrganMatchingML, 'score_candidates') as score:
+            requirement = create_requirement(self.hospital)
+            donation = create_donation('compatible')
+            donation.save()
+            score.assert_not_called()
+        self.assertEqual(
+            sorted(MatchRefresh.objects.values_list('kind', 'object_id')),
+            [('donation', donation.id), ('donor', donation.donor_id), ('requirement', requirement.id)]
+        )
+
+        call_command('run_training_worker', '--once', stdout=StringIO())
+        self.assertFalse(MatchRefresh.objects.exists())
+        self.assertEqual(list(MatchCandidate.objects.values_list('donation_request', flat=True)), [donation.id])
+
+    def test_refresh_and_rebuild_store_the_same_scores(self):
+        def by_ensemble(self, donors, requirements, donor_idx, req_idx, compatibility=None):
+            self.scorer = SCORER_MODEL
+            return np.full(len(donor_idx), 0.9 if self.ensemble == serving.OFFLINE_ENSEMBLE else 0.8)
+
+        with mock.patch.object(OrganMatchingML, 'predict_pairs', by_ensemble):
+            with refreshes_run():
+                create_requirement(self.hospital)
+                create_donation('compatible')
+            refreshed = list(MatchCandidate.objects.values_list('donation_request', 'requirement', 'ml_probability'))
+            match_table.rebuild()
+        self.assertEqual(refreshed[0][2], 0.9)
+        self.assertEqual(
+            list(MatchCandidate.objects.values_list('donation_request', 'requirement', 'ml_probability')), refreshed
+        )
+
+    def test_stored_matches_is_a_single_query(self):
+        with refreshes_run():
+            create_requirement(self.hospital, urgency_level='Low')
+            create_requirement(self.hospital, urgency_level='Critical')
+            create_requirement(create_hospital('elsewhere'))
+            for i in range(3):
+                create_donation(f'donor-{i}')
+
+        with self.assertNumQueries(1):
+            matches = list(match_table.stored_matches(hospital=self.hospital))
+            [(m.donor.first_name, m.urgency) for m in matches]
+
+        self.assertEqual(len(matches), 6)
+        self.assertEqual(matches[0].urgency, 'Critical')
+
+    def test_stored_matches_keeps_top_k_per_requirement(self):
+        with refreshes_run():
+            low = create_requirement(self.hospital, urgency_level='Low')
+            critical = create_requirement(self.hospital, urgency_level='Critical')
+            for i in range(3):
+                create_donation(f'donor-{i}')
+
+        with self.assertNumQueries(1):
+            matches = list(match_table.stored_matches(hospital=self.hospital, k=2))
+        self.assertEqual([m.requirement for m in matches], [critical, critical, low, low])
+
+        self.client.force_login(self.hospital)
+        response = self.client.get(reverse('ml_matches'))
+        self.assertEqual(len(response.context['matches']), 6)
+        self.assertNotContains(response, 'Show all matches')
+        response = self.client.get(reverse('ml_matches'), {'k': 2})
+        self.assertEqual(len(response.context['matches']), 4)
+        self.assertContains(response, 'Showing the best 2 matches for each requirement')
+
+
+class RankingTests(SimpleTestCase):
+
+    def test_top_k_matches_full_sort(self):
+        rng = np.random.default_rng(0)
+        matches = [
+            (i, int(rng.integers(3)), int(rng.integers(2)),
+             str(rng.choice(['Low', 'High', 'Critical'])), int(rng.integers(50, 60)), float(rng.integers(3)) / 2)
+            for i in range(500)
+        ]
+        ranker = MatchRanker(k=5, min_score=52)
+        for match in matches:
+            ranker.add(*match)
+
+        def expected(rows):
+            rows = sorted((m for m in rows if m[4] >= 52), key=lambda m: match_key(*m[3:]), reverse=True)
+            return [m[0] for m in rows[:5]]
+
+        for requirement in range(3):
+            self.assertEqual(
+                ranker.for_requirement(requirement),
+                expected(m for m in matches if m[1] == requirement)
+            )
+        self.assertEqual(ranker.for_hospital(1), expected(m for m in matches if m[2] == 1))
+        self.assertEqual(len(ranker.ranked()), 15)
+
+        unbounded = TopK(k=None)
+        for match in matches:
+            unbounded.push(match_key(*match[3:]), match[0])
+        self.assertEqual(len(unbounded), 500)
+
+    def test_ranking_params(self):
+        self.assertEqual(ranking_params({}), (None, 0))
+        self.assertEqual(ranking_params({}, default_k=10), (10, 0))
+        self.assertEqual(ranking_params({'k': '3', 'min_score': '70'}), (3, 70))
+        for query in ({'k': '0'}, {'k': 'many'}, {'min_score': 'high'}):
+            with self.assertRaises(ValueError):
+                ranking_params(query)
+
+
+class TrainingJobTests(TestCase):
+
+    def test_enqueue_reuses_active_job(self):
+        first = training_jobs.enqueue_training()
+        self.assertEqual(training_jobs.enqueue_training(), first)
+
+    def test_worker_runs_job_and_records_progress(self):
+        stages = []
+
+        def fake_train(self, progress=None, n_jobs=None):
+            progress(50, 'Fitting ensemble')
+            stages.append(TrainingJob.objects.get().stage)
+            return 0.91
+
+        job = training_jobs.enqueue_training()
+        with mock.patch.object(OrganMatchingML, 'train_model', fake_train), \
+                mock.patch.object(match_table, 'rebuild') as rebuild:
+            call_command('run_training_worker', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(stages, ['Fitting ensemble'])
+        self.assertEqual(job.status, 'Succeeded')
+        self.assertEqual(job.accuracy, 0.91)
+        rebuild.assert_called_once_with()
+        self.assertIsNone(training_jobs.claim_next_job())
+
+    def test_failed_training_is_recorded(self):
+        job = training_jobs.enqueue_training()
+        with mock.patch.object(OrganMatchingML, 'train_model', side_effect=ValueError('bad data')):
+            training_jobs.run_job(training_jobs.claim_next_job())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Failed')
+        self.assertIn('bad data', job.error)
+
+
+class ColdStartTests(TestCase):
+
+    donor = {
+        'blood_type': 'O+', 'organ_type': 'Heart', 'age': 35, 'weight': 70.0,
+        'smoking_status': False, 'alcohol_consumption': False
+    }
+    requirement = {
+        'blood_type': 'O+', 'organ_type': 'Heart', 'urgency_level': 'Critical',
+        'patient_age': 40, 'patient_weight': 75.0
+    }
+
+    def setUp(self):
+        patcher = mock.patch.object(OrganMatchingML, 'load_model', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(OrganMatchingML, 'train_model', side_effect=AssertionError('trained inline'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rule_based_scores_and_single_build(self):
+        self.assertEqual(availability.model_state(), availability.MODEL_MISSING)
+
+        for i in range(3):
+            ml_matcher = OrganMatchingML()
+            prediction, probability = ml_matcher.predict_match(self.donor, self.requirement)
+
+        self.assertEqual(ml_matcher.scorer, SCORER_RULES)
+        self.assertEqual(probability, ml_matcher.calculate_compatibility_score(self.donor, self.requirement) / 100.0)
+        self.assertEqual(prediction, 1)
+        self.assertEqual(TrainingJob.objects.count(), 1)
+        self.assertEqual(availability.model_state(), availability.MODEL_BUILDING)
+
+    def test_failed_build_is_retried_after_delay(self):
+        TrainingJob.objects.create(status='Failed', finished_at=timezone.now())
+        self.assertEqual(availability.request_build(), availability.MODEL_FAILED)
+
+        TrainingJob.objects.update(finished_at=timezone.now() - timedelta(seconds=availability.BUILD_RETRY_SECONDS + 1))
+        self.assertEqual(availability.request_build(), availability.MODEL_BUILDING)
+        self.assertEqual(TrainingJob.objects.filter(status='Queued').count(), 1)
+
+    def test_match_table_reports_scorer(self):
+        hospital = create_hospital('general')
+        with refreshes_run():
+            create_requirement(hospital, blood_type='O+')
+            create_donation('compatible', blood_type='O+')
+
+        self.assertEqual(list(MatchCandidate.objects.values_list('scorer', flat=True)), [SCORER_RULES])
+        # Reporting the status never loads the model
+        with mock.patch.object(OrganMatchingML, 'load_model', side_effect=AssertionError('loaded for a status')):
+            response = self.client.get(reverse('api_matches'))
+            self.assertEqual(response.json()['model_status'], availability.MODEL_BUILDING)
+            with mock.patch.object(model_registry, 'loaded', return_value=True):
+                self.assertEqual(availability.model_state(), availability.MODEL_READY)
+        self.assertEqual([m['scorer'] for m in response.json()['matches']], [SCORER_RULES])
+
+
+class WarmupTests(TestCase):
+
+    def test_readiness_probe(self):
+        with mock.patch.object(OrganMatchingML, 'load_model') as load_model:
+            response = self.client.get(reverse('model_ready'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['ready'])
+        load_model.assert_not_called()
+
+        with mock.patch.object(OrganMatchingML, 'load_model', return_value=True), \
+                mock.patch.object(OrganMatchingML, 'predict_pairs', always_match), \
+                mock.patch.object(warmup, '_warmup_batch', return_value=([{}], [{}])), \
+                mock.patch.dict(warmup._status):
+            warmup.preload_model()
+            response = self.client.get(reverse('model_ready'))
+            self.assertEqual(response.status_code, 200)
+
+        # A model a request loaded after startup counts too
+        with mock.patch.object(model_registry, 'loaded', return_value=True):
+            self.assertEqual(self.client.get(reverse('model_ready')).status_code, 200)
+
+    def test_preload_failure_is_logged_as_an_event(self):
+        with mock.patch.object(OrganMatchingML, 'load_model', side_effect=OSError('unreadable')), \
+                mock.patch.dict(warmup._status), \
+                self.assertLogs('organ_donation.events', level='ERROR') as logs:
+            self.assertEqual(warmup.preload_model()['error'], 'unreadable')
+        [record] = logs.records
+        self.assertEqual((record.getMessage(), record.fields), ('model_preload_failed', {'before_fork': False}))
+        self.assertIsNotNone(record.exc_info)
+
+
+class StartupImportTests(SimpleTestCase):
+
+    def test_boot_does_not_import_heavy_dependencies(self):
+        # Raises CommandError if wsgi or manage.py check imports sklearn, pandas or a PDF library
+        call_command('startup_benchmark', stdout=StringIO())
+
+
+class TrainingDataTests(SimpleTestCase):
+
+    def test_survey_rows_are_reproducible(self):
+        survey = pd.DataFrame({
+            'Name': ['A', 'B', 'C', 'D'],
+            'Age': ['18-25 years', '26-40 years', '41-55 years', 'Above 55 years'],
+            'Gender': ['Male', 'Female', 'Male', None],
+            'Are you willing to donate organs?': ['Yes', 'No', 'yes', None],
+        })
+        data = survey_training_data(survey)
+
+        self.assertEqual(list(data.columns), TRAINING_COLUMNS)
+        self.assertEqual(data['donor_age'].tolist(), [22, 33, 48, 60])
+        self.assertEqual(data['match'].tolist(), [1, 0, 1, 0])
+        pd.testing.assert_frame_equal(data, survey_training_data(survey))
+
+    def test_unreadable_csv_falls_back_to_synthetic_rows(self):
+        csv_path = os.path.join(tempfile.gettempdir(), 'no-such-survey.csv')
+        with self.assertLogs('organ_donation.events', level='ERROR') as logs:
+            data = load_training_data(n_samples=50, csv_path=csv_path)
+        pd.testing.assert_frame_equal(data, synthetic_training_data(n_samples=50))
+        [record] = logs.records
+        self.assertEqual((record.getMessage(), record.fields), ('training_csv_unreadable', {'csv_path': csv_path}))
+        self.assertIsNotNone(record.exc_info)
+
+    def test_scores_match_scalar_scorer(self):
+        data = synthetic_training_data(n_samples=500)
+        ml_matcher = OrganMatchingML()
+        for row in data.itertuples():
+            donor = {
+                'blood_type': row.donor_blood, 'organ_type': row.organ_type, 'age': row.donor_age,
+                'weight': row.donor_weight, 'smoking_status': row.smoking, 'alcohol_consumption': row.alcohol
+            }
+            requirement = {
+                'blood_type': row.recipient_blood, 'organ_type': row.organ_type,
+                'patient_age': row.recipient_age, 'patient_weight': row.recipient_weight
+            }
+            self.assertEqual(ml_matcher.calculate_compatibility_score(donor, requirement), row.compatibility_score)
+
+
+class TrainingPipelineTests(SimpleTestCase):
+
+    def config(self, n_estimators):
+        return training_config(
+            data={'source': 'synthetic', 'n_samples': 200},
+            model={'rf': {'n_estimators': n_estimators, 'random_state': 42}},
+            cv_folds=2,
+        )
+
+    def test_model_change_reuses_preprocessing(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+
+        first = TrainingPipeline(self.config(5), n_jobs=1, cache_dir=cache_dir).run()
+        self.assertEqual(first.cached_stages, [])
+
+        again = TrainingPipeline(self.config(5), n_jobs=1, cache_dir=cache_dir).run()
+        self.assertEqual(again.cached_stages, ['data', 'features', 'encode', 'select', 'fit', 'evaluate'])
+        self.assertEqual(again.accuracy, first.accuracy)
+
+        retuned = TrainingPipeline(self.config(10), n_jobs=1, cache_dir=cache_dir).run()
+        self.assertEqual(retuned.cached_stages, ['data', 'features', 'encode', 'select'])
+        self.assertEqual(len(retuned.model.named_estimators_['rf'].estimators_), 10)
+
+
+    def test_serving_ensemble_is_chosen_on_held_out_training_rows(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        with mock.patch('ml_matching.pipeline.choose_serving', return_value=None) as choose:
+            TrainingPipeline(self.config(5), n_jobs=1, cache_dir=cache_dir).run()
+        # 200 rows: 40 for the test split, then 16 of the remaining 160 held out of fitting
+        X_validation, y_validation = choose.call_args.args[4:6]
+        self.assertEqual((len(X_validation), len(y_validation)), (16, 16))
+
+class InferenceBundleTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cache_dir = tempfile.mkdtemp()
+        config = training_config(
+            data={'source': 'synthetic', 'n_samples': 300},
+            model={
+                'rf': {'n_estimators': 5, 'random_state': 42},
+                'gb': {'n_estimators': 5, 'random_state': 42},
+                'svm': {'probability': True, 'random_state': 42},
+                'mlp': {'hidden_layer_sizes': (8,), 'max_iter': 50, 'random_state': 42},
+            },
+            cv_folds=2,
+        )
+        cls.result = TrainingPipeline(config, n_jobs=1, cache_dir=cls.cache_dir).run()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def matcher(self, model_dir, ensemble=serving.SERVING_ENSEMBLE):
+        ml_matcher = OrganMatchingML(ensemble)
+        ml_matcher.model_path = f'{model_dir}/trained_model.joblib'
+        ml_matcher.scaler_path = f'{model_dir}/scaler.joblib'
+        ml_matcher.encoders_path = f'{model_dir}/encoders.joblib'
+        ml_matcher.selector_path = f'{model_dir}/feature_selector.joblib'
+        self.addCleanup(model_registry.invalidate, ml_matcher.model_path)
+        return ml_matcher
+
+    def test_bundle_matches_sklearn_ensemble(self):
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir, ignore_errors=True)
+        self.result.save(model_dir)
+        # Compared against every member; the serving subset depends on this machine's timings
+        ml_matcher = self.matcher(model_dir, serving.OFFLINE_ENSEMBLE)
+
+        self.assertTrue(ml_matcher.load_model())
+        artifacts = model_registry.get(ml_matcher.model_path, ml_matcher.scaler_path,
+                                       ml_matcher.encoders_path, ml_matcher.selector_path)
+        self.assertEqual(artifacts.source, 'bundle')
+
+        donors, requirements = warmup._warmup_batch(self.result.label_encoders)
+        X, _ = ml_matcher.build_feature_matrix(donors, requirements)
+        expected = self.result.model.predict_proba(
+            self.result.feature_selector.transform(self.result.scaler.transform(X))
+        )[:, 1]
+        np.testing.assert_allclose(ml_matcher.predict_matches_batch(donors, requirements).ravel(),
+                                   expected, atol=1e-5)
+
+    def held_out(self, n_samples=500):
+        """Scaled, selected feature rows and labels the model was not trained on"""
+        ml_matcher = OrganMatchingML()
+        ml_matcher.label_encoders = self.result.label_encoders
+        frame = synthetic_training_data(n_samples=n_samples, seed=7)
+        pairs = np.arange(n_samples)
+        X, valid = ml_matcher.build_feature_matrix(*scoring_pairs(frame), pairs, pairs)
+        X = self.result.feature_selector.transform(self.result.scaler.transform(X[valid]))
+        return X, frame['match'].to_numpy()[valid]
+
+    def test_compiled_trees_match_predict_proba(self):
+        X, _ = self.held_out()
+        for name in ('rf', 'gb'):
+            estimator = self.result.model.named_estimators_[name]
+            np.testing.assert_allclose(compile_tree_ensemble(estimator).predict_proba(X),
+                                       estimator.predict_proba(X), rtol=0, atol=1e-6)
+
+    def test_serving_ensemble_fits_latency_budget(self):
+        X, y = self.held_out()
+        # Milliseconds per row for rf, gb, svm, mlp
+        latencies = np.repeat([[0.1], [0.2], [3.0], [0.3]], 10, axis=1) / 1000
+        with mock.patch.object(serving, '_row_latencies', return_value=latencies):
+            chosen = choose_serving(self.result.model, self.result.scaler, self.result.label_encoders,
+                                    self.result.feature_selector, X, y, {'p99_budget_ms': 1.0, 'profile_rows': 10})
+        self.assertNotIn('svm', chosen['members'])
+        self.assertLessEqual(chosen['p99_ms'], 1.0)
+        self.assertAlmostEqual(chosen['offline_p99_ms'], 3.6)
+
+        # No member fits: the fastest is served alone
+        with mock.patch.object(serving, '_row_latencies', return_value=latencies), \
+                self.assertLogs('organ_donation.events', level='WARNING') as logs:
+            fastest = choose_serving(self.result.model, self.result.scaler, self.result.label_encoders,
+                                     self.result.feature_selector, X, y, {'p99_budget_ms': 0.05, 'profile_rows': 10})
+        self.assertEqual(fastest['members'], ['rf'])
+        [record] = logs.records
+        self.assertEqual((record.getMessage(), record.fields),
+                         ('serving_budget_exceeded', {'budget_ms': 0.05, 'member': 'rf'}))
+
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir, ignore_errors=True)
+        online, offline = self.matcher(model_dir), self.matcher(model_dir, serving.OFFLINE_ENSEMBLE)
+        save_artifacts([(self.result.model, online.model_path), (self.result.scaler, online.scaler_path),
+                        (self.result.label_encoders, online.encoders_path),
+                        (self.result.feature_selector, online.selector_path)], serving=chosen)
+        self.assertTrue(online.load_model() and offline.load_model())
+        self.assertEqual(online.model.member_names, chosen['members'])
+        self.assertEqual(offline.model.member_names, ['rf', 'gb', 'svm', 'mlp'])
+
+    def test_stale_bundle_is_ignored(self):
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir, ignore_errors=True)
+        self.result.save(model_dir)
+        ml_matcher = self.matcher(model_dir)
+        components = [(self.result.model.named_estimators_['rf'], ml_matcher.model_path),
+                      (self.result.scaler, ml_matcher.scaler_path),
+                      (self.result.label_encoders, ml_matcher.encoders_path),
+                      (self.result.feature_selector, ml_matcher.selector_path)]
+        save_artifacts(components, with_bundle=False)
+
+        self.assertTrue(ml_matcher.load_model())
+        self.assertEqual(type(ml_matcher.model).__name__, 'RandomForestClassifier')
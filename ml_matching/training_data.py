@@ -0,0 +1,153 @@
+"""Columnar construction of the matching model's training set.
+
+The survey CSV has no blood, organ or recipient columns, so those are drawn at
+random. Every draw comes from one numpy Generator with a fixed seed, which keeps
+the data set identical between runs and processes, and the whole table is built
+with array operations so it scales to millions of rows.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from organ_donation.instrumentation import exception
+
+try:
+    from .scoring import BLOOD_TYPES, compatibility_scores
+except ImportError:
+    # Imported as a top-level module by the standalone runner
+    from scoring import BLOOD_TYPES, compatibility_scores
+
+TRAINING_SEED = 42
+
+ORGAN_TYPES = ['Heart', 'Liver', 'Kidney', 'Lung', 'Pancreas']
+URGENCY_LEVELS = ['Critical', 'Urgent', 'High', 'Medium', 'Low']
+
+TRAINING_COLUMNS = [
+    'donor_blood', 'recipient_blood', 'organ_type', 'urgency',
+    'donor_age', 'recipient_age', 'donor_weight', 'recipient_weight',
+    'smoking', 'alcohol', 'compatibility_score', 'match'
+]
+
+# Survey age band -> representative age; anything else is "Above 55 years"
+AGE_BANDS = [('18-25', 22), ('26-40', 33), ('41-55', 48)]
+DEFAULT_AGE = 60
+
+
+def ages_from_bands(bands):
+    """Representative age for each survey age band string"""
+    bands = pd.Series(bands, dtype=object).fillna('18-25 years').astype(str)
+    return np.select(
+        [bands.str.contains(band, regex=False).to_numpy() for band, _ in AGE_BANDS],
+        [age for _, age in AGE_BANDS],
+        default=DEFAULT_AGE
+    ).astype(np.int64)
+
+
+def _draw_categories(rng, n):
+    """Random donor blood, recipient blood, organ and urgency columns"""
+    return (
+        np.array(BLOOD_TYPES, dtype=object)[rng.integers(0, len(BLOOD_TYPES), n)],
+        np.array(BLOOD_TYPES, dtype=object)[rng.integers(0, len(BLOOD_TYPES), n)],
+        np.array(ORGAN_TYPES, dtype=object)[rng.integers(0, len(ORGAN_TYPES), n)],
+        np.array(URGENCY_LEVELS, dtype=object)[rng.integers(0, len(URGENCY_LEVELS), n)],
+    )
+
+
+def _frame(donor_blood, recipient_blood, organ_type, urgency, donor_age, recipient_age,
+           donor_weight, recipient_weight, smoking, alcohol, match):
+    codes = {blood: code for code, blood in enumerate(BLOOD_TYPES)}
+    compatibility = compatibility_scores(
+        pd.Series(donor_blood).map(codes).to_numpy(), pd.Series(recipient_blood).map(codes).to_numpy(),
+        0, 0,  # donor and recipient always share the organ
+        donor_age, recipient_age, donor_weight, recipient_weight, smoking, alcohol
+    )
+    return pd.DataFrame({
+        'donor_blood': donor_blood,
+        'recipient_blood': recipient_blood,
+        'organ_type': organ_type,
+        'urgency': urgency,
+        'donor_age': donor_age,
+        'recipient_age': recipient_age,
+        'donor_weight': donor_weight,
+        'recipient_weight': recipient_weight,
+        'smoking': smoking,
+        'alcohol': alcohol,
+        'compatibility_score': compatibility,
+        'match': match,
+    }, columns=TRAINING_COLUMNS)
+
+
+def survey_training_data(survey, seed=TRAINING_SEED):
+    """Training rows from the organ donation survey; the target is willingness to donate"""
+    rng = np.random.default_rng(seed)
+    n = len(survey)
+    donor_blood, recipient_blood, organ_type, urgency = _draw_categories(rng, n)
+
+    donor_age = ages_from_bands(survey.get('Age', pd.Series(index=survey.index, dtype=object)))
+    gender = survey.get('Gender', pd.Series(index=survey.index, dtype=object)).fillna('Male').astype(str)
+    male = (gender.str.lower() == 'male').to_numpy()
+    noise = rng.standard_normal(n)
+    donor_weight = np.where(male, 75 + 12 * noise, 65 + 10 * noise)
+
+    recipient_age = donor_age + rng.integers(-10, 10, n)
+    recipient_weight = donor_weight + rng.normal(0, 8, n)
+
+    # Survey respondents are treated as non-smokers and non-drinkers
+    smoking = np.zeros(n, dtype=np.int64)
+    alcohol = np.zeros(n, dtype=np.int64)
+
+    willing = survey.get('Are you willing to donate organs?', pd.Series(index=survey.index, dtype=object))
+    match = (willing.fillna('No').astype(str).str.lower() == 'yes').to_numpy().astype(np.int64)
+
+    return _frame(donor_blood, recipient_blood, organ_type, urgency, donor_age, recipient_age,
+                  donor_weight, recipient_weight, smoking, alcohol, match)
+
+
+def synthetic_training_data(n_samples=1000, seed=TRAINING_SEED):
+    """Fully synthetic rows; higher compatibility scores are more likely to match"""
+    rng = np.random.default_rng(seed)
+    donor_blood, recipient_blood, organ_type, urgency = _draw_categories(rng, n_samples)
+
+    donor_age = rng.integers(18, 65, n_samples)
+    recipient_age = rng.integers(18, 75, n_samples)
+    donor_weight = rng.normal(70, 15, n_samples)
+    recipient_weight = rng.normal(70, 15, n_samples)
+
+    smoking = (rng.random(n_samples) < 0.3).astype(np.int64)
+    alcohol = (rng.random(n_samples) < 0.4).astype(np.int64)
+
+    frame = _frame(donor_blood, recipient_blood, organ_type, urgency, donor_age, recipient_age,
+                   donor_weight, recipient_weight, smoking, alcohol, np.zeros(n_samples, dtype=np.int64))
+    frame['match'] = (rng.random(n_samples) < frame['compatibility_score'].to_numpy() / 100.0).astype(np.int64)
+    return frame
+
+
+def scoring_pairs(frame):
+    """Donor and requirement dicts, one pair per training row, as OrganMatchingML scores them"""
+    donors = [
+        {'blood_type': row.donor_blood, 'organ_type': row.organ_type, 'age': row.donor_age,
+         'weight': row.donor_weight, 'smoking_status': bool(row.smoking),
+         'alcohol_consumption': bool(row.alcohol)}
+        for row in frame.itertuples()
+    ]
+    requirements = [
+        {'blood_type': row.recipient_blood, 'organ_type': row.organ_type, 'urgency_level': row.urgency,
+         'patient_age': row.recipient_age, 'patient_weight': row.recipient_weight}
+        for row in frame.itertuples()
+    ]
+    return donors, requirements
+
+
+SURVEY_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Organ Donation.csv')
+
+
+def load_training_data(source='survey', n_samples=1000, seed=TRAINING_SEED, csv_path=SURVEY_CSV):
+    """Training rows from the survey CSV, or synthetic rows if asked for or the CSV can't be read"""
+    if source == 'survey':
+        try:
+            return survey_training_data(pd.read_csv(csv_path), seed=seed)
+        except Exception:
+            exception('training_csv_unreadable', csv_path=csv_path)
+            # Fallback to synthetic data if CSV loading fails
+    return synthetic_training_data(n_samples=n_samples, seed=seed)
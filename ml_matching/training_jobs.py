@@ -0,0 +1,62 @@
+"""Queue and runner for background model training.
+
+Web requests only enqueue a TrainingJob; the run_training_worker management
+command claims queued jobs, trains, publishes the new artifacts atomically and
+refreshes the match table.
+"""
+import traceback
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import match_table
+from .matching_algorithm import OrganMatchingML
+from .models import TrainingJob
+
+ACTIVE_STATUSES = ['Queued', 'Running']
+
+
+def enqueue_training(requested_by=None):
+    """Queue a training job, reusing one that is already queued or running"""
+    job = TrainingJob.objects.filter(status__in=ACTIVE_STATUSES).order_by('created_at').first()
+    if job is not None:
+        return job
+    try:
+        with transaction.atomic():
+            return TrainingJob.objects.create(requested_by=requested_by)
+    except IntegrityError:
+        # Another request queued one first (single_queued_training_job)
+        return TrainingJob.objects.get(status='Queued')
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to Running; None if the queue is empty"""
+    for job in TrainingJob.objects.filter(status='Queued').order_by('created_at')[:5]:
+        claimed = TrainingJob.objects.filter(id=job.id, status='Queued').update(
+            status='Running', started_at=timezone.now(), stage='Starting'
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_job(job, n_jobs=None):
+    """Train the model for a claimed job and record the outcome on it"""
+    def progress(percent, stage):
+        TrainingJob.objects.filter(id=job.id).update(progress=percent, stage=stage)
+
+    try:
+        accuracy = OrganMatchingML().train_model(progress=progress, n_jobs=n_jobs)
+        progress(100, 'Refreshing match table')
+        match_table.rebuild()
+    except Exception:
+        TrainingJob.objects.filter(id=job.id).update(
+            status='Failed', error=traceback.format_exc(), finished_at=timezone.now()
+        )
+    else:
+        TrainingJob.objects.filter(id=job.id).update(
+            status='Succeeded', accuracy=accuracy, stage='Done', finished_at=timezone.now()
+        )
+    job.refresh_from_db()
+    return job
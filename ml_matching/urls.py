@@ -7,4 +7,7 @@ urlpatterns = [
     path('ml-matches/', views.ml_matches, name='ml_matches'),
     path('train-model/', views.train_model_view, name='train_model'),
     path('api/matches/', views.api_find_matches, name='api_matches'),
+    path('api/training-jobs/', views.training_jobs_list, name='training_jobs'),
+    path('api/model-ready/', views.model_ready, name='model_ready'),
+    path('api/training-jobs/<int:job_id>/', views.training_job_status, name='training_job_status'),
 ]
\ No newline at end of file
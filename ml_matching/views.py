@@ -1,10 +1,12 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib import messages
-from .models import HospitalOrganRequirement, DonorMedicalProfile
-from .matching_algorithm import OrganMatchingML
+from .models import HospitalOrganRequirement, DonorMedicalProfile, TrainingJob
+from . import availability, match_table, training_jobs, warmup
+from .ranking import ranking_params
 from donors.models import DonationRequests
+from organ_donation.instrumentation import annotate, event
 import json
 
 @login_required
@@ -78,13 +80,24 @@ def ml_matches(request):
     if not request.user.is_staff:
         return redirect('donor-home')
     
-    ml_matcher = OrganMatchingML()
-    matches = ml_matcher.find_matches()
+    try:
+        k, min_score = ranking_params(request.GET)
+        requirement_ids = [int(i) for i in request.GET.getlist('requirement_id')] or None
+    except ValueError as e:
+        messages.error(request, f'Invalid match filter: {e}')
+        (k, min_score), requirement_ids = ranking_params({}), None
     
-    # Filter matches for current hospital
-    hospital_matches = [match for match in matches if match['hospital'] == request.user]
+    # Matches are precomputed per (donation, requirement) pair; read this hospital's (best k per requirement)
+    hospital_matches = match_table.stored_matches(
+        hospital=request.user, k=k, min_score=min_score, requirement_ids=requirement_ids,
+        organ_types=request.GET.getlist('organ_type') or None
+    )
     
-    return render(request, 'ml_matching/ml_matches.html', {'matches': hospital_matches})
+    return render(request, 'ml_matching/ml_matches.html', {
+        'matches': hospital_matches,
+        'k': k,
+        'model_status': availability.model_state(),
+    })
 
 @login_required
 def train_model_view(request):
@@ -93,31 +106,63 @@ def train_model_view(request):
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
     if request.method == 'POST':
-        ml_matcher = OrganMatchingML()
-        accuracy = ml_matcher.train_model()
-        return JsonResponse({'success': True, 'accuracy': accuracy})
+        # Training runs in the run_training_worker process; poll the job for progress
+        job = training_jobs.enqueue_training(requested_by=request.user)
+        event('training_requested', job_id=job.id, status=job.status)
+        return JsonResponse({'success': True, 'job': job.as_dict()}, status=202)
     
     return render(request, 'ml_matching/train_model.html')
 
+@login_required
+def training_jobs_list(request):
+    """API endpoint listing the most recent training jobs"""
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    jobs = TrainingJob.objects.order_by('-created_at')[:20]
+    return JsonResponse({'jobs': [job.as_dict() for job in jobs]})
+
+@login_required
+def training_job_status(request, job_id):
+    """API endpoint reporting a training job's status and progress"""
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    job = get_object_or_404(TrainingJob, id=job_id)
+    return JsonResponse({'job': job.as_dict()})
+
+def model_ready(request):
+    """Readiness probe: 200 once this worker has a warmed model, else 503.
+
+    Only reports; a probe never loads the model (see ml_matching.warmup).
+    """
+    status = warmup.status()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
 def api_find_matches(request):
     """API endpoint to find matches"""
     if request.method == 'GET':
-        ml_matcher = OrganMatchingML()
-        matches = ml_matcher.find_matches()
+        try:
+            k, min_score = ranking_params(request.GET)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        matches = match_table.stored_matches(k=k, min_score=min_score)
         
         # Convert to JSON serializable format
         matches_data = []
         for match in matches:
             matches_data.append({
-                'donor_name': f"{match['donor'].first_name} {match['donor'].last_name}",
-                'donor_blood_type': match['donation_request'].blood_type,
-                'organ_type': match['donation_request'].organ_type,
-                'hospital_name': match['hospital'].hospital_name,
-                'urgency': match['urgency'],
-                'compatibility_score': match['compatibility_score'],
-                'ml_probability': float(match['ml_probability'])
+                'donor_name': f"{match.donor.first_name} {match.donor.last_name}",
+                'donor_blood_type': match.donation_request.blood_type,
+                'organ_type': match.donation_request.organ_type,
+                'hospital_name': match.hospital.hospital_name,
+                'urgency': match.urgency,
+                'compatibility_score': match.compatibility_score,
+                'ml_probability': float(match.ml_probability),
+                'scorer': match.scorer
             })
         
-        return JsonResponse({'matches': matches_data})
+        annotate(k=k, min_score=min_score, results=len(matches_data))
+        return JsonResponse({'matches': matches_data, 'model_status': availability.model_state()})
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
\ No newline at end of file
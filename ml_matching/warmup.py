@@ -0,0 +1,96 @@
+"""Load and warm the matching model once per server, before workers fork.
+
+With ML_PRELOAD_MODEL enabled (the default under organ_donation.wsgi),
+MlMatchingConfig.ready() calls preload_model(). Under gunicorn's preload_app
+that runs in the master: the artifacts land in the process-wide model registry,
+one batch goes through the scaler, selector and ensemble so lazy sklearn/numpy
+setup happens once, and gc.freeze() moves everything into the permanent
+generation so the collector never writes to those pages. Forked workers then
+share the model copy-on-write instead of each loading a private copy.
+
+A model trained after startup is not preloaded: each worker maps it on its
+first matching request, through the model registry's file check, and counts
+as ready from then on.
+"""
+import gc
+import os
+import time
+
+from django.db import connections
+
+from organ_donation.instrumentation import event, exception
+
+from .matching_algorithm import SCORER_MODEL, OrganMatchingML
+from .registry import model_registry
+
+_status = {
+    'ready': False,
+    'loaded_in_pid': None,
+    'load_seconds': None,
+    'warmup_seconds': None,
+    'error': None,
+}
+
+
+def _warmup_batch(label_encoders):
+    """Donor and requirement dicts covering every blood type the model was trained on"""
+    organ = label_encoders['organ_type'].classes_[0]
+    urgency = label_encoders['urgency'].classes_[0]
+    donors = [
+        {'blood_type': blood, 'organ_type': organ, 'age': 40, 'weight': 70.0,
+         'smoking_status': False, 'alcohol_consumption': False}
+        for blood in label_encoders['donor_blood'].classes_
+    ]
+    requirements = [
+        {'blood_type': blood, 'organ_type': organ, 'urgency_level': urgency,
+         'patient_age': 40, 'patient_weight': 70.0}
+        for blood in label_encoders['recipient_blood'].classes_
+    ]
+    return donors, requirements
+
+
+def preload_model(before_fork=False):
+    """Load the trained artifacts and run one warm-up batch; returns the readiness status.
+
+    before_fork=True (from MlMatchingConfig.ready) also closes database
+    connections and freezes the heap for sharing with forked workers.
+    """
+    ml_matcher = OrganMatchingML()
+    try:
+        start = time.perf_counter()
+        if not ml_matcher.load_model():
+            # Nothing to preload; requests use the rule-based scorer until a model is built
+            if before_fork:
+                event('model_preload_skipped', reason='no trained model')
+            return status()
+        _status['load_seconds'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ml_matcher.predict_matches_batch(*_warmup_batch(ml_matcher.label_encoders))
+        _status['warmup_seconds'] = time.perf_counter() - start
+    except Exception as e:
+        _status['error'] = str(e)
+        exception('model_preload_failed', before_fork=before_fork)
+        return status()
+    finally:
+        if before_fork:
+            # Never hand a connection opened in the master to forked workers
+            connections.close_all()
+
+    _status['ready'] = ml_matcher.scorer == SCORER_MODEL
+    _status['error'] = None
+    _status['loaded_in_pid'] = os.getpid()
+    if before_fork:
+        gc.freeze()
+    event('model_preloaded', before_fork=before_fork, load_seconds=round(_status['load_seconds'], 3),
+          warmup_seconds=round(_status['warmup_seconds'], 3))
+    return status()
+
+
+def is_ready():
+    """True once this process (or the master it was forked from) has a warmed or loaded model"""
+    return _status['ready'] or model_registry.loaded(OrganMatchingML().model_path)
+
+
+def status():
+    return dict(_status, ready=is_ready(), pid=os.getpid())
@@ -0,0 +1,139 @@
+"""Structured events and per-request timing for the hospitals, donors and ml_matching apps.
+
+event() writes one record to the 'organ_donation.events' logger. The record's
+message is the event name, and its fields travel in record.fields. Nothing is
+built unless the event will be written: the level has to be enabled, and the
+event has to pass sampling (sample, else the EVENT_SAMPLE_RATE setting).
+Field values may be zero-argument callables, which are only called for
+events that are written. So a hot path can write
+
+    event('appointments_listed', level=logging.DEBUG, total=appointments.count)
+
+without counting or serializing anything when debug events are off.
+
+RequestTimingMiddleware writes one 'request' event per request, with the
+view, status, duration and the number and time of database queries.
+annotate() adds fields from inside a view, and events written during a
+request carry its request_id. JsonFormatter renders records as one JSON
+object per line.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import random
+import time
+
+logger = logging.getLogger('organ_donation.events')
+
+_request = contextvars.ContextVar('instrumentation_request', default=None)
+_request_ids = itertools.count(1)
+
+
+def _sample_rate():
+    try:
+        from django.conf import settings
+        return getattr(settings, 'EVENT_SAMPLE_RATE', 1.0)
+    except Exception:
+        return 1.0
+
+
+def enabled(level=logging.INFO, sample=None):
+    """Whether an event at this level would be written, deciding the sampling draw"""
+    if not logger.isEnabledFor(level):
+        return False
+    rate = _sample_rate() if sample is None else sample
+    return rate >= 1.0 or random.random() < rate
+
+
+def _resolve(fields):
+    return {name: value() if callable(value) else value for name, value in fields.items()}
+
+
+def event(name, level=logging.INFO, sample=None, **fields):
+    """Write a structured event; callable field values are only evaluated if it is written"""
+    if not enabled(level, sample):
+        return
+    fields = _resolve(fields)
+    state = _request.get()
+    if state is not None:
+        fields.setdefault('request_id', state['request_id'])
+    logger.log(level, name, extra={'fields': fields})
+
+
+def exception(name, **fields):
+    """Write an ERROR event with the current exception's traceback"""
+    if logger.isEnabledFor(logging.ERROR):
+        state = _request.get()
+        if state is not None:
+            fields.setdefault('request_id', state['request_id'])
+        logger.exception(name, extra={'fields': _resolve(fields)})
+
+
+def annotate(**fields):
+    """Add fields to the current request's timing event (no-op outside a request)"""
+    state = _request.get()
+    if state is not None:
+        state['fields'].update(fields)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, event and the event's fields"""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'event': record.getMessage(),
+            **getattr(record, 'fields', {}),
+        }
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class RequestTimingMiddleware:
+    """Times each request, with its database queries, and writes a 'request' event"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Decide once per request, so sampled-out requests pay no query wrapper either
+        if not enabled(logging.INFO):
+            return self.get_response(request)
+
+        from django.db import connection
+
+        state = {'request_id': next(_request_ids), 'fields': {}, 'queries': 0, 'db_seconds': 0.0}
+        token = _request.set(state)
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                state['queries'] += 1
+                state['db_seconds'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        status = 500
+        try:
+            with connection.execute_wrapper(count_query):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            _request.reset(token)
+            match = getattr(request, 'resolver_match', None)
+            logger.info('request', extra={'fields': {
+                'request_id': state['request_id'],
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': status,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+                'db_queries': state['queries'],
+                'db_ms': round(state['db_seconds'] * 1000, 2),
+                **state['fields'],
+            }})
@@ -42,9 +42,11 @@ INSTALLED_APPS = [
 	'donors',
 	'hospitals',
 	'ml_matching',
+	'stats',
 ]
 
 MIDDLEWARE = [
+    'organ_donation.instrumentation.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -149,5 +151,52 @@ STATICFILES_DIRS = [
 
 
 AUTH_USER_MODEL = "hospitals.User"
+
+# Cores used to retrain the matching model (-1 = all cores); see ml_matching/parallelism.py
+ML_TRAINING_N_JOBS = int(getenv('ML_TRAINING_N_JOBS', '-1'))
+
+# Load and warm the matching model in MlMatchingConfig.ready(); on by default under wsgi.py
+ML_PRELOAD_MODEL = getenv('ML_PRELOAD_MODEL', '0') == '1'
+
+# Single-row p99 latency budget of the ensemble that scores online requests; see ml_matching/serving.py
+ML_SERVING_P99_MS = float(getenv('ML_SERVING_P99_MS', '5'))
+
+# Compatible pairs with a lower rule-based score are never scored by the model (0 = score them all)
+ML_CASCADE_MIN_SCORE = int(getenv('ML_CASCADE_MIN_SCORE', '0'))
+
+# Dashboard counters (hospitals.dashboard_stats) are cached on local disk so
+# every worker on the host sees the invalidations made by the others
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboard': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': getenv('DASHBOARD_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'dashboard')),
+    },
+}
+DASHBOARD_STATS_TTL = int(getenv('DASHBOARD_STATS_TTL', '300'))
+
+# Structured events (organ_donation/instrumentation.py): JSON lines on stdout.
+# EVENT_LOG_LEVEL=DEBUG adds per-row detail; EVENT_SAMPLE_RATE keeps that share
+# of events and per-request timings (1.0 = all)
+EVENT_SAMPLE_RATE = float(getenv('EVENT_SAMPLE_RATE', '1.0'))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'organ_donation.instrumentation.JsonFormatter'},
+    },
+    'handlers': {
+        'events': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'organ_donation.events': {
+            'handlers': ['events'],
+            'level': getenv('EVENT_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 MEDIA_URL ="/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
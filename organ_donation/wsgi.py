@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'organ_donation.settings')
+# Load the matching model before the server forks workers (see ml_matching/warmup.py)
+os.environ.setdefault('ML_PRELOAD_MODEL', '1')
 
 application = get_wsgi_application()
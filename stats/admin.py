@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import DailyStat
+
+@admin.register(DailyStat)
+class DailyStatAdmin(admin.ModelAdmin):
+    list_display = ['day', 'hospital', 'kind', 'status', 'organ_type', 'entered', 'left']
+    list_filter = ['kind', 'status']
+    date_hierarchy = 'day'
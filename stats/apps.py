@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class StatsConfig(AppConfig):
+    name = 'stats'
+
+    def ready(self):
+        # Keep the rollup rows in step with donation and appointment status changes
+        from . import signals  # noqa: F401
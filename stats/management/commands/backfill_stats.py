@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from stats import rollup
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the daily statistics rollups from the current donations and appointments. "
+            "Status changes keep them up to date afterwards; run this after bulk edits that bypass the ORM.")
+
+    def handle(self, *args, **options):
+        rows = rollup.backfill()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows"))
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonorSeen',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('donor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('hospital', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('appointment', 'Appointment'), ('donation', 'Donation'), ('donor', 'Donor')], max_length=12)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('organ_type', models.CharField(blank=True, max_length=20)),
+                ('entered', models.IntegerField(default=0)),
+                ('left', models.IntegerField(default=0)),
+                ('hospital', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='donorseen',
+            constraint=models.UniqueConstraint(condition=models.Q(('hospital__isnull', False)), fields=('donor', 'hospital'), name='donor_seen_hospital'),
+        ),
+        migrations.AddConstraint(
+            model_name='donorseen',
+            constraint=models.UniqueConstraint(condition=models.Q(('hospital__isnull', True)), fields=('donor',), name='donor_seen_platform'),
+        ),
+        migrations.AddIndex(
+            model_name='dailystat',
+            index=models.Index(fields=['hospital', 'day'], name='daily_stat_hospital_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailystat',
+            constraint=models.UniqueConstraint(condition=models.Q(('hospital__isnull', False)), fields=('day', 'hospital', 'kind', 'status', 'organ_type'), name='daily_stat_hospital_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailystat',
+            constraint=models.UniqueConstraint(condition=models.Q(('hospital__isnull', True)), fields=('day', 'kind', 'status', 'organ_type'), name='daily_stat_platform_bucket'),
+        ),
+    ]
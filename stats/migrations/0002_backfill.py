@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    from stats.rollup import backfill
+    backfill(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0001_initial'),
+        ('donors', '0003_merge_0002_auto_20190407_1414_0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    # 0002 counted appointments on their booked (often future) date; rebuild on the request day
+    from stats.rollup import backfill
+    backfill(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0002_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+from django.db import models
+from hospitals.models import User
+
+
+class DailyStat(models.Model):
+    """Status changes of one kind of record on one day.
+
+    entered and left count the records that moved into and out of `status`
+    that day, so the number of records in a status at the end of a day is
+    the sum of entered - left over every day up to it. Appointment and donor
+    rows belong to a hospital; donation rows and platform-wide donor rows
+    have no hospital. For donor rows, entered counts donors seen for the
+    first time (see DonorSeen) and status is blank.
+    """
+    KIND_APPOINTMENT = 'appointment'
+    KIND_DONATION = 'donation'
+    KIND_DONOR = 'donor'
+    KIND_CHOICES = [
+        (KIND_APPOINTMENT, 'Appointment'),
+        (KIND_DONATION, 'Donation'),
+        (KIND_DONOR, 'Donor'),
+    ]
+
+    day = models.DateField()
+    hospital = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, blank=True)
+    organ_type = models.CharField(max_length=20, blank=True)
+    entered = models.IntegerField(default=0)
+    left = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['hospital', 'day'], name='daily_stat_hospital_day_idx')]
+        constraints = [
+            # Two partial constraints, because NULL hospitals never collide in a plain unique index
+            models.UniqueConstraint(fields=['day', 'hospital', 'kind', 'status', 'organ_type'],
+                                    condition=models.Q(hospital__isnull=False), name='daily_stat_hospital_bucket'),
+            models.UniqueConstraint(fields=['day', 'kind', 'status', 'organ_type'],
+                                    condition=models.Q(hospital__isnull=True), name='daily_stat_platform_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.hospital or 'platform'} {self.kind} {self.status} +{self.entered}/-{self.left}"
+
+
+class DonorSeen(models.Model):
+    """A donor counted in the donor rollup of a hospital (or the platform, with no hospital)"""
+    donor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    hospital = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['donor', 'hospital'], condition=models.Q(hospital__isnull=False),
+                                    name='donor_seen_hospital'),
+            models.UniqueConstraint(fields=['donor'], condition=models.Q(hospital__isnull=True),
+                                    name='donor_seen_platform'),
+        ]
@@ -0,0 +1,198 @@
+"""Incrementally maintained daily rollups of donations, appointments and donors.
+
+Every status change adds 1 to `left` of the old (day, hospital, kind, status,
+organ) bucket and 1 to `entered` of the new one; stats.signals calls the
+record_* functions from post_save and post_delete. Reads then aggregate
+DailyStat rows, which grow with days x buckets rather than with the number
+of donations and appointments:
+
+    open(status, at end of day D) = sum(entered - left) over days <= D
+    flow(status, from A to B)     = sum(entered) over A <= day <= B
+
+backfill() rebuilds every row from the current tables. History is not
+recorded there, so each donation and each of its appointments counts as
+entering its current status on the day the donation was requested. That
+day is never after today, the day live changes are recorded on. An
+appointment booked for a future date is therefore counted from now, and
+changing it later moves it out of a bucket it is already in.
+"""
+from collections import defaultdict
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import DailyStat, DonorSeen
+
+APPOINTMENT = DailyStat.KIND_APPOINTMENT
+DONATION = DailyStat.KIND_DONATION
+DONOR = DailyStat.KIND_DONOR
+
+
+def _bump(day, hospital_id, kind, status='', organ_type='', entered=0, left=0):
+    """Add to one bucket's counters, creating its row on first use"""
+    bucket = DailyStat.objects.filter(day=day, hospital_id=hospital_id, kind=kind, status=status,
+                                      organ_type=organ_type)
+    if bucket.update(entered=F('entered') + entered, left=F('left') + left):
+        return
+    try:
+        with transaction.atomic():
+            DailyStat.objects.create(day=day, hospital_id=hospital_id, kind=kind, status=status,
+                                     organ_type=organ_type, entered=entered, left=left)
+    except IntegrityError:
+        # Another writer created the row first
+        bucket.update(entered=F('entered') + entered, left=F('left') + left)
+
+
+def _see_donor(day, donor_id, hospital_id=None):
+    """Count donor_id in the hospital's (or platform's) donor rollup unless it already is"""
+    _, created = DonorSeen.objects.get_or_create(donor_id=donor_id, hospital_id=hospital_id, defaults={'day': day})
+    if created:
+        _bump(day, hospital_id, DONOR, entered=1)
+
+
+def _forget_donor(day, donor_id, hospital_id=None):
+    if DonorSeen.objects.filter(donor_id=donor_id, hospital_id=hospital_id).delete()[0]:
+        _bump(day, hospital_id, DONOR, left=1)
+
+
+def record_donation(old, new, donor_id, day=None):
+    """A donation moved from old to new, each a (status, organ_type) pair or None when created/deleted"""
+    day = day or timezone.localdate()
+    if old == new:
+        return
+    if old is not None:
+        _bump(day, None, DONATION, *old, left=1)
+    if new is not None:
+        _bump(day, None, DONATION, *new, entered=1)
+        if old is None:
+            _see_donor(day, donor_id)
+
+
+def record_donation_deleted(status, organ_type, donor_id, remaining, day=None):
+    """A donation was deleted; remaining is whether its donor still has other donations"""
+    day = day or timezone.localdate()
+    record_donation((status, organ_type), None, donor_id, day)
+    if not remaining:
+        _forget_donor(day, donor_id)
+
+
+def record_appointment(hospital_id, old_status, new_status, donor_id=None, day=None):
+    """An appointment moved from old_status to new_status (None when created/deleted)"""
+    day = day or timezone.localdate()
+    if old_status == new_status:
+        return
+    if old_status is not None:
+        _bump(day, hospital_id, APPOINTMENT, old_status, left=1)
+    if new_status is not None:
+        _bump(day, hospital_id, APPOINTMENT, new_status, entered=1)
+        if old_status is None and donor_id is not None:
+            _see_donor(day, donor_id, hospital_id)
+
+
+def record_appointment_deleted(hospital_id, status, donor_id, remaining, day=None):
+    """An appointment was deleted; remaining is whether its donor has other appointments at the hospital"""
+    day = day or timezone.localdate()
+    record_appointment(hospital_id, status, None, day=day)
+    if donor_id is not None and not remaining:
+        _forget_donor(day, donor_id, hospital_id)
+
+
+def backfill(apps=global_apps):
+    """Rebuild every rollup row from the current donations and appointments; returns the row count.
+
+    apps is the app registry to take the models from, so data migrations can
+    pass their historical one.
+    """
+    DonationRequests = apps.get_model('donors', 'DonationRequests')
+    Appointments = apps.get_model('donors', 'Appointments')
+    Stat = apps.get_model('stats', 'DailyStat')
+    Seen = apps.get_model('stats', 'DonorSeen')
+    today = timezone.localdate()
+    counts = defaultdict(int)
+    seen = {}
+
+    def see(donor_id, hospital_id, day):
+        key = (donor_id, hospital_id)
+        if key not in seen or day < seen[key]:
+            seen[key] = day
+
+    donations = DonationRequests.objects.values_list('donor_id', 'donation_status', 'organ_type', 'request_datetime')
+    for donor_id, status, organ_type, requested in donations.iterator(chunk_size=2000):
+        day = timezone.localdate(requested) if requested else today
+        counts[day, None, DONATION, status, organ_type] += 1
+        see(donor_id, None, day)
+
+    appointments = Appointments.objects.values_list('hospital_id', 'appointment_status',
+                                                    'donation_request__request_datetime',
+                                                    'donation_request__donor_id')
+    for hospital_id, status, requested, donor_id in appointments.iterator(chunk_size=2000):
+        day = timezone.localdate(requested) if requested else today
+        counts[day, hospital_id, APPOINTMENT, status, ''] += 1
+        see(donor_id, hospital_id, day)
+
+    for (donor_id, hospital_id), day in seen.items():
+        counts[day, hospital_id, DONOR, '', ''] += 1
+
+    with transaction.atomic():
+        Stat.objects.all().delete()
+        Seen.objects.all().delete()
+        Stat.objects.bulk_create([
+            Stat(day=day, hospital_id=hospital_id, kind=kind, status=status, organ_type=organ_type, entered=n)
+            for (day, hospital_id, kind, status, organ_type), n in counts.items()
+        ], batch_size=1000)
+        Seen.objects.bulk_create([
+            Seen(donor_id=donor_id, hospital_id=hospital_id, day=day) for (donor_id, hospital_id), day in seen.items()
+        ], batch_size=1000)
+    return len(counts)
+
+
+def _scope(hospital):
+    """Rows a hospital's statistics read: its appointments and donors, plus platform-wide donations"""
+    if hospital is None:
+        return Q(kind=APPOINTMENT) | Q(hospital__isnull=True)
+    return Q(hospital=hospital) | Q(hospital__isnull=True, kind=DONATION)
+
+
+def summary(start, end, hospital=None):
+    """Flows within [start, end] and open counts at the end of `end`, in one query.
+
+    With no hospital, appointments of every hospital and platform-wide donors
+    are counted. Returns {'appointments': {status: counts}, 'donations':
+    {status: counts with 'by_organ'}, 'donors': {'new': ..., 'total': ...}}
+    where counts holds 'entered', 'left' and 'open'.
+    """
+    in_range = Q(day__gte=start)
+    rows = DailyStat.objects.filter(_scope(hospital), day__lte=end).values('kind', 'status', 'organ_type').annotate(
+        entered_in_range=Sum('entered', filter=in_range, default=0),
+        left_in_range=Sum('left', filter=in_range, default=0),
+        open=Sum(F('entered') - F('left'), default=0),
+    ).order_by()
+
+    result = {'appointments': {}, 'donations': {}, 'donors': {'new': 0, 'total': 0}}
+    for row in rows:
+        counts = {'entered': row['entered_in_range'], 'left': row['left_in_range'], 'open': row['open']}
+        if row['kind'] == DONOR:
+            result['donors']['new'] += counts['entered']
+            result['donors']['total'] += counts['open']
+            continue
+        group = result['appointments' if row['kind'] == APPOINTMENT else 'donations']
+        totals = group.setdefault(row['status'], {'entered': 0, 'left': 0, 'open': 0})
+        for name, value in counts.items():
+            totals[name] += value
+        if row['kind'] == DONATION:
+            totals.setdefault('by_organ', {})[row['organ_type']] = counts
+    return result
+
+
+def daily(start, end, hospital=None):
+    """Per-day entered/left counts within [start, end], one dict per (day, kind, status)"""
+    rows = DailyStat.objects.filter(_scope(hospital), day__gte=start, day__lte=end).values(
+        'day', 'kind', 'status'
+    ).annotate(entered_on_day=Sum('entered'), left_on_day=Sum('left')).order_by('day', 'kind', 'status')
+    return [
+        {'day': row['day'].isoformat(), 'kind': row['kind'], 'status': row['status'],
+         'entered': row['entered_on_day'], 'left': row['left_on_day']}
+        for row in rows
+    ]
@@ -0,0 +1,81 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from donors.models import Appointments, DonationRequests
+from . import rollup
+
+
+# Each instance remembers the status it was loaded (or last saved) with, so a
+# save can tell which rollup bucket it leaves without re-reading the row.
+# __dict__ is read directly so deferred fields are never fetched; pre_save
+# reads the stored status only for instances loaded without it.
+
+def _donation_state(instance):
+    status = instance.__dict__.get('donation_status')
+    return None if status is None else (status, instance.__dict__.get('organ_type') or '')
+
+
+@receiver(post_init, sender=DonationRequests)
+def donation_loaded(sender, instance, **kwargs):
+    instance._stats_state = _donation_state(instance) if instance.pk else None
+
+
+@receiver(pre_save, sender=DonationRequests)
+def donation_saving(sender, instance, **kwargs):
+    if instance._stats_state is None and not instance._state.adding:
+        stored = DonationRequests.objects.filter(pk=instance.pk).values_list('donation_status', 'organ_type').first()
+        instance._stats_state = stored and (stored[0], stored[1] or '')
+
+
+@receiver(post_save, sender=DonationRequests)
+def donation_saved(sender, instance, created, **kwargs):
+    state = _donation_state(instance)
+    rollup.record_donation(None if created else instance._stats_state, state, instance.donor_id)
+    instance._stats_state = state
+
+
+@receiver(post_delete, sender=DonationRequests)
+def donation_deleted(sender, instance, **kwargs):
+    if instance._stats_state is None:
+        return
+    remaining = DonationRequests.objects.filter(donor_id=instance.donor_id).exclude(id=instance.id).exists()
+    rollup.record_donation_deleted(*instance._stats_state, instance.donor_id, remaining)
+
+
+@receiver(post_init, sender=Appointments)
+def appointment_loaded(sender, instance, **kwargs):
+    instance._stats_status = instance.__dict__.get('appointment_status') if instance.pk else None
+
+
+@receiver(pre_save, sender=Appointments)
+def appointment_saving(sender, instance, **kwargs):
+    if instance._stats_status is None and not instance._state.adding:
+        instance._stats_status = Appointments.objects.filter(pk=instance.pk).values_list(
+            'appointment_status', flat=True
+        ).first()
+
+
+def _appointment_donor(instance):
+    # The donation is usually cached on the instance (book_appointment sets it)
+    if Appointments.donation_request.is_cached(instance):
+        return instance.donation_request.donor_id
+    return DonationRequests.objects.filter(id=instance.donation_request_id).values_list('donor_id', flat=True).first()
+
+
+@receiver(post_save, sender=Appointments)
+def appointment_saved(sender, instance, created, **kwargs):
+    status = instance.appointment_status
+    donor_id = _appointment_donor(instance) if created else None
+    rollup.record_appointment(instance.hospital_id, None if created else instance._stats_status, status, donor_id)
+    instance._stats_status = status
+
+
+@receiver(post_delete, sender=Appointments)
+def appointment_deleted(sender, instance, **kwargs):
+    if instance._stats_status is None:
+        return
+    donor_id = _appointment_donor(instance)
+    remaining = donor_id is not None and Appointments.objects.filter(
+        hospital_id=instance.hospital_id, donation_request__donor_id=donor_id
+    ).exclude(id=instance.id).exists()
+    rollup.record_appointment_deleted(instance.hospital_id, instance._stats_status, donor_id, remaining)
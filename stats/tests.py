@@ -0,0 +1,111 @@
+import datetime
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from donors.models import Appointments, DonationRequests
+from hospitals.models import User
+from . import rollup
+from .models import DailyStat
+
+
+def create_donation(donor, organ_type='Kidney', status='Pending'):
+    return DonationRequests.objects.create(
+        donor=donor, organ_type=organ_type, blood_type='O-', family_relation='Sibling',
+        family_relation_name='Kin', family_contact_number='5550000', donation_status=status,
+        donated_before=False, family_consent=True
+    )
+
+
+def book(donation, hospital, status='Pending'):
+    return Appointments.objects.create(donation_request=donation, hospital=hospital, appointment_status=status,
+                                       date=timezone.localdate().isoformat(), time='10:00')
+
+
+def open_counts(summary):
+    return (
+        {status: counts['open'] for status, counts in summary['appointments'].items() if counts['open']},
+        {status: counts['open'] for status, counts in summary['donations'].items() if counts['open']},
+        summary['donors']['total'],
+    )
+
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        self.hospital = User.objects.create(username='general', hospital_name='general', is_staff=True)
+        self.other = User.objects.create(username='elsewhere', hospital_name='elsewhere', is_staff=True)
+        self.donors = [User.objects.create(username=f'donor-{i}') for i in range(3)]
+
+    def test_status_changes_match_a_backfill(self):
+        kidney = create_donation(self.donors[0])
+        liver = create_donation(self.donors[0], organ_type='Liver')
+        lone = create_donation(self.donors[1])
+        create_donation(self.donors[2], status='Approved')
+        first = book(kidney, self.hospital)
+        book(liver, self.hospital)
+        book(lone, self.other)
+
+        kidney.donation_status = 'Approved'
+        kidney.save(update_fields=['donation_status'])
+        first.appointment_status = 'Approved'
+        first.save()
+        # A reloaded instance and a deferred one both know the status they leave
+        again = Appointments.objects.only('id').get(id=first.id)
+        again.appointment_status = 'Denied'
+        again.save()
+        lone.delete()
+
+        today = timezone.localdate()
+        incremental = {hospital: rollup.summary(today, today, hospital) for hospital in (None, self.hospital, self.other)}
+        self.assertEqual(open_counts(incremental[self.hospital]),
+                         ({'Pending': 1, 'Denied': 1}, {'Pending': 1, 'Approved': 2}, 1))
+        self.assertEqual(incremental[self.hospital]['donations']['Approved']['by_organ']['Kidney']['entered'], 2)
+        self.assertEqual(open_counts(incremental[self.other]), ({}, {'Pending': 1, 'Approved': 2}, 0))
+        self.assertEqual(incremental[self.hospital]['appointments']['Approved'],
+                         {'entered': 1, 'left': 1, 'open': 0})
+
+        call_command('backfill_stats', stdout=StringIO())
+        for hospital, summary in incremental.items():
+            self.assertEqual(open_counts(rollup.summary(today, today, hospital)), open_counts(summary))
+
+    def test_backfilled_future_booking_changes_status_today(self):
+        next_month = timezone.localdate() + datetime.timedelta(days=30)
+        appointment = Appointments.objects.create(donation_request=create_donation(self.donors[0]),
+                                                  hospital=self.hospital, appointment_status='Pending',
+                                                  date=next_month.isoformat(), time='10:00')
+        call_command('backfill_stats', stdout=StringIO())
+        today = timezone.localdate()
+        self.assertEqual(open_counts(rollup.summary(today, today, self.hospital))[0], {'Pending': 1})
+
+        appointment.appointment_status = 'Approved'
+        appointment.save()
+        for day in (today, next_month):
+            appointments = rollup.summary(today, day, self.hospital)['appointments']
+            self.assertEqual({status: counts['open'] for status, counts in appointments.items()},
+                             {'Pending': 0, 'Approved': 1})
+
+    def test_api_reads_rollups_for_a_date_range(self):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        DailyStat.objects.create(day=yesterday, hospital=self.hospital, kind=DailyStat.KIND_APPOINTMENT,
+                                 status='Approved', entered=5, left=1)
+        book(create_donation(self.donors[0]), self.hospital, status='Approved')
+
+        self.client.force_login(self.hospital)
+        with self.assertNumQueries(4):
+            response = self.client.get('/stats/api/', {'start': yesterday.isoformat(), 'end': yesterday.isoformat()})
+        data = json.loads(response.content)
+        self.assertEqual(data['summary']['appointments']['Approved'], {'entered': 5, 'left': 1, 'open': 4})
+        self.assertEqual(data['daily'], [
+            {'day': yesterday.isoformat(), 'kind': 'appointment', 'status': 'Approved', 'entered': 5, 'left': 1}
+        ])
+
+        data = json.loads(self.client.get('/stats/api/').content)
+        self.assertEqual(data['summary']['appointments']['Approved']['open'], 5)
+        self.assertEqual(data['summary']['donors'], {'new': 1, 'total': 1})
+
+        response = self.client.get('/stats/api/', {'start': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('api/', views.stats_api, name='stats_api'),
+]
@@ -0,0 +1,50 @@
+import datetime
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+
+from hospitals.models import User
+from . import rollup
+
+# Range returned when the request names no start date
+DEFAULT_RANGE_DAYS = 30
+
+
+def _date_range(query):
+    end = datetime.date.fromisoformat(query['end']) if query.get('end') else timezone.localdate()
+    start = (datetime.date.fromisoformat(query['start']) if query.get('start')
+             else end - datetime.timedelta(days=DEFAULT_RANGE_DAYS - 1))
+    if start > end:
+        raise ValueError("start must not be after end")
+    return start, end
+
+
+@login_required
+def stats_api(request):
+    """Rollup statistics for a date range: ?start=YYYY-MM-DD&end=YYYY-MM-DD (default: the last 30 days).
+
+    Hospitals get their own statistics; superusers get the platform's, or one
+    hospital's with ?hospital=<id>.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    try:
+        start, end = _date_range(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid date range: {e}'}, status=400)
+
+    hospital = request.user
+    if request.user.is_superuser:
+        hospital_id = request.GET.get('hospital')
+        hospital = User.objects.filter(id=hospital_id).first() if hospital_id and hospital_id.isdigit() else None
+        if hospital_id and hospital is None:
+            return JsonResponse({'error': 'Unknown hospital'}, status=404)
+
+    return JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'hospital': hospital.id if hospital else None,
+        'summary': rollup.summary(start, end, hospital),
+        'daily': rollup.daily(start, end, hospital),
+    })
@@ -4,10 +4,12 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'organ_donation.settings')
 django.setup()
 
 from ml_matching.matching_algorithm import OrganMatchingML
+from ml_matching.parallelism import parse_n_jobs
 import pandas as pd
 import numpy as np
 
 def main():
+    n_jobs = parse_n_jobs("Train the high-accuracy ensemble on the organ donation CSV")
     print("🚀 Training High-Accuracy ML Model (Target: 90%+)")
     print("=" * 60)
     
@@ -50,7 +52,7 @@ def main():
     print("   - Cross-validation & Hyperparameter tuning")
     
     try:
-        accuracy = ml_matcher.train_model()
+        accuracy = ml_matcher.train_model(n_jobs=n_jobs)
         
         print(f"\n🎉 Training Results:")
         print(f"   Final Test Accuracy: {accuracy:.4f} ({accuracy*100:.2f}%)")